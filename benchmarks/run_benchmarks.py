@@ -0,0 +1,145 @@
+# Performance benchmarks for ledger rebuild, reports and statement import on synthetic data.
+# Usage (from repository root):
+#   python -m benchmarks.run_benchmarks [--accounts N] [--assets M] [--years Y] [--output results.json]
+# Benchmarks run without display (offscreen Qt platform) in a temporary database. Results are printed as JSON
+# (or saved into --output file) to be compared between releases.
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+from datetime import datetime, timezone
+from shutil import copyfile
+from tempfile import TemporaryDirectory
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtCore import QDateTime, Qt
+from PySide6.QtSql import QSqlDatabase
+from PySide6.QtWidgets import QApplication, QTreeView, QTableView
+import jal
+from jal.constants import Setup
+from jal.db.db import JalDB, JalDBError
+from jal.db.ledger import Ledger
+from jal.reports.income_spending import IncomeSpendingReportModel   # should be before models to resolve imports
+from jal.db.holdings_model import HoldingsModel
+from jal.db.balances_model import BalancesModel
+from jal.data_import.statement import Statement
+from benchmarks.synthetic_data import SyntheticLedger
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Executes 'function' 'repeat' times and returns a dict with timing statistics in seconds.
+# 'prepare' is called before every execution and isn't included in timing.
+def measure(name, function, repeat=1, prepare=None) -> dict:
+    timings = []
+    for _ in range(repeat):
+        if prepare is not None:
+            prepare()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    print(f"{name}: {statistics.median(timings):.3f}s", file=sys.stderr)
+    return {'name': name, 'runs': repeat, 'median': statistics.median(timings), 'min': min(timings),
+            'max': max(timings)}
+
+
+def run(args) -> dict:
+    results = []
+    with TemporaryDirectory(prefix='jal_benchmark') as tmp_path:
+        db_path = tmp_path + os.sep
+        copyfile(os.path.dirname(jal.__file__) + os.sep + Setup.INIT_SCRIPT_PATH, db_path + Setup.INIT_SCRIPT_PATH)
+        error = JalDB().init_db(db_path)
+        if error.code != JalDBError.NoError:
+            raise RuntimeError(f"Database initialization failed: {error.message} {error.details}")
+
+        data = SyntheticLedger(seed=args.seed, accounts=args.accounts, assets=args.assets, years=args.years,
+                               trades_per_month=args.trades)
+        start = time.perf_counter()
+        counts = data.populate()
+        results.append({'name': 'generate', 'runs': 1, 'median': time.perf_counter() - start})
+
+        ledger = Ledger()
+        results.append(measure('ledger_rebuild', lambda: ledger.rebuild(from_timestamp=0), args.repeat))
+        results.append(measure('ledger_rebuild_parallel',
+                               lambda: ledger.rebuild(from_timestamp=0, workers=args.workers), args.repeat))
+        back_dated = (data.begin() + data.end()) // 2
+        results.append(measure('ledger_rebuild_incremental', lambda: ledger.rebuild(), args.repeat,
+                               prepare=lambda: JalDB._exec("INSERT INTO invalidate_ledger(account_id, timestamp) "
+                                                           "VALUES(:account, :timestamp)",
+                                                           [(":account", data.accounts[0]),
+                                                            (":timestamp", back_dated)])))
+        report_date = QDateTime.fromSecsSinceEpoch(data.end(), Qt.UTC).date()
+
+        view = QTreeView()
+        holdings = HoldingsModel(view)
+        view.setModel(holdings)
+        holdings.updateView(SyntheticLedger.CURRENCY_RUB, report_date, "currency_id;account_id")
+        results.append(measure('holdings', holdings.prepareData, args.repeat))
+
+        table = QTableView()
+        balances = BalancesModel(table)
+        table.setModel(balances)
+        balances.setCurrency(SyntheticLedger.CURRENCY_RUB)
+        balances.setDate(report_date)
+        results.append(measure('balances', balances.calculateBalances, args.repeat))
+
+        tree = QTreeView()
+        income_spending = IncomeSpendingReportModel(tree)
+        tree.setModel(income_spending)
+        income_spending.setCurrency(SyntheticLedger.CURRENCY_RUB)
+        income_spending.setDatesRange(data.begin(), data.end())
+        results.append(measure('income_spending', income_spending.prepareData, args.repeat))
+
+        statement_file = db_path + 'statement.json'
+        with open(statement_file, 'w', encoding='utf-8') as f:
+            json.dump(data.statement(args.statement_trades), f)
+
+        def import_statement():
+            statement = Statement()
+            statement.load(statement_file)
+            statement.validate_format()
+            statement.match_db_ids()
+            statement.import_into_db()
+        results.append(measure('statement_import', import_statement))
+        JalDB.clear_statement_cache()
+        QSqlDatabase.database(Setup.DB_CONNECTION).close()
+    return {
+        'timestamp': datetime.now(tz=timezone.utc).isoformat(timespec='seconds'),
+        'jal_version': jal.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': vars(args),
+        'data': counts,
+        'results': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run JAL performance benchmarks on synthetic data")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of synthetic data generator")
+    parser.add_argument('--accounts', type=int, default=5, help="Number of investment accounts")
+    parser.add_argument('--assets', type=int, default=20, help="Number of stocks")
+    parser.add_argument('--years', type=int, default=3, help="Number of years of data")
+    parser.add_argument('--trades', type=int, default=10, help="Number of trades per month for every account")
+    parser.add_argument('--statement-trades', type=int, default=1000, help="Number of trades in imported statement")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Processes for parallel rebuild")
+    parser.add_argument('--repeat', type=int, default=3, help="Number of runs of every benchmark")
+    parser.add_argument('--output', type=str, default='', help="File to save results (stdout by default)")
+    args = parser.parse_args()
+
+    app = QApplication([])
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
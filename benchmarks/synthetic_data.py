@@ -0,0 +1,223 @@
+import random
+from datetime import datetime, timezone
+from decimal import Decimal
+from jal.constants import PredefinedAccountType, PredefinedAsset, PredefinedCategory
+from jal.db.account import JalAccount
+from jal.db.asset import JalAsset
+from jal.db.peer import JalPeer
+from jal.db.operations import LedgerTransaction, Dividend, CorporateAction
+
+DAY = 86400
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Generates deterministic synthetic data set in currently open database. The same seed and parameters always give
+# the same database content. All operations are created via LedgerTransaction.create_new() so they pass the same
+# validation as operations created by users or imported from statements.
+# Data set contains:
+#  - 'accounts' investment accounts in USD that trade 'assets' stocks during 'years' years since 'start_year';
+#  - dividends on held stocks every quarter, one split per year, money and asset transfers between neighbour
+#    accounts twice a year;
+#  - one cash account in RUB with monthly income and several spendings in different categories;
+#  - daily quotes for every stock and for USD/RUB rate.
+class SyntheticLedger:
+    CURRENCY_RUB = 1
+    CURRENCY_USD = 2
+
+    def __init__(self, seed=0, accounts=5, assets=20, years=3, trades_per_month=10, start_year=2020):
+        self._random = random.Random(seed)
+        self._accounts_count = accounts
+        self._assets_count = assets
+        self._years = years
+        self._trades_per_month = trades_per_month
+        self._start_year = start_year
+        self.accounts = []      # ids of investment accounts
+        self.cash_account = 0   # id of cash account
+        self.assets = []        # ids of stocks
+        self.peer = 0
+        self.counts = {}        # number of created objects by their kind
+        self._holdings = {}     # {(account_id, asset_id): qty} - positions at the moment of last generated operation
+        self._prices = {}       # {asset_id: [(timestamp, price)]} - daily prices of stocks
+
+    def begin(self) -> int:
+        return int(datetime(self._start_year, 1, 1, tzinfo=timezone.utc).timestamp())
+
+    def end(self) -> int:
+        return int(datetime(self._start_year + self._years, 1, 1, tzinfo=timezone.utc).timestamp()) - 1
+
+    # Creates all data in database and returns a dict with number of created objects by their kind
+    def populate(self) -> dict:
+        self.counts = {'accounts': 0, 'assets': 0, 'quotes': 0, 'trades': 0, 'dividends': 0, 'transfers': 0,
+                       'corporate_actions': 0, 'income_spending': 0}
+        self._create_static_data()
+        self._create_quotes()
+        for year in range(self._start_year, self._start_year + self._years):
+            for month in range(1, 13):
+                self._create_month(year, month)
+        return self.counts
+
+    def _create_static_data(self):
+        self.peer = JalPeer(data={'name': 'Synthetic Broker', 'parent': 0}, search=True, create=True).id()
+        for i in range(self._accounts_count):
+            account = JalAccount(data={'type': PredefinedAccountType.Investment, 'name': f"Synthetic {i + 1}",
+                                       'number': f"SYN{i + 1:04d}", 'currency': self.CURRENCY_USD, 'active': 1,
+                                       'organization': self.peer}, create=True)
+            self.accounts.append(account.id())
+        self.cash_account = JalAccount(data={'type': PredefinedAccountType.Cash, 'name': "Synthetic Wallet",
+                                             'number': "SYN-CASH", 'currency': self.CURRENCY_RUB, 'active': 1},
+                                       create=True).id()
+        self.counts['accounts'] = self._accounts_count + 1
+        for i in range(self._assets_count):
+            asset = JalAsset(data={'type': PredefinedAsset.Stock, 'name': f"SYNTHETIC STOCK {i + 1}",
+                                   'isin': f"XS{i + 1:010d}"}, create=True)
+            asset.add_symbol(f"SYN{i + 1}", self.CURRENCY_USD, '')
+            self.assets.append(asset.id())
+        self.counts['assets'] = self._assets_count
+        for account_id in self.accounts:
+            self._action(self.begin(), account_id, [(PredefinedCategory.StartingBalance, 10000000)])
+
+    # Creates daily quotes as a random walk for every stock and USD/RUB rate
+    def _create_quotes(self):
+        days = range(self.begin(), self.end(), DAY)
+        for asset_id in self.assets:
+            price = Decimal(self._random.randint(1000, 50000)) / 100
+            quotes = []
+            for day in days:
+                price = (price * Decimal(1 + self._random.gauss(0, 0.02))).quantize(Decimal('0.01'))
+                price = max(Decimal('0.01'), price)
+                quotes.append({'timestamp': day, 'quote': price})
+            self._prices[asset_id] = [(x['timestamp'], x['quote']) for x in quotes]
+            JalAsset(asset_id).set_quotes(quotes, self.CURRENCY_USD)
+            self.counts['quotes'] += len(quotes)
+        rate = Decimal('70')
+        quotes = []
+        for day in days:
+            rate = (rate * Decimal(1 + self._random.gauss(0, 0.005))).quantize(Decimal('0.0001'))
+            quotes.append({'timestamp': day, 'quote': rate})
+        JalAsset(self.CURRENCY_USD).set_quotes(quotes, self.CURRENCY_RUB)
+        self.counts['quotes'] += len(quotes)
+
+    def _price(self, asset_id, timestamp) -> Decimal:
+        return self._prices[asset_id][(timestamp - self.begin()) // DAY][1]
+
+    # Creates all operations for a month. Every account gets its own day of month for every operation, so
+    # operations of one account have different timestamps and may be replayed in the same order as generated.
+    def _create_month(self, year, month):
+        month_start = int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp())
+        for account_id in self.accounts:
+            for i in range(self._trades_per_month):
+                timestamp = month_start + (1 + 25 * i // self._trades_per_month) * DAY + 3600 * (1 + i % 8)
+                self._trade(account_id, timestamp)
+            if month % 3 == 0:
+                for asset_id in self.assets:
+                    if self._holdings.get((account_id, asset_id), 0) > 0 and self._random.random() < 0.5:
+                        self._dividend(account_id, asset_id, month_start + 26 * DAY)
+        if month % 6 == 0:
+            for account_id, next_account_id in zip(self.accounts, self.accounts[1:]):
+                self._money_transfer(account_id, next_account_id, month_start + 27 * DAY)
+                self._asset_transfer(account_id, next_account_id, month_start + 27 * DAY + 3600)
+        if month == 12:
+            for account_id in self.accounts:
+                self._split(account_id, month_start + 28 * DAY)
+        self._action(month_start + 5 * DAY, self.cash_account, [(PredefinedCategory.Income, 150000)])
+        for i in range(4):
+            category = self._random.choice([PredefinedCategory.Spending, PredefinedCategory.Fees,
+                                            PredefinedCategory.Taxes])
+            self._action(month_start + (8 + 5 * i) * DAY, self.cash_account,
+                         [(category, -self._random.randint(100, 20000))])
+
+    def _action(self, timestamp, account_id, lines):
+        data = {'timestamp': timestamp, 'account_id': account_id, 'peer_id': self.peer,
+                'lines': [{'amount': x[1], 'category_id': x[0], 'note': ''} for x in lines]}
+        LedgerTransaction.create_new(LedgerTransaction.IncomeSpending, data)
+        self.counts['income_spending'] += 1
+
+    def _trade(self, account_id, timestamp):
+        asset_id = self._random.choice(self.assets)
+        holding = self._holdings.get((account_id, asset_id), 0)
+        if holding > 0 and self._random.random() < 0.4:
+            qty = -self._random.randint(1, holding)
+        else:
+            qty = self._random.randint(1, 100)
+        price = self._price(asset_id, timestamp)
+        data = {'timestamp': timestamp, 'settlement': timestamp + 2 * DAY, 'account_id': account_id,
+                'asset_id': asset_id, 'qty': qty, 'price': str(price), 'fee': 1.5, 'number': ''}
+        LedgerTransaction.create_new(LedgerTransaction.Trade, data)
+        self._holdings[(account_id, asset_id)] = holding + qty
+        self.counts['trades'] += 1
+
+    def _dividend(self, account_id, asset_id, timestamp):
+        amount = (self._holdings[(account_id, asset_id)] * self._price(asset_id, timestamp) / 100).quantize(
+            Decimal('0.01'))
+        data = {'timestamp': timestamp, 'type': Dividend.Dividend, 'account_id': account_id, 'asset_id': asset_id,
+                'amount': str(amount), 'tax': str((amount / 10).quantize(Decimal('0.01'))),
+                'note': 'Synthetic dividend'}
+        LedgerTransaction.create_new(LedgerTransaction.Dividend, data)
+        self.counts['dividends'] += 1
+
+    def _money_transfer(self, from_account, to_account, timestamp):
+        amount = self._random.randint(1000, 100000)
+        data = {'withdrawal_timestamp': timestamp, 'withdrawal_account': from_account, 'withdrawal': amount,
+                'deposit_timestamp': timestamp, 'deposit_account': to_account, 'deposit': amount}
+        LedgerTransaction.create_new(LedgerTransaction.Transfer, data)
+        self.counts['transfers'] += 1
+
+    def _asset_transfer(self, from_account, to_account, timestamp):
+        held = [x for x in self.assets if self._holdings.get((from_account, x), 0) > 1]
+        if not held:
+            return
+        asset_id = self._random.choice(held)
+        qty = self._holdings[(from_account, asset_id)] // 2
+        data = {'withdrawal_timestamp': timestamp, 'withdrawal_account': from_account, 'withdrawal': qty,
+                'deposit_timestamp': timestamp, 'deposit_account': to_account, 'deposit': qty, 'asset': asset_id}
+        LedgerTransaction.create_new(LedgerTransaction.Transfer, data)
+        self._holdings[(from_account, asset_id)] -= qty
+        self._holdings[(to_account, asset_id)] = self._holdings.get((to_account, asset_id), 0) + qty
+        self.counts['transfers'] += 1
+
+    def _split(self, account_id, timestamp):
+        held = [x for x in self.assets if self._holdings.get((account_id, x), 0) > 0]
+        if not held:
+            return
+        asset_id = self._random.choice(held)
+        qty = self._holdings[(account_id, asset_id)]
+        data = {'timestamp': timestamp, 'account_id': account_id, 'type': CorporateAction.Split, 'asset_id': asset_id,
+                'qty': qty, 'note': 'Synthetic split 2:1',
+                'outcome': [{'asset_id': asset_id, 'qty': 2 * qty, 'value_share': 1.0}]}
+        LedgerTransaction.create_new(LedgerTransaction.CorporateAction, data)
+        self._holdings[(account_id, asset_id)] = 2 * qty
+        self.counts['corporate_actions'] += 1
+
+    # Returns a statement in JAL import format (see jal/data_import/import_schema.json) with given number of trades
+    # for a new investment account. Trades are made with existing synthetic stocks in the year after generated data.
+    def statement(self, trades: int) -> dict:
+        begin = self.end() + 1
+        statement = {
+            'period': [begin, begin + 365 * DAY - 1],
+            'accounts': [{'id': 1, 'number': "SYN-IMPORT", 'currency': 1, 'precision': 2}],
+            'assets': [{'id': 1, 'type': 'money', 'name': ''}],
+            'symbols': [{'id': 1, 'asset': 1, 'symbol': 'USD'}],
+            'assets_data': [],
+            'trades': [],
+            'income_spending': [],
+            'transfers': [],
+            'corporate_actions': [],
+            'asset_payments': []
+        }
+        for i, asset_id in enumerate(self.assets):
+            asset = JalAsset(asset_id)
+            statement['assets'].append({'id': i + 2, 'type': 'stock', 'name': asset.name(), 'isin': asset.isin()})
+            statement['symbols'].append({'id': i + 2, 'asset': i + 2, 'symbol': asset.symbol(), 'currency': 1})
+        holdings = {}
+        for i in range(trades):
+            asset = self._random.randint(2, len(self.assets) + 1)
+            holding = holdings.get(asset, 0)
+            qty = -self._random.randint(1, holding) if holding > 0 and self._random.random() < 0.4 \
+                else self._random.randint(1, 100)
+            holdings[asset] = holding + qty
+            timestamp = begin + (i * 360 * DAY) // trades
+            statement['trades'].append({'id': i + 1, 'number': f"{i + 1}", 'timestamp': timestamp,
+                                        'settlement': timestamp + 2 * DAY, 'account': 1, 'asset': asset,
+                                        'quantity': qty, 'price': self._random.randint(1000, 50000) / 100,
+                                        'fee': 1.5})
+        return statement
@@ -6,7 +6,7 @@ from PySide6.QtWidgets import QComboBox
 class Setup:
     DB_PATH = "jal.sqlite"
     DB_CONNECTION = "JAL.DB"
-    DB_REQUIRED_VERSION = 49
+    DB_REQUIRED_VERSION = 55
     SQLITE_MIN_VERSION = "3.35"
     MAIN_WND_NAME = "JAL_MainWindow"
     INIT_SCRIPT_PATH = 'jal_init.sql'
@@ -24,6 +24,7 @@ class Setup:
     TAX_TREATY_PARAM = "tax_treaty"
     UPDATE_PREFIX = 'jal_delta_'
     DEFAULT_ACCOUNT_PRECISION = 2
+    MAX_TIMESTAMP = 9999999999
 
 
 class BookAccount:  # PREDEFINED BOOK ACCOUNTS
@@ -2,7 +2,7 @@ from decimal import Decimal
 from datetime import datetime
 
 from jal.db.operations import Dividend
-from jal.data_export.taxes import TaxReport
+from jal.data_export.taxes import TaxReport, IntervalIndex
 
 
 class TaxesPortugal(TaxReport):
@@ -36,7 +36,7 @@ class TaxesPortugal(TaxReport):
                 'isin': dividend.asset().isin(),
                 'amount': dividend.amount(self.account_currency.id()),
                 'tax': dividend.tax(),
-                'rate': self.account_currency.quote(dividend.timestamp(), self._currency_id)[1],
+                'rate': self.rate(dividend.timestamp()),
                 'country': country.name(language='en'),
                 'tax_treaty': "Y" if self.has_tax_treaty_with(country.code()) else "N",
                 'amount_eur': round(dividend.amount(self._currency_id), 2),
@@ -61,13 +61,16 @@ class TaxesPortugal(TaxReport):
         deals_report = []
         ns = not self.use_settlement
         trades = self.shares_trades_list()
+        # All dividends of the account are matched with short trades, so the same key is used for all of them
+        account_dividends = IntervalIndex(Dividend.get_list(self.account.id(), subtype=Dividend.Dividend),
+                                          key=lambda x: 0, position=lambda x: x.ex_date())
         for trade in trades:
             if ns:
-                os_rate = self.account_currency.quote(trade.open_operation().timestamp(), self._currency_id)[1]
-                cs_rate = self.account_currency.quote(trade.close_operation().timestamp(), self._currency_id)[1]
+                os_rate = self.rate(trade.open_operation().timestamp())
+                cs_rate = self.rate(trade.close_operation().timestamp())
             else:
-                os_rate = self.account_currency.quote(trade.open_operation().settlement(), self._currency_id)[1]
-                cs_rate = self.account_currency.quote(trade.close_operation().settlement(), self._currency_id)[1]
+                os_rate = self.rate(trade.open_operation().settlement())
+                cs_rate = self.rate(trade.close_operation().settlement())
             if trade.qty() >= Decimal('0'):  # Long trade
                 note = ''
                 income = round(trade.close_amount(no_settlement=ns), 2)
@@ -77,9 +80,8 @@ class TaxesPortugal(TaxReport):
             else:  # Short trade
                 # Check were there any dividends during short position holding
                 short_dividend_eur = Decimal('0')
-                dividends = Dividend.get_list(self.account.id(), subtype=Dividend.Dividend)
-                dividends = [x for x in dividends if
-                             trade.open_operation().settlement() <= x.ex_date() <= trade.close_operation().settlement()]
+                dividends = account_dividends.find(0, trade.open_operation().settlement(),
+                                                   trade.close_operation().settlement())
                 for dividend in dividends:
                     short_dividend_eur += dividend.amount(self._currency_id)
                 note = f"Dividend withheld: {short_dividend_eur} EUR" if short_dividend_eur > Decimal('0') else ''
@@ -99,7 +101,7 @@ class TaxesPortugal(TaxReport):
                 'o_type': "Buy" if trade.qty() >= Decimal('0') else "Sell",
                 'o_number': trade.open_operation().number(),
                 'o_date': trade.open_operation().timestamp(),
-                'o_rate': self.account_currency.quote(trade.open_operation().timestamp(), self._currency_id)[1],
+                'o_rate': self.rate(trade.open_operation().timestamp()),
                 'os_date': trade.open_operation().settlement(),
                 'os_rate': os_rate,
                 'o_price': trade.open_operation().price(),
@@ -110,7 +112,7 @@ class TaxesPortugal(TaxReport):
                 'c_type': "Sell" if trade.qty() >= Decimal('0') else "Buy",
                 'c_number': trade.close_operation().number(),
                 'c_date': trade.close_operation().timestamp(),
-                'c_rate': self.account_currency.quote(trade.close_operation().timestamp(), self._currency_id)[1],
+                'c_rate': self.rate(trade.close_operation().timestamp()),
                 'cs_date': trade.close_operation().settlement(),
                 'cs_rate': cs_rate,
                 'c_price': trade.close_operation().price(),
@@ -4,7 +4,7 @@ from jal.db.helpers import remove_exponent
 from jal.db.operations import LedgerTransaction, Dividend, CorporateAction
 from jal.db.asset import JalAsset
 from jal.db.category import JalCategory
-from jal.data_export.taxes import TaxReport
+from jal.data_export.taxes import TaxReport, IntervalIndex
 
 
 # -----------------------------------------------------------------------------------------------------------------------
@@ -62,7 +62,7 @@ class TaxesRussia(TaxReport):
                 'isin': dividend.asset().isin(),
                 'amount': dividend.amount(self.account_currency.id()),
                 'tax': dividend.tax(),
-                'rate': self.account_currency.quote(dividend.timestamp(), self._currency_id)[1],
+                'rate': self.rate(dividend.timestamp()),
                 'country': country.name(language='ru'),
                 'country_iso': country.iso_code(),  # it is required for DLSG export
                 'tax_treaty': "Да" if self.has_tax_treaty_with(country.code()) else "Нет",
@@ -83,13 +83,14 @@ class TaxesRussia(TaxReport):
         dividends_withdrawn = Dividend.get_list(self.account.id(), subtype=Dividend.Dividend)
         dividends_withdrawn = [x for x in dividends_withdrawn if self.year_begin <= x.timestamp() <= self.year_end]
         dividends_withdrawn = [x for x in dividends_withdrawn if x.amount() < Decimal('0')]
+        dividends_withdrawn = IntervalIndex(dividends_withdrawn, key=lambda x: x.asset().id(), position=lambda x: x.ex_date())
         for trade in trades_list:
             if ns:
-                os_rate = self.account_currency.quote(trade.open_operation().timestamp(), self._currency_id)[1]
-                cs_rate = self.account_currency.quote(trade.close_operation().timestamp(), self._currency_id)[1]
+                os_rate = self.rate(trade.open_operation().timestamp())
+                cs_rate = self.rate(trade.close_operation().timestamp())
             else:
-                os_rate = self.account_currency.quote(trade.open_operation().settlement(), self._currency_id)[1]
-                cs_rate = self.account_currency.quote(trade.close_operation().settlement(), self._currency_id)[1]
+                os_rate = self.rate(trade.open_operation().settlement())
+                cs_rate = self.rate(trade.close_operation().settlement())
             if trade.qty() >= Decimal('0'):  # Long trade
                 note = ''
                 income = round(trade.close_amount(no_settlement=ns), 2)
@@ -100,12 +101,11 @@ class TaxesRussia(TaxReport):
                 # Check were there any dividends during short position holding
                 short_dividend = Decimal('0')
                 short_dividend_rub = Decimal('0')
-                div_list = [x for x in dividends_withdrawn if x.asset().id() == trade.asset().id()]
-                div_list = [x for x in div_list if trade.open_operation().settlement() <= x.ex_date() <= trade.close_operation().settlement()]
+                div_list = dividends_withdrawn.find(trade.asset().id(), trade.open_operation().settlement(),
+                                                    trade.close_operation().settlement(), remove=True)
                 for dividend in div_list:
                     short_dividend -= dividend.amount()
                     short_dividend_rub -= dividend.amount(self._currency_id)  # amount is negative
-                dividends_withdrawn = [x for x in dividends_withdrawn if not x in div_list]
                 note = f"Удержан дивиденд: {short_dividend_rub:.2f} RUB ({short_dividend:.2f} {self.account_currency.symbol()})" if short_dividend_rub > Decimal('0') else ''
                 income = round(trade.open_amount(no_settlement=ns), 2)
                 income_rub = round(trade.open_amount(self._currency_id, no_settlement=ns), 2)
@@ -120,7 +120,7 @@ class TaxesRussia(TaxReport):
                 'o_type': "Покупка" if trade.qty() >= Decimal('0') else "Продажа",
                 'o_number': trade.open_operation().number(),
                 'o_date': trade.open_operation().timestamp(),
-                'o_rate': self.account_currency.quote(trade.open_operation().timestamp(), self._currency_id)[1],
+                'o_rate': self.rate(trade.open_operation().timestamp()),
                 'os_date': trade.open_operation().settlement(),
                 'os_rate': os_rate,
                 'o_price': trade.open_operation().price(),
@@ -131,7 +131,7 @@ class TaxesRussia(TaxReport):
                 'c_type': "Продажа" if trade.qty() >= Decimal('0') else "Покупка",
                 'c_number': trade.close_operation().number(),
                 'c_date': trade.close_operation().timestamp(),
-                'c_rate': self.account_currency.quote(trade.close_operation().timestamp(), self._currency_id)[1],
+                'c_rate': self.rate(trade.close_operation().timestamp()),
                 'cs_date': trade.close_operation().settlement(),
                 'cs_rate': cs_rate,
                 'c_price': trade.close_operation().price(),
@@ -163,11 +163,11 @@ class TaxesRussia(TaxReport):
         trades = self.bonds_trades_list()
         for trade in trades:
             if ns:
-                os_rate = self.account_currency.quote(trade.open_operation().timestamp(), self._currency_id)[1]
-                cs_rate = self.account_currency.quote(trade.close_operation().timestamp(), self._currency_id)[1]
+                os_rate = self.rate(trade.open_operation().timestamp())
+                cs_rate = self.rate(trade.close_operation().timestamp())
             else:
-                os_rate = self.account_currency.quote(trade.open_operation().settlement(), self._currency_id)[1]
-                cs_rate = self.account_currency.quote(trade.close_operation().settlement(), self._currency_id)[1]
+                os_rate = self.rate(trade.open_operation().settlement())
+                cs_rate = self.rate(trade.close_operation().settlement())
             if trade.qty() >= Decimal('0'):  # Long trade
                 income = round(trade.close_amount(no_settlement=ns), 2) + trade.close_operation().accrued_interest()
                 income_rub = round(trade.close_amount(self._currency_id, no_settlement=ns), 2) + round(trade.close_operation().accrued_interest(self._currency_id), 2)
@@ -188,7 +188,7 @@ class TaxesRussia(TaxReport):
                 'o_type': "Покупка" if trade.qty() >= Decimal('0') else "Продажа",
                 'o_number': trade.open_operation().number(),
                 'o_date': trade.open_operation().timestamp(),
-                'o_rate': self.account_currency.quote(trade.open_operation().timestamp(), self._currency_id)[1],
+                'o_rate': self.rate(trade.open_operation().timestamp()),
                 'os_date': trade.open_operation().settlement(),
                 'os_rate': os_rate,
                 'o_price': Decimal('100') * trade.open_operation().price() / trade.asset().principal(),
@@ -201,7 +201,7 @@ class TaxesRussia(TaxReport):
                 'c_type': "Продажа" if trade.qty() >= Decimal('0') else "Покупка",
                 'c_number': trade.close_operation().number(),
                 'c_date': trade.close_operation().timestamp(),
-                'c_rate': self.account_currency.quote(trade.close_operation().timestamp(), self._currency_id)[1],
+                'c_rate': self.rate(trade.close_operation().timestamp()),
                 'cs_date': trade.close_operation().settlement(),
                 'cs_rate': cs_rate,
                 'c_price': Decimal('100') * trade.close_operation().price() / trade.asset().principal(),
@@ -225,7 +225,7 @@ class TaxesRussia(TaxReport):
         interests = [x for x in interests if self.year_begin <= x.timestamp() <= self.year_end]  # Only in given range
         for interest in interests:
             amount = interest.amount()
-            rate = currency.quote(interest.timestamp(), self._currency_id)[1]
+            rate = self.rate(interest.timestamp())
             amount_rub = round(amount * rate, 2)
             line = {
                 'report_template': "bond_interest",
@@ -257,17 +257,16 @@ class TaxesRussia(TaxReport):
     def prepare_crypto(self):
         country = self.account.country()
         crypto_report = []
-        trades = self.account.closed_trades_list()
-        trades = [x for x in trades if x.asset().type() == PredefinedAsset.Crypto]
-        trades = [x for x in trades if x.close_operation().type() == LedgerTransaction.Trade]
-        trades = [x for x in trades if x.open_operation().type() == LedgerTransaction.Trade]
-        trades = [x for x in trades if self.year_begin <= x.close_operation().settlement() <= self.year_end]
+        trades = self.account.closed_trades_list(self.year_begin, self.year_end, settlement=True,
+                                                 asset_types=[PredefinedAsset.Crypto],
+                                                 open_types=[LedgerTransaction.Trade],
+                                                 close_types=[LedgerTransaction.Trade])
         for trade in trades:
-            o_rate = self.account_currency.quote(trade.open_operation().timestamp(), self._currency_id)[1]
-            c_rate = self.account_currency.quote(trade.close_operation().timestamp(), self._currency_id)[1]
+            o_rate = self.rate(trade.open_operation().timestamp())
+            c_rate = self.rate(trade.close_operation().timestamp())
             if self.use_settlement:
-                os_rate = self.account_currency.quote(trade.open_operation().settlement(), self._currency_id)[1]
-                cs_rate = self.account_currency.quote(trade.close_operation().settlement(), self._currency_id)[1]
+                os_rate = self.rate(trade.open_operation().settlement())
+                cs_rate = self.rate(trade.close_operation().settlement())
             else:
                 os_rate = o_rate
                 cs_rate = c_rate
@@ -326,7 +325,7 @@ class TaxesRussia(TaxReport):
         fee_operations = JalCategory(PredefinedCategory.Fees).get_operations(self.year_begin, self.year_end)
         fee_operations = [x for x in fee_operations if x.account_id() == self.account.id()]
         for operation in fee_operations:
-            rate = self.account_currency.quote(operation.timestamp(), self._currency_id)[1]
+            rate = self.rate(operation.timestamp())
             fees = [x for x in operation.lines() if x['category_id'] == PredefinedCategory.Fees]
             for fee in fees:
                 amount = -Decimal(fee['amount'])
@@ -348,7 +347,7 @@ class TaxesRussia(TaxReport):
         interest_operations = JalCategory(PredefinedCategory.Interest).get_operations(self.year_begin, self.year_end)
         interest_operations = [x for x in interest_operations if x.account_id() == self.account.id()]
         for operation in interest_operations:
-            rate = self.account_currency.quote(operation.timestamp(), self._currency_id)[1]
+            rate = self.rate(operation.timestamp())
             interests = [x for x in operation.lines() if x['category_id'] == PredefinedCategory.Interest]
             for interest in interests:
                 amount = Decimal(interest['amount'])
@@ -366,7 +365,7 @@ class TaxesRussia(TaxReport):
         payments = CorporateAction.get_payments(self.account)
         payments = [x for x in payments if self.year_begin <= x['timestamp'] <= self.year_end]
         for payment in payments:
-            rate = self.account_currency.quote(payment['timestamp'], self._currency_id)[1]
+            rate = self.rate(payment['timestamp'])
             line = {
                 'report_template': "interest",
                 'payment_date': payment['timestamp'],
@@ -383,10 +382,9 @@ class TaxesRussia(TaxReport):
     # -----------------------------------------------------------------------------------------------------------------------
     def prepare_corporate_actions(self):
         corporate_actions_report = []
-        trades = self.account.closed_trades_list()
-        trades = [x for x in trades if x.close_operation().type() == LedgerTransaction.Trade]
-        trades = [x for x in trades if x.open_operation().type() == LedgerTransaction.CorporateAction]
-        trades = [x for x in trades if self.year_begin <= x.close_operation().settlement() <= self.year_end]
+        trades = self.account.closed_trades_list(self.year_begin, self.year_end, settlement=True,
+                                                 open_types=[LedgerTransaction.CorporateAction],
+                                                 close_types=[LedgerTransaction.Trade])
         trades = sorted(trades, key=lambda x: (x.asset().symbol(self.account_currency.id()), x.close_operation().timestamp()))
         group = 1
         share = Decimal('1.0')   # This will track share of processed asset, so it starts from 100.0%
@@ -394,9 +392,9 @@ class TaxesRussia(TaxReport):
         for trade in trades:
             lines = []
             sale = trade.close_operation()
-            t_rate = self.account_currency.quote(sale.timestamp(), self._currency_id)[1]
+            t_rate = self.rate(sale.timestamp())
             if self.use_settlement:
-                s_rate = self.account_currency.quote(sale.settlement(), self._currency_id)[1]
+                s_rate = self.rate(sale.settlement())
             else:
                 s_rate = t_rate
             if previous_symbol != sale.asset().symbol(self.account_currency.id()):
@@ -457,8 +455,7 @@ class TaxesRussia(TaxReport):
 
     def next_corporate_action(self, actions, trade, qty, share, level, group):
         # get list of deals that were closed as result of current corporate action
-        trades = self.account.closed_trades_list()
-        trades = [x for x in trades if x.close_operation().type() == LedgerTransaction.CorporateAction]
+        trades = self.account.closed_trades_list(close_types=[LedgerTransaction.CorporateAction])
         trades = [x for x in trades if x.close_operation().id() == trade.open_operation().id()]
         for item in trades:
             if item.open_operation().type() == LedgerTransaction.Trade:
@@ -471,9 +468,9 @@ class TaxesRussia(TaxReport):
     def output_purchase(self, actions, purchase, proceed_qty, share, level, group):
         if proceed_qty <= Decimal('0'):
             return proceed_qty
-        t_rate = self.account_currency.quote(purchase.timestamp(), self._currency_id)[1]
+        t_rate = self.rate(purchase.timestamp())
         if self.use_settlement:
-            s_rate = self.account_currency.quote(purchase.settlement(), self._currency_id)[1]
+            s_rate = self.rate(purchase.settlement())
         else:
             s_rate = t_rate
         if purchase.id() in self._processed_trade_qty:   # we have some qty processed already
@@ -560,7 +557,7 @@ class TaxesRussia(TaxReport):
         accrued_interest = operation.accrued_interest()
         if accrued_interest == Decimal('0'):
             return
-        rate = self.account_currency.quote(operation.timestamp(), self._currency_id)[1]
+        rate = self.rate(operation.timestamp())
         interest = accrued_interest if share == 1 else share * accrued_interest
         interest_rub = abs(round(interest * rate, 2))
         if interest < 0:  # Accrued interest paid for purchase
@@ -2,7 +2,9 @@ import importlib   # it is used for delayed import in order to avoid circular re
 import os
 import json
 import logging
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timezone
+from decimal import Decimal
 from PySide6.QtWidgets import QApplication
 
 from jal.constants import Setup, PredefinedAsset
@@ -13,6 +15,63 @@ from jal.db.operations import LedgerTransaction, Dividend
 
 REPORT_METHOD = 0
 REPORT_TEMPLATE = 1
+DAY = 86400
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Dense table of daily rates of an asset in given currency for [begin, end] interval. The table keeps a rate that is in
+# effect at the start of every day, so rate for any timestamp is taken by index without search. Days that have
+# quotes inside them (not at day start) and days without any rate are resolved with usual JalAsset.quote() call
+# in order to get exactly the same result (including cross-rates and warnings about missing rates).
+class RateTable:
+    def __init__(self, asset: JalAsset, currency_id: int, begin: int, end: int):
+        self._asset = asset
+        self._currency_id = currency_id
+        self._begin = begin - begin % DAY
+        self._rates = []
+        self._intraday = set()   # indices of days that have quotes not at day start
+        quotes = asset.quotes(0, end, currency_id)
+        i = 0
+        rate = None
+        for day in range(self._begin, end + 1, DAY):
+            while i < len(quotes) and quotes[i][0] <= day:
+                rate = quotes[i][1]
+                i += 1
+            if i < len(quotes) and quotes[i][0] < day + DAY:
+                self._intraday.add(len(self._rates))
+            self._rates.append(rate)
+
+    def rate(self, timestamp: int) -> Decimal:
+        i = (timestamp - self._begin) // DAY
+        if 0 <= i < len(self._rates) and i not in self._intraday and self._rates[i] is not None:
+            return self._rates[i]
+        return self._asset.quote(timestamp, self._currency_id)[1]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Index of items (operations) grouped by a key and sorted by position (timestamp) inside every group. It allows to
+# select items with given key and position within [begin, end] interval with binary search.
+class IntervalIndex:
+    def __init__(self, items: list, key, position):
+        self._positions = {}
+        self._items = {}
+        for item in sorted(items, key=position):
+            self._positions.setdefault(key(item), []).append(position(item))
+            self._items.setdefault(key(item), []).append(item)
+
+    # Returns a list of items with given key and position within [begin, end]. Returned items are removed from index
+    # if 'remove' is True
+    def find(self, key, begin: int, end: int, remove: bool = False) -> list:
+        if key not in self._positions:
+            return []
+        i = bisect_left(self._positions[key], begin)
+        j = bisect_right(self._positions[key], end)
+        items = self._items[key][i:j]
+        if remove:
+            del self._positions[key][i:j]
+            del self._items[key][i:j]
+        return items
+
 
 class TaxReport:
     PORTUGAL = 0
@@ -37,6 +96,7 @@ class TaxReport:
         self.year_end = 0
         self.use_settlement = True
         self._parameters = {}
+        self._rates = {}              # {currency_id: RateTable} - rates of currencies for report year
 
     def tr(self, text):
         return QApplication.translate("TaxReport", text)
@@ -96,10 +156,22 @@ class TaxReport:
         if 'use_settlement' in kwargs:
             self.use_settlement = kwargs['use_settlement']
         self.load_parameters(year)
+        self._rates = {}
         for report in self.reports:
             tax_report[report] = self.reports[report][REPORT_METHOD]()
         return tax_report
 
+    # Returns rate of given currency (account currency by default) in report currency for given timestamp. Rates are
+    # taken from a daily rate table that is prepared once per currency for the report year
+    def rate(self, timestamp: int, currency_id: int = None) -> Decimal:
+        currency_id = self.account_currency.id() if currency_id is None else currency_id
+        if currency_id == self._currency_id:
+            return Decimal('1')
+        if currency_id not in self._rates:
+            self._rates[currency_id] = RateTable(JalAsset(currency_id), self._currency_id,
+                                                 self.year_begin, self.year_end + 7 * DAY)
+        return self._rates[currency_id].rate(timestamp)
+
     # Check if 2-letter country code present in tax treaty parameter of current report
     def has_tax_treaty_with(self, country_code: str) -> bool:
         if Setup.TAX_TREATY_PARAM not in self._parameters:
@@ -120,28 +192,23 @@ class TaxReport:
 
     # Returns a list of closed stock/ETF trades that should be included into the report for given year
     def shares_trades_list(self) -> list:
-        trades = self.account.closed_trades_list()
-        trades = [x for x in trades if x.asset().type() in [PredefinedAsset.Stock, PredefinedAsset.ETF]]
-        trades = [x for x in trades if x.close_operation().type() == LedgerTransaction.Trade]
+        trades = self.account.closed_trades_list(self.year_begin, self.year_end, settlement=True,
+                                                 asset_types=[PredefinedAsset.Stock, PredefinedAsset.ETF],
+                                                 open_types=[LedgerTransaction.Trade, LedgerTransaction.Dividend],
+                                                 close_types=[LedgerTransaction.Trade])
         trades = [x for x in trades if x.open_operation().type() == LedgerTransaction.Trade or (
-                x.open_operation().type() == LedgerTransaction.Dividend and (
                 x.open_operation().subtype() == Dividend.StockDividend or
-                x.open_operation().subtype() == Dividend.StockVesting))]
-        trades = [x for x in trades if self.year_begin <= x.close_operation().settlement() <= self.year_end]
+                x.open_operation().subtype() == Dividend.StockVesting)]
         return trades
 
     def derivatives_trades_list(self) -> list:
-        trades = self.account.closed_trades_list()
-        trades = [x for x in trades if x.asset().type() == PredefinedAsset.Derivative]
-        trades = [x for x in trades if x.close_operation().type() == LedgerTransaction.Trade]
-        trades = [x for x in trades if x.open_operation().type() == LedgerTransaction.Trade]
-        trades = [x for x in trades if self.year_begin <= x.close_operation().settlement() <= self.year_end]
-        return trades
+        return self.account.closed_trades_list(self.year_begin, self.year_end, settlement=True,
+                                               asset_types=[PredefinedAsset.Derivative],
+                                               open_types=[LedgerTransaction.Trade],
+                                               close_types=[LedgerTransaction.Trade])
 
     def bonds_trades_list(self) -> list:
-        trades = self.account.closed_trades_list()
-        trades = [x for x in trades if x.asset().type() == PredefinedAsset.Bond]
-        trades = [x for x in trades if x.close_operation().type() == LedgerTransaction.Trade]
-        trades = [x for x in trades if x.open_operation().type() == LedgerTransaction.Trade]
-        trades = [x for x in trades if self.year_begin <= x.close_operation().settlement() <= self.year_end]
-        return trades
+        return self.account.closed_trades_list(self.year_begin, self.year_end, settlement=True,
+                                               asset_types=[PredefinedAsset.Bond],
+                                               open_types=[LedgerTransaction.Trade],
+                                               close_types=[LedgerTransaction.Trade])
@@ -12,19 +12,17 @@ class TaxesFlowRus:
         self.year_end = 0
         self.flows = {}
 
-    def get_account_values(self, account, date):
-        values = []
-        assets = account.assets_list(date)
-        assets_value = Decimal('0')
-        for asset_data in assets:
-            assets_value += asset_data['amount'] * asset_data['asset'].quote(date, account.currency())[1]
-        if assets_value != Decimal('0'):
-            values.append({'account': account.id(), 'currency': JalAsset(account.currency()).symbol(),
-                           'is_currency': False, 'value': assets_value})
-        money = account.get_asset_amount(date, account.currency())
-        if money != Decimal('0'):
-            values.append({'account': account.id(),'currency': JalAsset(account.currency()).symbol(),
-                           'is_currency': True, 'value': money})
+    # Returns values of assets and money on the account at the beginning and the end of the year
+    def get_account_values(self, account):
+        values = {"begin": [], "end": []}
+        balances = account.balances([self.year_begin, self.year_end])
+        for period, balance in zip(["begin", "end"], balances):
+            if balance['assets'] != Decimal('0'):
+                values[period].append({'account': account.id(), 'currency': JalAsset(account.currency()).symbol(),
+                                       'is_currency': False, 'value': balance['assets']})
+            if balance['money'] != Decimal('0'):
+                values[period].append({'account': account.id(), 'currency': JalAsset(account.currency()).symbol(),
+                                       'is_currency': True, 'value': balance['money']})
         return values
 
     def prepare_flow_report(self, year):
@@ -39,8 +37,9 @@ class TaxesFlowRus:
         for account in accounts:
             if account.country().code() == 'xx' or account.country().code() == 'ru':
                 continue
-            values_begin += self.get_account_values(account, self.year_begin)
-            values_end += self.get_account_values(account, self.year_end)
+            values = self.get_account_values(account)
+            values_begin += values['begin']
+            values_end += values['end']
         values_begin = sorted(values_begin, key=lambda x: (JalAccount(account_id=x['account']).number(), x['is_currency'], x['currency']))
         values_end = sorted(values_end, key=lambda x: (JalAccount(account_id=x['account']).number(), x['is_currency'], x['currency']))
         for item in values_begin:
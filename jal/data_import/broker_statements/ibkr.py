@@ -126,6 +126,7 @@ class StatementIBKR(StatementXML):
     statements_path = '/*/FlexStatement'
     statement_tag = 'FlexStatement'
     level_tag = 'levelOfDetail'
+    streaming = True
     CancelledFlag = 'Ca'
     ReversalCode = 'Re'
     ReversalSuffix = " - REVERSAL"
@@ -295,10 +296,11 @@ class StatementIBKR(StatementXML):
     def save_debug_info(self, account, asset):
         # Dump statement info relevant to given asset
         debug_info = 'Statement data:\n----------------------------------------------------------------\n'
-        assert self._statement is not None
+        statement = self.statement_element()
+        assert statement is not None
         symbols = [x['symbol'] for x in self._data[FOF.SYMBOLS] if x["asset"] == asset]
         for symbol in symbols:
-            elements = self._statement.findall(f".//*[@symbol='{symbol}']")
+            elements = statement.findall(f".//*[@symbol='{symbol}']")
             for element in elements:
                 if 'accountId' in element.attrib:
                     element.attrib['accountId'] = 'U7654321'  # Hide real account number
@@ -463,7 +465,7 @@ class StatementIBKR(StatementXML):
         logging.info(self.tr("Trades loaded: ") + f"{trades_loaded + transfers_loaded} ({len(ib_trades)})")
 
     def load_trades(self, trades):
-        trade_base = max([0] + [x['id'] for x in self._data[FOF.TRADES]]) + 1
+        trade_base = self._data.next_id(FOF.TRADES)
         cnt = 0
         for i, trade in enumerate(sorted(trades, key=lambda x: x['timestamp'])):
             trade['id'] = trade_base + i
@@ -483,7 +485,7 @@ class StatementIBKR(StatementXML):
         return cnt
 
     def load_transfers(self, transfers):
-        transfer_base = max([0] + [x['id'] for x in self._data[FOF.TRANSFERS]]) + 1
+        transfer_base = self._data.next_id(FOF.TRANSFERS)
         cnt = 0
         for i, transfer in enumerate(sorted(transfers, key=lambda x: x['timestamp'])):
             transfer['id'] = transfer_base + i
@@ -501,7 +503,7 @@ class StatementIBKR(StatementXML):
         return cnt
 
     def load_asset_transfers(self, transfers):
-        transfer_base = max([0] + [x['id'] for x in self._data[FOF.TRANSFERS]]) + 1
+        transfer_base = self._data.next_id(FOF.TRANSFERS)
         cnt = 0
         for i, transfer in enumerate(transfers):
             transfer['id'] = transfer_base + i
@@ -648,7 +650,7 @@ class StatementIBKR(StatementXML):
         asset_b = self.locate_asset(merger_a['symbol_old'], merger_a['isin_old'])
 
         if pattern_id == 4:  # Asset converted to money -> store it as a sell trade
-            action['id'] = max([0] + [x['id'] for x in self._data[FOF.TRADES]]) + 1
+            action['id'] = self._data.next_id(FOF.TRADES)
             action['settlement'] = action['timestamp']
             action['price'] = action['proceeds'] / (-action['quantity'])
             action['note'] = action.pop('description')
@@ -666,7 +668,7 @@ class StatementIBKR(StatementXML):
             existing_action = self.locate_existing_merger(action['timestamp'],
                                                           action['account'], paired_record[0]['asset'])
         if existing_action is None:
-            action['id'] = max([0] + [x['id'] for x in self._data[FOF.CORP_ACTIONS]]) + 1
+            action['id'] = self._data.next_id(FOF.CORP_ACTIONS)
             action['outcome'] = [{'asset': action['asset'], 'quantity': action['quantity']/adj_factor, 'share': 0.0}]
             action['asset'] = paired_record[0]['asset']
             action['quantity'] = -paired_record[0]['quantity']/adj_factor
@@ -709,7 +711,7 @@ class StatementIBKR(StatementXML):
         if abs(round(qty_old) - qty_old) > 0.01:
             raise Statement_ImportError(self.tr("Spin-off rounding error is too big ") + f"'{action}'")
         qty_old = round(qty_old)
-        action['id'] = max([0] + [x['id'] for x in self._data[FOF.CORP_ACTIONS]]) + 1
+        action['id'] = self._data.next_id(FOF.CORP_ACTIONS)
         action['outcome'] = [{'asset': asset_old, 'quantity': qty_old, 'share': 0.0},
                              {'asset': action['asset'], 'quantity': action['quantity'], 'share': 0.0}]
         action['asset'] = asset_old
@@ -730,7 +732,7 @@ class StatementIBKR(StatementXML):
         description_b = action['description'][:parts.span('symbol')[0]] + isin_change['symbol_old']
         asset_b = self.locate_asset(isin_change['symbol_old'], isin_change['isin_old'])
         paired_record = self.find_corp_action_pair(asset_b, description_b, action, parts_b)
-        action['id'] = max([0] + [x['id'] for x in self._data[FOF.CORP_ACTIONS]]) + 1
+        action['id'] = self._data.next_id(FOF.CORP_ACTIONS)
         action['outcome'] = [{'asset': action['asset'], 'quantity': action['quantity'], 'share': 1.0}]
         action['asset'] = paired_record[0]['asset']
         action['quantity'] = -paired_record[0]['quantity']
@@ -747,7 +749,7 @@ class StatementIBKR(StatementXML):
             raise Statement_ImportError(self.tr("Can't parse Stock Dividend description ") + f"'{action}'")
         action['description'] = parts.groupdict()['description']
 
-        action['id'] = max([0] + [x['id'] for x in self._data[FOF.ASSET_PAYMENTS]]) + 1
+        action['id'] = self._data.next_id(FOF.ASSET_PAYMENTS)
         action['amount'] = action['quantity']
         action['price'] = format_decimal(Decimal(str(action['value'])) / Decimal(str(action['quantity'])))
         action['tax'] = 0
@@ -768,7 +770,7 @@ class StatementIBKR(StatementXML):
             qty_delta = action['quantity']
             qty_old = qty_delta / (int(split['X']) / int(split['Y']) - 1)
             qty_new = qty_old + qty_delta
-            action['id'] = max([0] + [x['id'] for x in self._data[FOF.CORP_ACTIONS]]) + 1
+            action['id'] = self._data.next_id(FOF.CORP_ACTIONS)
             action['outcome'] = [{'asset': action['asset'], 'quantity': qty_new, 'share': 1.0}]
             action['quantity'] = qty_old
             self.drop_extra_fields(action, ["value", "proceeds", "code", "asset_type", "jal_processed"])
@@ -778,7 +780,7 @@ class StatementIBKR(StatementXML):
             description_b = action['description'][:parts.span('symbol')[0]] + split['symbol_old']
             asset_b = self.locate_asset(split['symbol_old'], split['isin_old'])
             paired_record = self.find_corp_action_pair(asset_b, description_b, action, parts_b)
-            action['id'] = max([0] + [x['id'] for x in self._data[FOF.CORP_ACTIONS]]) + 1
+            action['id'] = self._data.next_id(FOF.CORP_ACTIONS)
             action['outcome'] = [{'asset': action['asset'], 'quantity': action['quantity'], 'share': 1.0}]
             action['asset'] = paired_record[0]['asset']
             action['quantity'] = -paired_record[0]['quantity']
@@ -789,7 +791,7 @@ class StatementIBKR(StatementXML):
 
     # Bond maturity is processed as ordinary bond
     def load_bond_maturity(self, action, parts_b) -> int:
-        action['id'] = max([0] + [x['id'] for x in self._data[FOF.TRADES]]) + 1
+        action['id'] = self._data.next_id(FOF.TRADES)
         action['quantity'] = action['quantity'] / IBKR_Asset.BondPrincipal
         action['price'] = action['proceeds'] / (-action['quantity'])  # Quantity is negative, bonds are withdrawn
         action['settlement'] = action['timestamp']                    # Settled by the same date
@@ -805,7 +807,7 @@ class StatementIBKR(StatementXML):
         asset = [x for x in self._data[FOF.ASSETS] if x['id'] == action['asset']][0]
         if asset['type'] == FOF.ASSET_RIGHTS:
             return 0
-        action['id'] = max([0] + [x['id'] for x in self._data[FOF.CORP_ACTIONS]]) + 1
+        action['id'] = self._data.next_id(FOF.CORP_ACTIONS)
         action['asset'] = action['asset']
         action['quantity'] = -action['quantity']
         action['outcome'] = []
@@ -815,7 +817,7 @@ class StatementIBKR(StatementXML):
 
     def load_vestings(self, vestings):
         cnt = 0
-        asset_payments_base = max([0] + [x['id'] for x in self._data[FOF.ASSET_PAYMENTS]]) + 1
+        asset_payments_base = self._data.next_id(FOF.ASSET_PAYMENTS)
         for i, vesting in enumerate(vestings):
             vesting['id'] = asset_payments_base + i
             vesting['type'] = FOF.PAYMENT_STOCK_VESTING
@@ -829,7 +831,7 @@ class StatementIBKR(StatementXML):
         dividends = list(filter(lambda tr: tr['type'] in ['Dividends', 'Payment In Lieu Of Dividends'], cash))
         dividends = [drop_fields(x, ['tid']) for x in dividends]  # remove 'tid' field as not used for dividends
         dividends = self.aggregate_dividends(dividends)
-        asset_payments_base = max([0] + [x['id'] for x in self._data[FOF.ASSET_PAYMENTS]]) + 1
+        asset_payments_base = self._data.next_id(FOF.ASSET_PAYMENTS)
         for i, dividend in enumerate(dividends):
             dividend['id'] = asset_payments_base + i
             dividend['type'] = FOF.PAYMENT_DIVIDEND
@@ -851,7 +853,7 @@ class StatementIBKR(StatementXML):
         for tax in taxes:
             cnt += self.apply_tax_withheld(tax)
 
-        transfer_base = max([0] + [x['id'] for x in self._data[FOF.TRANSFERS]]) + 1
+        transfer_base = self._data.next_id(FOF.TRANSFERS)
         transfers = list(filter(lambda tr: tr['type'] == 'Deposits/Withdrawals', cash))
         for i, transfer in enumerate(transfers):
             transfer['id'] = transfer_base + i
@@ -868,7 +870,7 @@ class StatementIBKR(StatementXML):
             self._data[FOF.TRANSFERS].append(transfer)
             cnt += 1
 
-        payment_base = max([0] + [x['id'] for x in self._data[FOF.INCOME_SPENDING]]) + 1
+        payment_base = self._data.next_id(FOF.INCOME_SPENDING)
         fees = list(filter(lambda tr: 'type' in tr and tr['type'] in ['Other Fees',
                                                                       'Commission Adjustments',  #FIXME Link this fee with asset
                                                                       'Broker Interest Paid',
@@ -965,7 +967,7 @@ class StatementIBKR(StatementXML):
 
     def load_taxes(self, taxes):
         cnt = 0   #FIXME Link this tax with asset
-        tax_base = max([0] + [x['id'] for x in self._data[FOF.INCOME_SPENDING]]) + 1
+        tax_base = self._data.next_id(FOF.INCOME_SPENDING)
         for i, tax in enumerate(taxes):
             tax['id'] = tax_base + i
             tax['peer'] = 0
@@ -978,7 +980,7 @@ class StatementIBKR(StatementXML):
 
     def load_cfd_charges(self, charges):
         cnt = 0
-        charges_base = max([0] + [x['id'] for x in self._data[FOF.INCOME_SPENDING]]) + 1
+        charges_base = self._data.next_id(FOF.INCOME_SPENDING)
         for i, charge in enumerate(charges):
             if charge['asset'] != self.NoAsset and not charge['description'].startswith('CFD BORROW FEE FOR'):
                 # FIXME if asset is present -> put this charge not in Income/Spending but in Asset Payments section
@@ -1028,6 +1030,17 @@ class StatementIBKR(StatementXML):
             self._data[FOF.ASSET_PAYMENTS].append(dividend)
         return 1
 
+    # Returns list of dividends from database for given account and asset
+    def _db_dividends(self, db_account, db_asset) -> list:
+        return [{
+            "id": -x.oid(),
+            "timestamp": x.timestamp(),
+            "number": x.number(),
+            "amount": float(x.amount()),
+            "tax": float(x.tax()),
+            "description": x.note()
+        } for x in Dividend.get_list(db_account, db_asset, Dividend.Dividend)]
+
     # Searches for dividend that matches tax in the best way:
     # - it should have exactly the same account_id and asset_id
     # - tax amount withheld from dividend should be equal to provided 'tax' value
@@ -1041,20 +1054,11 @@ class StatementIBKR(StatementXML):
         dividends = [x for x in self._data[FOF.ASSET_PAYMENTS] if
                      (x['type'] == FOF.PAYMENT_DIVIDEND or x['type'] == FOF.PAYMENT_STOCK_DIVIDEND)
                      and x['asset'] == asset_id and x['account'] == account_id]
-        db_account = self._map_db_account(account_id)
-        db_asset = self._map_db_asset(asset_id)
+        db_account = self._read_db('_map_db_account', account_id)
+        db_asset = self._read_db('_map_db_asset', asset_id)
         if db_account and db_asset:
-            for db_dividend in Dividend.get_list(db_account, db_asset, Dividend.Dividend):
-                dividends.append({
-                    "id": -db_dividend.oid(),
-                    "account": account_id,
-                    "asset": asset_id,
-                    "timestamp": db_dividend.timestamp(),
-                    "number": db_dividend.number(),
-                    "amount": float(db_dividend.amount()),
-                    "tax": float(db_dividend.tax()),
-                    "description": db_dividend.note()
-                })
+            for db_dividend in self._read_db('_db_dividends', db_account, db_asset):
+                dividends.append(dict(db_dividend, account=account_id, asset=asset_id))
         if datetime.utcfromtimestamp(timestamp).timetuple().tm_yday < 75:
             # We may have wrong date in taxes before March, 15 due to tax correction
             range_start, _range_end = ManipulateDate.PreviousYear(day=datetime.utcfromtimestamp(timestamp))
@@ -5,7 +5,6 @@ from datetime import datetime, timezone
 from jal.constants import PredefinedCategory
 from jal.data_import.statement import FOF, Statement_ImportError
 from jal.data_import.statement_xls import StatementXLS
-from jal.db.asset import JalAsset
 
 JAL_STATEMENT_CLASS = "StatementJ2T"
 
@@ -135,7 +134,7 @@ class StatementJ2T(StatementXLS):
             # Settlement is stored as date in Excel report file
             settlement = int(self._statement[headers['settlement']][row].replace(tzinfo=timezone.utc).timestamp())
             account_id = self._find_account_id(self._account_number, 'USD')   # FIXME - replace hardcoded 'USD'
-            new_id = max([0] + [x['id'] for x in self._data[FOF.TRADES]]) + 1
+            new_id = self._data.next_id(FOF.TRADES)
             trade = {"id": new_id, "number": deal_number, "timestamp": timestamp, "settlement": settlement,
                      "account": account_id, "asset": asset_id, "quantity": qty, "price": price, "fee": fee}
             self._data[FOF.TRADES].append(trade)
@@ -189,7 +188,7 @@ class StatementJ2T(StatementXLS):
             price = -(amount + fee) / qty
             assert price > 0.0
             account_id = self._find_account_id(self._account_number, self._statement[headers['account_currency']][row])
-            new_id = max([0] + [x['id'] for x in self._data[FOF.TRADES]]) + 1
+            new_id = self._data.next_id(FOF.TRADES)
             trade = {"id": new_id, "number": deal_number, "timestamp": timestamp, "settlement": settlement,
                      "account": account_id, "asset": asset_id, "quantity": qty, "price": price, "fee": fee}
             self._data[FOF.TRADES].append(trade)
@@ -270,7 +269,7 @@ class StatementJ2T(StatementXLS):
         candidates = [x for x in self._data[FOF.ASSETS] if 'name' in x and x['name'] == asset_name]
         if len(candidates) == 1:
             return candidates[0]["id"]
-        asset_id = JalAsset(data={'name': asset_name}, search=True, create=False).id()
+        asset_id = self._read_db('_db_asset_id', {'name': asset_name})
         return -asset_id  # Negative value to indicate that asset was found in db
 
     # This method finds dividend with given parameters in already loaded JSON data
@@ -315,7 +314,7 @@ class StatementJ2T(StatementXLS):
             raise Statement_ImportError(self.tr("Dividend description miss some data ") + f"'{note}'")
         asset_id = self._find_asset_by_name(dividend['asset'])
         ex_date = int(datetime.strptime(dividend['date'], "%d/%m/%Y").replace(tzinfo=timezone.utc).timestamp())
-        new_id = max([0] + [x['id'] for x in self._data[FOF.ASSET_PAYMENTS]]) + 1
+        new_id = self._data.next_id(FOF.ASSET_PAYMENTS)
         payment = {"id": new_id, "type": FOF.PAYMENT_DIVIDEND, "account": account_id, "timestamp": timestamp,
                    "ex_date": ex_date, "asset": asset_id, "amount": amount, "description": note}
         self._data[FOF.ASSET_PAYMENTS].append(payment)
@@ -337,14 +336,14 @@ class StatementJ2T(StatementXLS):
             dividend_record['tax'] = amount
 
     def fee(self, timestamp, account_id, amount, note):
-        new_id = max([0] + [x['id'] for x in self._data[FOF.INCOME_SPENDING]]) + 1
+        new_id = self._data.next_id(FOF.INCOME_SPENDING)
         fee = {"id": new_id, "timestamp": timestamp, "account": account_id, "peer": 0,
                "lines": [{"amount": amount, "category": -PredefinedCategory.Fees, "description": note}]}
         self._data[FOF.INCOME_SPENDING].append(fee)
 
     def transfer_in(self, timestamp, account_id, amount, note):
         account = [x for x in self._data[FOF.ACCOUNTS] if x["id"] == account_id][0]
-        new_id = max([0] + [x['id'] for x in self._data[FOF.TRANSFERS]]) + 1
+        new_id = self._data.next_id(FOF.TRANSFERS)
         transfer = {"id": new_id, "account": [0, account_id, 0],
                     "asset": [account['currency'], account['currency']], "timestamp": timestamp,
                     "withdrawal": amount, "deposit": amount, "fee": 0.0, "description": note}
@@ -352,7 +351,7 @@ class StatementJ2T(StatementXLS):
 
     def transfer_out(self, timestamp, account_id, amount, note):
         account = [x for x in self._data[FOF.ACCOUNTS] if x["id"] == account_id][0]
-        new_id = max([0] + [x['id'] for x in self._data[FOF.TRANSFERS]]) + 1
+        new_id = self._data.next_id(FOF.TRANSFERS)
         transfer = {"id": new_id, "account": [account_id, 0, 0],
                     "asset": [account['currency'], account['currency']], "timestamp": timestamp,
                     "withdrawal": -amount, "deposit": -amount, "fee": 0.0, "description": note}
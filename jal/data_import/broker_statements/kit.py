@@ -83,12 +83,12 @@ class StatementKIT(StatementXLS):
             timestamp = int(trade_datetime.replace(tzinfo=timezone.utc).timestamp())
             settlement = int(self._statement[headers['settlement']][row].replace(tzinfo=timezone.utc).timestamp())
             account_id = self._find_account_id(self._account_number, self._statement[headers['currency']][row])
-            new_id = max([0] + [x['id'] for x in self._data[FOF.TRADES]]) + 1
+            new_id = self._data.next_id(FOF.TRADES)
             trade = {"id": new_id, "number": str(number), "timestamp": timestamp, "settlement": settlement,
                      "account": account_id, "asset": asset_id, "quantity": qty, "price": price, "fee": fee}
             self._data[FOF.TRADES].append(trade)
             if bond_interest != 0:
-                new_id = max([0] + [x['id'] for x in self._data[FOF.ASSET_PAYMENTS]]) + 1
+                new_id = self._data.next_id(FOF.ASSET_PAYMENTS)
                 payment = {"id": new_id, "type": FOF.PAYMENT_INTEREST, "account": account_id, "timestamp": timestamp,
                            "number": str(number), "asset": asset_id, "amount": bond_interest, "description": "НКД"}
                 self._data[FOF.ASSET_PAYMENTS].append(payment)
@@ -138,7 +138,7 @@ class StatementKIT(StatementXLS):
     def transfer_in(self, timestamp, account_id, amount, reason, note):
         account = [x for x in self._data[FOF.ACCOUNTS] if x["id"] == account_id][0]
         description = reason + ", " + note
-        new_id = max([0] + [x['id'] for x in self._data[FOF.TRANSFERS]]) + 1
+        new_id = self._data.next_id(FOF.TRANSFERS)
         transfer = {"id": new_id, "account": [0, account_id, 0],
                     "asset": [account['currency'], account['currency']], "timestamp": timestamp,
                     "withdrawal": amount, "deposit": amount, "fee": 0.0, "description": description}
@@ -147,20 +147,20 @@ class StatementKIT(StatementXLS):
     def transfer_out(self, timestamp, account_id, amount, reason, note):
         account = [x for x in self._data[FOF.ACCOUNTS] if x["id"] == account_id][0]
         description = reason + ", " + note  # amount is negative in XLSX file
-        new_id = max([0] + [x['id'] for x in self._data[FOF.TRANSFERS]]) + 1
+        new_id = self._data.next_id(FOF.TRANSFERS)
         transfer = {"id": new_id, "account": [account_id, 0, 0],
                     "asset": [account['currency'], account['currency']], "timestamp": timestamp,
                     "withdrawal": -amount, "deposit": -amount, "fee": 0.0, "description": description}
         self._data[FOF.TRANSFERS].append(transfer)
 
     def fee(self, timestamp, account_id, amount, _reason, description):
-        new_id = max([0] + [x['id'] for x in self._data[FOF.INCOME_SPENDING]]) + 1
+        new_id = self._data.next_id(FOF.INCOME_SPENDING)
         fee = {"id": new_id, "timestamp": timestamp, "account": account_id, "peer": 0,
                "lines": [{"amount": amount, "category": -PredefinedCategory.Fees, "description": description}]}
         self._data[FOF.INCOME_SPENDING].append(fee)
 
     def interest(self, timestamp, account_id, amount, _reason, description):
-        new_id = max([0] + [x['id'] for x in self._data[FOF.INCOME_SPENDING]]) + 1
+        new_id = self._data.next_id(FOF.INCOME_SPENDING)
         interest = {"id": new_id, "timestamp": timestamp, "account": account_id, "peer": 0,
                     "lines": [{"amount": amount, "category": -PredefinedCategory.Interest, "description": description}]}
         self._data[FOF.INCOME_SPENDING].append(interest)
@@ -1,9 +1,8 @@
 import json
 import logging
 from pkg_resources import parse_version
-from jal.data_import.statement import FOF, Statement, Statement_ImportError
+from jal.data_import.statement import FOF, Statement, StatementData, Statement_ImportError
 from jal.constants import PredefinedCategory, PredefinedAsset
-from jal.db.asset import JalAsset
 
 JAL_STATEMENT_CLASS = "StatementOpenPortfolio"
 
@@ -34,11 +33,12 @@ class StatementOpenPortfolio(Statement):
         }
 
     def load(self, filename: str) -> None:
-        self._data = {}
+        self._data = StatementData()
+        self._db_reads = []
         try:
             with open(filename, 'r', encoding='utf-8') as exchange_file:
                 try:
-                    self._data = json.load(exchange_file)
+                    self._data = StatementData(json.load(exchange_file))
                 except json.JSONDecodeError:
                     logging.error(self.tr("Failed to read JSON from file: ") + filename)
         except Exception as err:
@@ -77,8 +77,8 @@ class StatementOpenPortfolio(Statement):
             if "symbol" in asset:
                 symbol = {"id": symbol_id, "asset": asset['id'], "symbol": asset['symbol'], "note": asset['exchange']}
                 if asset['type'] != FOF.ASSET_MONEY:
-                    symbol['currency'] = -JalAsset(data={'symbol': 'RUB', 'type_id': PredefinedAsset.Money},
-                                                   search=True, create=False).id()
+                    symbol['currency'] = -self._read_db('_db_asset_id',
+                                                        {'symbol': 'RUB', 'type_id': PredefinedAsset.Money})
                 self._data["symbols"].append(symbol)
                 asset.pop("symbol")
                 asset.pop("exchange")
@@ -143,12 +143,12 @@ class StatementTvoyBroker(StatementXLS):
             settlement = int(datetime.strptime(self._statement[headers['settlement']][row],
                                                "%d.%m.%Y").replace(tzinfo=timezone.utc).timestamp())
             account_id = self._find_account_id(self._account_number, currency)
-            new_id = max([0] + [x['id'] for x in self._data[FOF.TRADES]]) + 1
+            new_id = self._data.next_id(FOF.TRADES)
             trade = {"id": new_id, "number": str(deal_number), "timestamp": timestamp, "settlement": settlement,
                      "account": account_id, "asset": asset_id, "quantity": qty, "price": price, "fee": fee}
             self._data[FOF.TRADES].append(trade)
             if bond_interest != 0:
-                new_id = max([0] + [x['id'] for x in self._data[FOF.ASSET_PAYMENTS]]) + 1
+                new_id = self._data.next_id(FOF.ASSET_PAYMENTS)
                 payment = {"id": new_id, "type": FOF.PAYMENT_INTEREST, "account": account_id, "timestamp": timestamp,
                            "number": str(deal_number), "asset": asset_id, "amount": bond_interest, "description": "НКД"}
                 self._data[FOF.ASSET_PAYMENTS].append(payment)
@@ -216,7 +216,7 @@ class StatementTvoyBroker(StatementXLS):
             settlement = int(datetime.strptime(self._statement[headers['settlement']][row],
                                                "%d.%m.%Y").replace(tzinfo=timezone.utc).timestamp())
             account_id = self._find_account_id(self._account_number, currency)
-            new_id = max([0] + [x['id'] for x in self._data[FOF.TRADES]]) + 1
+            new_id = self._data.next_id(FOF.TRADES)
             trade = {"id": new_id, "number": deal_number, "timestamp": timestamp, "settlement": settlement,
                      "account": account_id, "asset": asset_id, "quantity": qty, "price": price, "fee": fee}
             self._data[FOF.TRADES].append(trade)
@@ -287,7 +287,7 @@ class StatementTvoyBroker(StatementXLS):
         currency_name = [x for x in self._data[FOF.SYMBOLS] if x["asset"] == currency_id][0]['symbol']
         account_from = self._find_account_id(transfer['account_from'], currency_name)
         account_to = self._find_account_id(transfer['account_to'], currency_name)
-        new_id = max([0] + [x['id'] for x in self._data[FOF.TRANSFERS]]) + 1
+        new_id = self._data.next_id(FOF.TRANSFERS)
         transfer = {"id": new_id, "account": [account_from, account_to, 0], "asset": [asset, asset],
                     "timestamp": timestamp, "withdrawal": qty, "deposit": qty, "fee": 0.0, "description": description}
         self._data[FOF.TRANSFERS].append(transfer)
@@ -296,7 +296,7 @@ class StatementTvoyBroker(StatementXLS):
         currency_id = [x for x in self._data[FOF.SYMBOLS] if x["asset"] == asset][0]['currency']
         currency_name = [x for x in self._data[FOF.SYMBOLS] if x["asset"] == currency_id][0]['symbol']
         account_id = self._find_account_id(self._account_number, currency_name)
-        new_id = max([0] + [x['id'] for x in self._data[FOF.TRANSFERS]]) + 1
+        new_id = self._data.next_id(FOF.TRANSFERS)
         transfer = {"id": new_id, "account": [0, account_id, 0], "asset": [asset, asset],
                     "timestamp": timestamp, "withdrawal": qty, "deposit": qty, "fee": 0.0, "description": description}
         self._data[FOF.TRANSFERS].append(transfer)
@@ -366,7 +366,7 @@ class StatementTvoyBroker(StatementXLS):
         currency_name = [x for x in self._data[FOF.SYMBOLS] if x["asset"] == currency_id][0]['symbol']
         account_from = self._find_account_id(transfer['account_from'], currency_name)
         account_to = self._find_account_id(transfer['account_to'], currency_name)
-        new_id = max([0] + [x['id'] for x in self._data[FOF.TRANSFERS]]) + 1
+        new_id = self._data.next_id(FOF.TRANSFERS)
         transfer = {"id": new_id, "account": [account_from, account_to, 0], "number": number,
                     "asset": [currency_id, currency_id], "timestamp": timestamp,
                     "withdrawal": amount, "deposit": amount, "fee": 0.0, "description": description}
@@ -374,7 +374,7 @@ class StatementTvoyBroker(StatementXLS):
 
     def transfer_in(self, timestamp, number, account_id, amount, description):
         account = [x for x in self._data[FOF.ACCOUNTS] if x["id"] == account_id][0]
-        new_id = max([0] + [x['id'] for x in self._data[FOF.TRANSFERS]]) + 1
+        new_id = self._data.next_id(FOF.TRANSFERS)
         transfer = {"id": new_id, "account": [0, account_id, 0], "number": number,
                     "asset": [account['currency'], account['currency']], "timestamp": timestamp,
                     "withdrawal": amount, "deposit": amount, "fee": 0.0, "description": description}
@@ -382,7 +382,7 @@ class StatementTvoyBroker(StatementXLS):
 
     def transfer_out(self, timestamp, number, account_id, amount, description):
         account = [x for x in self._data[FOF.ACCOUNTS] if x["id"] == account_id][0]
-        new_id = max([0] + [x['id'] for x in self._data[FOF.TRANSFERS]]) + 1
+        new_id = self._data.next_id(FOF.TRANSFERS)
         transfer = {"id": new_id, "account": [account_id, 0, 0], "number": number,
                     "asset": [account['currency'], account['currency']], "timestamp": timestamp,
                     "withdrawal": -amount, "deposit": -amount, "fee": 0.0, "description": description}
@@ -418,7 +418,7 @@ class StatementTvoyBroker(StatementXLS):
             if dividend_data['TAX_TEXT']:
                 short_description += '; ' + dividend_data['TAX_TEXT'].strip()
         amount = amount + tax   # Statement contains value after taxation while JAL stores value before tax
-        new_id = max([0] + [x['id'] for x in self._data[FOF.ASSET_PAYMENTS]]) + 1
+        new_id = self._data.next_id(FOF.ASSET_PAYMENTS)
         payment = {"id": new_id, "type": FOF.PAYMENT_DIVIDEND, "account": account_id, "timestamp": timestamp,
                    "number": number, "asset": asset_id, "amount": amount, "tax": tax, "description": short_description}
         self._data[FOF.ASSET_PAYMENTS].append(payment)
@@ -432,7 +432,7 @@ class StatementTvoyBroker(StatementXLS):
             return
         interest_data = parts.groupdict()
         asset_id = self.asset_id({'symbol': interest_data['NAME'], 'should_exist': True})
-        new_id = max([0] + [x['id'] for x in self._data[FOF.ASSET_PAYMENTS]]) + 1
+        new_id = self._data.next_id(FOF.ASSET_PAYMENTS)
         payment = {"id": new_id, "type": FOF.PAYMENT_INTEREST, "account": account_id, "timestamp": timestamp,
                    "number": number, "asset": asset_id, "amount": amount, "description": description}
         self._data[FOF.ASSET_PAYMENTS].append(payment)
@@ -458,19 +458,19 @@ class StatementTvoyBroker(StatementXLS):
         qty = asset_cancel['quantity']
         price = abs(amount / qty)   # Price is always positive
         note = description + ", " + asset_cancel['note']
-        new_id = max([0] + [x['id'] for x in self._data[FOF.TRADES]]) + 1
+        new_id = self._data.next_id(FOF.TRADES)
         trade = {"id": new_id, "number": asset_cancel['number'], "timestamp": timestamp, "settlement": timestamp,
                  "account": account_id, "asset": asset_id, "quantity": qty, "price": price, "fee": 0.0, "note": note}
         self._data[FOF.TRADES].append(trade)
 
     def tax(self, timestamp, _number, account_id, amount, description):
-        new_id = max([0] + [x['id'] for x in self._data[FOF.INCOME_SPENDING]]) + 1
+        new_id = self._data.next_id(FOF.INCOME_SPENDING)
         tax = {"id": new_id, "timestamp": timestamp, "account": account_id, "peer": 0,
                "lines": [{"amount": amount, "category": -PredefinedCategory.Taxes, "description": description}]}
         self._data[FOF.INCOME_SPENDING].append(tax)
 
     def fee(self, timestamp, _number, account_id, amount, description):
-        new_id = max([0] + [x['id'] for x in self._data[FOF.INCOME_SPENDING]]) + 1
+        new_id = self._data.next_id(FOF.INCOME_SPENDING)
         fee = {"id": new_id, "timestamp": timestamp, "account": account_id, "peer": 0,
                "lines": [{"amount": amount, "category": -PredefinedCategory.Fees, "description": description}]}
         self._data[FOF.INCOME_SPENDING].append(fee)
@@ -12,8 +12,9 @@ from PySide6.QtCore import QObject
 from PySide6.QtWidgets import QDialog, QMessageBox
 from jal.constants import Setup, MarketDataFeed, PredefinedAsset, PredefinedAccountType
 from jal.db.helpers import get_app_path
-from jal.db.account import JalAccount
-from jal.db.asset import JalAsset
+from jal.db.db import JalDB
+from jal.db.account import JalAccount, JalAccountIndex
+from jal.db.asset import JalAsset, JalAssetIndex
 from jal.db.operations import LedgerTransaction, Dividend, CorporateAction
 from jal.widgets.helpers import ts2d
 from jal.widgets.account_select import SelectAccountDialog
@@ -79,9 +80,90 @@ class Statement_Capabilities:
     MULTIPLE_LOAD = 1
 
 
+# -----------------------------------------------------------------------------------------------------------------------
+# Container for statement data - a dictionary of sections where sections are lists of dictionaries.
+# It keeps hash indexes of section elements by values of their keys and max id of every section in order to avoid
+# linear scans of section lists. Both are built on first use and then follow elements that are appended to the section
+# list; replacement of the whole section list leads to rebuild. Index may keep an element that doesn't match anymore,
+# so every element is verified before it is returned. If indexed value is changed in place then update_index() should
+# be called for the element, otherwise reset() should be called to drop all indexes.
+class StatementData(dict):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._indexes = {}    # {(section, key): [section list, number of indexed elements, {value: [elements]}]}
+        self._max_ids = {}    # {section: [section list, number of counted elements, max id]}
+
+    # Drops all indexes and counters - they will be built again when needed
+    def reset(self):
+        self._indexes = {}
+        self._max_ids = {}
+
+    # Returns index of 'section' elements by values of 'key' after adding there elements that weren't indexed before
+    def _index(self, section, key) -> dict:
+        elements = self.get(section, [])
+        index = self._indexes.get((section, key))
+        if index is None or index[0] is not elements or index[1] > len(elements):
+            index = self._indexes[(section, key)] = [elements, 0, {}]
+        for element in elements[index[1]:]:
+            self._add_to_index(index[2], element, key)
+        index[1] = len(elements)
+        return index[2]
+
+    # Puts element into index by value of its 'key' or by every value if it is a list
+    @staticmethod
+    def _add_to_index(index, element, key):
+        if key not in element:
+            return
+        values = element[key] if type(element[key]) == list else [element[key]]
+        for value in set(values):
+            index.setdefault(value, []).append(element)
+
+    # Should be called after in-place change of 'key' value of the element that belongs to 'section'
+    def update_index(self, section, element, key):
+        index = self._indexes.get((section, key))
+        if index is not None:
+            self._add_to_index(index[2], element, key)
+        if key == 'id' and section in self._max_ids:
+            self._max_ids[section][2] = max(self._max_ids[section][2], element['id'])
+
+    # Returns a list of 'section' elements that have 'key' equal to 'value' or 'value' in 'key' list
+    def find(self, section, key, value) -> list:
+        found = []
+        for element in self._index(section, key).get(value, []):
+            if key not in element:
+                continue
+            if (value in element[key]) if type(element[key]) == list else (element[key] == value):
+                if not any(x is element for x in found):
+                    found.append(element)
+        return found
+
+    # Returns name of the section that is kept in 'elements' list or None if list doesn't belong to the data
+    def section_of(self, elements):
+        for section, data in self.items():
+            if data is elements:
+                return section
+        return None
+
+    # Returns id for a new element of 'section' - it is greater than any id that was used there
+    def next_id(self, section) -> int:
+        elements = self.get(section, [])
+        counter = self._max_ids.get(section)
+        if counter is None or counter[0] is not elements or counter[1] > len(elements):
+            counter = self._max_ids[section] = [elements, 0, 0]
+        for element in elements[counter[1]:]:
+            counter[2] = max(counter[2], element['id'])
+        counter[1] = len(elements)
+        return counter[2] + 1
+
+    # Only data is pickled as indices are rebuilt on demand
+    def __reduce__(self):
+        return StatementData, (dict(self),)
+
+
 # -----------------------------------------------------------------------------------------------------------------------
 class Statement(QObject):   # derived from QObject to have proper string translation
     RU_PRICE_TOLERANCE = 1e-4   # TODO Probably need to switch imports to Decimal and remove it
+    debug_dump = True           # save_debug_info() writes a dump file only if it is set
 
     _asset_types = {
         FOF.ASSET_MONEY: PredefinedAsset.Money,
@@ -114,9 +196,14 @@ class Statement(QObject):   # derived from QObject to have proper string transla
     
     def __init__(self):
         super().__init__()
-        self._data = {}
+        self._data = StatementData()
+        self._db_reads = []           # [(method name, arguments, result)] - database reads that were made by load()
         self._previous_accounts = {}
         self._last_selected_account = None
+        self._asset_index = None      # Lookup tables of database keys that are used by match_db_ids()
+        self._account_index = None
+        self._operations = {}         # {operation_type: [operation_data]} - operations to be stored by one batch
+        self._invalidation = {}       # {account_id: timestamp} - ledger invalidation required after import
         self._section_loaders = {
             FOF.PERIOD: self._check_period,
             FOF.ASSETS: self._import_assets,
@@ -132,7 +219,7 @@ class Statement(QObject):   # derived from QObject to have proper string transla
 
     # If 'debug_info' is given as parameter it is saved in JAL main directory text file appened with timestamp
     def save_debug_info(self, **kwargs):
-        if 'debug_info' in kwargs:
+        if 'debug_info' in kwargs and self.debug_dump:
             dump_name = get_app_path() + os.sep + Setup.STATEMENT_DUMP + datetime.now().strftime("%y-%m-%d_%H-%M-%S") + ".txt"
             try:
                 with open(dump_name, 'w') as dump_file:
@@ -176,13 +263,51 @@ class Statement(QObject):   # derived from QObject to have proper string transla
         db_asset = JalAsset(data={'isin': isin, 'symbol': symbols[0]['symbol']}, search=True, create=False).id()
         return db_asset
 
+    # Finds an asset in jal database by given search data and returns its id
+    def _db_asset_id(self, search_data: dict) -> int:
+        return JalAsset(data=dict(search_data), search=True, create=False).id()
+
+    # Finds an asset in jal database by given search data and returns a dict with its properties or None if not found
+    def _db_asset(self, search_data: dict) -> dict:
+        db_asset = JalAsset(data=dict(search_data), search=True, create=False)
+        if not db_asset.id():
+            return None
+        return {'id': db_asset.id(), 'type': FOF.convert_predefined_asset_type(db_asset.type()), 'name': db_asset.name(),
+                'isin': db_asset.isin(), 'symbol': db_asset.symbol(search_data['currency'])}
+
+    # Calls method 'name' with given arguments and keeps its result. It should be used by load() for any value that
+    # is taken from database, as load() result may be re-used only if these values stay the same (see db_changed())
+    def _read_db(self, name, *args):
+        result = getattr(self, name)(*args)
+        self._db_reads.append((name, args, result))
+        return result
+
+    # Returns True if database reads that were made by load() give other results now
+    def db_changed(self) -> bool:
+        for name, args, result in self._db_reads:
+            try:
+                if getattr(self, name)(*args) != result:
+                    return True
+            except (IndexError, KeyError):
+                return True
+        return False
+
+    # Returns result of load() in a form that may be passed to another process and restored by set_load_result()
+    def load_result(self) -> dict:
+        return {'data': self._data, 'db_reads': self._db_reads}
+
+    def set_load_result(self, result: dict) -> None:
+        self._data = result['data']
+        self._db_reads = result['db_reads']
+
     # Loads JSON statement format from file defined by 'filename'
     def load(self, filename: str) -> None:
-        self._data = {}
+        self._data = StatementData()
+        self._db_reads = []
         try:
             with open(filename, 'r', encoding='utf-8') as exchange_file:
                 try:
-                    self._data = json.load(exchange_file)
+                    self._data = StatementData(json.load(exchange_file))
                 except json.JSONDecodeError:
                     logging.error(self.tr("Failed to read JSON from file: ") + filename)
         except Exception as err:
@@ -195,23 +320,29 @@ class Statement(QObject):   # derived from QObject to have proper string transla
 
     # check are assets and accounts from self._data present in database
     # replace IDs in self._data with IDs from database (DB IDs will be negative, initial IDs will be positive)
+    # Database keys are loaded once into lookup tables and all matching is done in memory
     def match_db_ids(self):
+        self._data.reset()    # Statement data might be modified directly during load
+        self._asset_index = JalAssetIndex()
+        self._account_index = JalAccountIndex()
         self._match_currencies()
         self._match_asset_isin()
         self._match_asset_reg_number()
         self._match_asset_symbol()
         self._match_account_ids()
+        self._asset_index = self._account_index = None
 
     def _match_currencies(self):
         for asset in self._data[FOF.ASSETS]:
             if asset['type'] != FOF.ASSET_MONEY:
                 continue
             symbol = self._find_in_list(self._data[FOF.SYMBOLS], "asset", asset['id'])
-            asset_id = JalAsset(data={'symbol': symbol['symbol'], 'type': self._asset_types[asset['type']]},
-                                search=True, create=False).id()
+            asset_id = self._asset_index.find({'symbol': symbol['symbol'], 'type': self._asset_types[asset['type']]})
             if asset_id:
                 symbol['asset'] = -asset_id
+                self._data.update_index(FOF.SYMBOLS, symbol, 'asset')
                 old_id, asset['id'] = asset['id'], -asset_id
+                self._data.update_index(FOF.ASSETS, asset, 'id')
                 self._update_id("currency", old_id, asset_id)
                 self._update_id("asset", old_id, asset_id)     # TRANSFERS section may have currency in asset list
 
@@ -221,9 +352,10 @@ class Statement(QObject):   # derived from QObject to have proper string transla
             if asset['id'] < 0:  # already matched
                 continue
             if 'isin' in asset:
-                asset_id = JalAsset(data={'isin': asset['isin']}, search=True, create=False).id()
+                asset_id = self._asset_index.find({'isin': asset['isin']})
                 if asset_id:
                     old_id, asset['id'] = asset['id'], -asset_id
+                    self._data.update_index(FOF.ASSETS, asset, 'id')
                     self._update_id("asset", old_id, asset_id)
 
     # Check and replace IDs for Assets matched by reg_number
@@ -232,10 +364,11 @@ class Statement(QObject):   # derived from QObject to have proper string transla
             if asset['asset'] < 0:  # already matched
                 continue
             if 'reg_number' in asset:
-                asset_id = JalAsset(data={'reg_number': asset['reg_number']}, search=True, create=False).id()
+                asset_id = self._asset_index.find({'reg_number': asset['reg_number']})
                 if asset_id:
                     asset = self._find_in_list(self._data[FOF.ASSETS], "id", asset['asset'])
                     old_id, asset['id'] = asset['id'], -asset_id
+                    self._data.update_index(FOF.ASSETS, asset, 'id')
                     self._update_id("asset", old_id, asset_id)
 
     def _match_asset_symbol(self):
@@ -250,14 +383,15 @@ class Statement(QObject):   # derived from QObject to have proper string transla
             if data is not None:
                 self._uppend_keys_from(search_data, data, ['expiry'])
                 reg_number = data['reg_number'] if 'reg_number' in data else ''
-            db_asset = JalAsset(data=search_data, search=True, create=False)
-            db_id = db_asset.id()
+            db_id = self._asset_index.find(search_data)
             if db_id:
+                db_asset = JalAsset(db_id)
                 if db_asset.isin() and 'isin' in asset and asset['isin'] and db_asset.isin() != asset['isin']:
                     continue  # verify that we don't have ISIN mismatch
                 if db_asset.reg_number() and reg_number and db_asset.reg_number() != reg_number:
                     continue  # verify that we don't have reg.number mismatch
                 old_id, asset['id'] = asset['id'], -db_id
+                self._data.update_index(FOF.ASSETS, asset, 'id')
                 self._update_id("asset", old_id, db_id)
 
     # Check and replace IDs for Accounts
@@ -265,9 +399,10 @@ class Statement(QObject):   # derived from QObject to have proper string transla
         for account in self._data[FOF.ACCOUNTS]:
             account_data = account.copy()
             account_data['currency'] = -account['currency']
-            account_id = JalAccount(data=account_data, search=True, create=False).id()
+            account_id = self._account_index.find(account_data)
             if account_id:
                 old_id, account['id'] = account['id'], -account_id
+                self._data.update_index(FOF.ACCOUNTS, account, 'id')
                 self._update_id("account", old_id, account_id)
 
     # Replace 'old_value' with 'new_value' in keys 'tag_name' of sections listed in mutable_sections
@@ -277,12 +412,12 @@ class Statement(QObject):   # derived from QObject to have proper string transla
         for section in mutable_sections:
             if section not in self._data:
                 continue
-            for element in self._data[section]:
-                if self._key_match(element, tag_name, old_value):
-                    if type(element[tag_name]) == list:
-                        element[tag_name] = [-new_value if x == old_value else x for x in element[tag_name]]
-                    else:
-                        element[tag_name] = -new_value if element[tag_name] == old_value else element[tag_name]
+            for element in self._data.find(section, tag_name, old_value):
+                if type(element[tag_name]) == list:
+                    element[tag_name] = [-new_value if x == old_value else x for x in element[tag_name]]
+                else:
+                    element[tag_name] = -new_value
+                self._data.update_index(section, element, tag_name)
         for element in self._data[FOF.CORP_ACTIONS]:  # Corporate actions have 'outcome' subsection with assets
             for item in element['outcome']:
                 if self._key_match(item, tag_name, old_value):
@@ -297,16 +432,11 @@ class Statement(QObject):   # derived from QObject to have proper string transla
 
     # returns True if dictionary 'element' has 'key' that matches 'value' or is a list with 'value'
     def _key_match(self, element, key, value):
-        for tag in element:
-            if tag == key:
-                if type(element[tag]) == list:
-                    for x in element[tag]:
-                        if x == value:
-                            return True
-                else:
-                    if element[tag] == value:
-                        return True
-        return False
+        if key not in element:
+            return False
+        if type(element[key]) == list:
+            return value in element[key]
+        return element[key] == value
 
     def validate_format(self):
         schema_name = get_app_path() + Setup.IMPORT_PATH + os.sep + Setup.IMPORT_SCHEMA_NAME
@@ -324,12 +454,30 @@ class Statement(QObject):   # derived from QObject to have proper string transla
             raise Statement_ImportError(self.tr("Statement validation failed"))
 
     # Store content of JSON statement into database
+    # Import happens in one transaction with DB triggers disabled: operations of every section are stored by batches
+    # and ledger is invalidated once for every account after all sections are stored.
     # Returns a dict of dict with amounts:
     # { account_1: { asset_1: X, asset_2: Y, ...}, account_2: { asset_N: Z, ...}, ... }
     def import_into_db(self):
-        for section in self._section_loaders:
-            if section in self._data:
-                self._section_loaders[section](self._data[section])
+        self._operations = {}
+        self._invalidation = {}
+        db = JalDB()
+        db.enable_triggers(False)
+        JalDB.begin_transaction()
+        try:
+            for section in self._section_loaders:
+                if section in self._data:
+                    self._section_loaders[section](self._data[section])
+                    self._store_operations()
+            JalDB.invalidate_ledger(self._invalidation)
+        except Exception:
+            JalDB.end_transaction(commit=False)
+            db.invalidate_cache()   # Cached data might contain records that were rolled back
+            raise
+        else:
+            JalDB.end_transaction()
+        finally:
+            db.enable_triggers(True)
 
         totals = defaultdict(dict)
         for account in self._data[FOF.ACCOUNTS]:
@@ -337,6 +485,19 @@ class Statement(QObject):   # derived from QObject to have proper string transla
                 totals[-account['id']][-account['currency']] = account['cash_end']
         return totals
 
+    # Operation is stored into database later by _store_operations() together with other operations of the same type
+    def _add_operation(self, operation_type, operation_data):
+        self._operations.setdefault(operation_type, []).append(operation_data)
+
+    def _store_operations(self):
+        for operation_type, operations in self._operations.items():
+            for account_id, timestamp in LedgerTransaction.create_batch(operation_type, operations).items():
+                self._invalidate_ledger(account_id, timestamp)
+        self._operations = {}
+
+    def _invalidate_ledger(self, account_id, timestamp):
+        self._invalidation[account_id] = min(timestamp, self._invalidation.get(account_id, timestamp))
+
     def _check_period(self, period):
         if len(period) != 2:
             raise Statement_ImportError(self.tr("Statement period is invalid"))
@@ -361,6 +522,7 @@ class Statement(QObject):   # derived from QObject to have proper string transla
             new_asset = JalAsset(data=asset_data, search=False, create=True)
             if new_asset.id():
                 old_id, asset['id'] = asset['id'], -new_asset.id()
+                self._data.update_index(FOF.ASSETS, asset, 'id')
                 self._update_id("asset", old_id, new_asset.id())
                 if asset['type'] == FOF.ASSET_MONEY:
                     self._update_id("currency", old_id, new_asset.id())
@@ -404,6 +566,7 @@ class Statement(QObject):   # derived from QObject to have proper string transla
             new_account = JalAccount(data=account_data, search=True, create=True)
             if new_account.id():
                 old_id, account['id'] = account['id'], -new_account.id()
+                self._data.update_index(FOF.ACCOUNTS, account, 'id')
                 self._update_id("account", old_id, new_account.id())
             else:
                 raise Statement_ImportError(self.tr("Can't create account: ") + f"{account}")
@@ -423,7 +586,7 @@ class Statement(QObject):   # derived from QObject to have proper string transla
                     raise Statement_ImportError(self.tr("Unmatched category for income/spending: ") + f"{action}")
                 line['category_id'] = -line.pop('category')
                 line['note'] = line.pop('description')
-            LedgerTransaction.create_new(LedgerTransaction.IncomeSpending, action)
+            self._add_operation(LedgerTransaction.IncomeSpending, action)
     
     def _import_transfers(self, transfers):
         for transfer in transfers:
@@ -474,7 +637,7 @@ class Statement(QObject):   # derived from QObject to have proper string transla
             if abs(transfer['fee']) < 1e-10:  # FIXME  Need to refactor this module for decimal usage
                 transfer.pop('fee_account')
                 transfer.pop('fee')
-            LedgerTransaction.create_new(LedgerTransaction.Transfer, transfer)
+            self._add_operation(LedgerTransaction.Transfer, transfer)
 
     def _import_trades(self, trades):
         for trade in trades:
@@ -488,11 +651,14 @@ class Statement(QObject):   # derived from QObject to have proper string transla
             if 'cancelled' in trade and trade['cancelled']:
                 del trade['cancelled']          # Remove extra data
                 trade['qty'] = -trade['qty']    # Change side as cancellation is an opposite operation
+                self._store_operations()        # Cancelled trade might be a part of the same statement
                 oid = LedgerTransaction().find_operation(LedgerTransaction.Trade, trade)
                 if oid:
-                    LedgerTransaction.get_operation(LedgerTransaction.Trade, oid).delete()
+                    cancelled = LedgerTransaction.get_operation(LedgerTransaction.Trade, oid)
+                    self._invalidate_ledger(cancelled.account().id(), cancelled.timestamp())
+                    cancelled.delete()
                 continue
-            LedgerTransaction.create_new(LedgerTransaction.Trade, trade)
+            self._add_operation(LedgerTransaction.Trade, trade)
 
     def _import_asset_payments(self, payments):
         for payment in payments:
@@ -504,29 +670,34 @@ class Statement(QObject):   # derived from QObject to have proper string transla
             payment['asset_id'] = -payment.pop('asset')
             payment['note'] = payment.pop('description')
             if 'price' in payment:
-                JalAsset(payment['asset_id']).set_quotes(
-                    [{'timestamp': payment['timestamp'], 'quote': Decimal(payment.pop('price'))}],
-                    JalAccount(payment['account_id']).currency())
+                try:
+                    JalAsset(payment['asset_id']).set_quotes(
+                        [{'timestamp': payment['timestamp'], 'quote': Decimal(payment.pop('price'))}],
+                        JalAccount(payment['account_id']).currency())
+                except RuntimeError as e:
+                    raise Statement_ImportError(str(e) + f": {payment}")
             if payment['type'] == FOF.PAYMENT_DIVIDEND:
                 if payment['id'] > 0:  # New dividend
                     payment['type'] = Dividend.Dividend
-                    LedgerTransaction.create_new(LedgerTransaction.Dividend, payment)
+                    self._add_operation(LedgerTransaction.Dividend, payment)
                 else:  # Dividend exists, only tax to be updated
                     dividend = LedgerTransaction.get_operation(LedgerTransaction.Dividend, -payment['id'])
                     dividend.update_tax(payment['tax'])
+                    self._invalidate_ledger(dividend.account().id(), dividend.timestamp())
             elif payment['type'] == FOF.PAYMENT_INTEREST:
                 payment['type'] = Dividend.BondInterest
-                LedgerTransaction.create_new(LedgerTransaction.Dividend, payment)
+                self._add_operation(LedgerTransaction.Dividend, payment)
             elif payment['type'] == FOF.PAYMENT_STOCK_DIVIDEND:
                 if payment['id'] > 0:  # New dividend
                     payment['type'] = Dividend.StockDividend
-                    LedgerTransaction.create_new(LedgerTransaction.Dividend, payment)
+                    self._add_operation(LedgerTransaction.Dividend, payment)
                 else:  # Dividend exists, only tax to be updated
                     dividend = LedgerTransaction.get_operation(LedgerTransaction.Dividend, -payment['id'])
                     dividend.update_tax(payment['tax'])
+                    self._invalidate_ledger(dividend.account().id(), dividend.timestamp())
             elif payment['type'] == FOF.PAYMENT_STOCK_VESTING:
                 payment['type'] = Dividend.StockVesting
-                LedgerTransaction.create_new(LedgerTransaction.Dividend, payment)
+                self._add_operation(LedgerTransaction.Dividend, payment)
             else:
                 raise Statement_ImportError(self.tr("Unsupported payment type: ") + f"{payment}")
 
@@ -550,7 +721,7 @@ class Statement(QObject):   # derived from QObject to have proper string transla
                 action['type'] = self._corp_actions[action.pop('type')]
             except KeyError:
                 raise Statement_ImportError(self.tr("Unsupported corporate action: ") + f"{action}")
-            LedgerTransaction.create_new(LedgerTransaction.CorporateAction, action)
+            self._add_operation(LedgerTransaction.CorporateAction, action)
 
     def select_account(self, text, account_id, recent_account_id=0):
         if "pytest" in sys.modules:
@@ -574,7 +745,11 @@ class Statement(QObject):   # derived from QObject to have proper string transla
     # exception is raised if multiple elements found
     # Returns None if nothing was found in the list
     def _find_in_list(self, data_list, key, value):
-        filtered = [x for x in data_list if key in x and x[key] == value]
+        section = self._data.section_of(data_list)
+        if section is None:
+            filtered = [x for x in data_list if key in x and x[key] == value]
+        else:
+            filtered = self._data.find(section, key, value)
         if filtered:
             if len(filtered) == 1:
                 return filtered[0]
@@ -584,17 +759,17 @@ class Statement(QObject):   # derived from QObject to have proper string transla
     # Method finds currency in current statement data. New currency is created if no currency was found.
     # Returns currency id
     def currency_id(self, currency_symbol) -> int:
-        match = [x for x in self._data[FOF.SYMBOLS] if
-                 x['symbol'] == currency_symbol and self._asset(x['asset'])['type'] == FOF.ASSET_MONEY]
+        match = [x for x in self._data.find(FOF.SYMBOLS, 'symbol', currency_symbol)
+                 if self._asset(x['asset'])['type'] == FOF.ASSET_MONEY]
         if match:
             if len(match) == 1:
                 return match[0]["asset"]
             else:
                 raise Statement_ImportError(self.tr("Multiple currency match for ") + f"{currency_symbol}")
         else:
-            asset_id = max([0] + [x['id'] for x in self._data[FOF.ASSETS]]) + 1
+            asset_id = self._data.next_id(FOF.ASSETS)
             self._data[FOF.ASSETS].append({"id": asset_id, "type": "money", "name": ""})
-            symbol_id = max([0] + [x['id'] for x in self._data[FOF.SYMBOLS]]) + 1
+            symbol_id = self._data.next_id(FOF.SYMBOLS)
             currency = {"id": symbol_id, "asset": asset_id, "symbol": currency_symbol}
             self._data[FOF.SYMBOLS].append(currency)
             return asset_id
@@ -617,12 +792,12 @@ class Statement(QObject):   # derived from QObject to have proper string transla
                 if 'isin' in asset and 'isin' in asset_info and asset['isin'] != asset_info['isin']:
                     asset = None
         if asset_info.get('search_offline', False):   # If allowed fetch asset data from database
-            db_asset = JalAsset(data=asset_info, search=True, create=False)
-            if db_asset.id():
-                asset = {'id': -db_asset.id(), 'type': FOF.convert_predefined_asset_type(db_asset.type()), 'name': db_asset.name(), 'isin': db_asset.isin()}
+            db_asset = self._read_db('_db_asset', asset_info)
+            if db_asset is not None:
+                asset = {'id': -db_asset['id'], 'type': db_asset['type'], 'name': db_asset['name'], 'isin': db_asset['isin']}
                 self._data[FOF.ASSETS].append(asset)
-                symbol_id = max([0] + [x['id'] for x in self._data[FOF.SYMBOLS]]) + 1
-                symbol = {"id": symbol_id, "asset": -db_asset.id(), 'symbol': db_asset.symbol(asset_info['currency']), 'currency': asset_info['currency']}
+                symbol_id = self._data.next_id(FOF.SYMBOLS)
+                symbol = {"id": symbol_id, "asset": -db_asset['id'], 'symbol': db_asset['symbol'], 'currency': asset_info['currency']}
                 self._data[FOF.SYMBOLS].append(symbol)
                 return asset['id']
         if asset is None and 'search_online' in asset_info:
@@ -644,19 +819,19 @@ class Statement(QObject):   # derived from QObject to have proper string transla
         if asset is None:
             if asset_info.get('should_exist', False):
                 raise Statement_ImportError(self.tr("Can't locate asset in statement data: ") + f"'{asset_info}'")
-            asset_id = max([0] + [x['id'] for x in self._data[FOF.ASSETS]]) + 1
+            asset_id = self._data.next_id(FOF.ASSETS)
             asset = {"id": asset_id}
             self._uppend_keys_from(asset, asset_info, ['type', 'name', 'isin', 'country'])
             self._data[FOF.ASSETS].append(asset)
             if 'symbol' in asset_info:
-                symbol_id = max([0] + [x['id'] for x in self._data[FOF.SYMBOLS]]) + 1
+                symbol_id = self._data.next_id(FOF.SYMBOLS)
                 symbol = {"id": symbol_id, "asset": asset_id}
                 self._uppend_keys_from(symbol, asset_info, ['symbol', 'currency', 'note'])
                 self._data[FOF.SYMBOLS].append(symbol)
             data = {}
             self._uppend_keys_from(data, asset_info, ['reg_number', 'expiry', 'principal'])
             if data:
-                data_id = max([0] + [x['id'] for x in self._data[FOF.ASSETS_DATA]]) + 1
+                data_id = self._data.next_id(FOF.ASSETS_DATA)
                 data['id'] = data_id
                 data['asset'] = asset_id
                 self._data[FOF.ASSETS_DATA].append(data)
@@ -674,17 +849,18 @@ class Statement(QObject):   # derived from QObject to have proper string transla
     def update_asset_data(self, asset_id, asset_info):
         asset = self._find_in_list(self._data[FOF.ASSETS], "id", asset_id)
         self._uppend_keys_from(asset, asset_info, ['name', 'isin', 'country'])
+        self._data.update_index(FOF.ASSETS, asset, 'isin')
         # Add new asset symbol if information provided
         if 'symbol' in asset_info:
             symbol_exists = False
-            symbols = [x for x in self._data[FOF.SYMBOLS] if "asset" in x and x["asset"] == asset_id]
+            symbols = self._data.find(FOF.SYMBOLS, "asset", asset_id)
             if symbols:
                 for symbol in symbols:
                     if symbol['symbol'] == asset_info['symbol'] and (
                             'currency' not in asset_info or symbol['currency'] == asset_info['currency']):
                         symbol_exists = True
             if not symbol_exists:
-                symbol_id = max([0] + [x['id'] for x in self._data[FOF.SYMBOLS]]) + 1
+                symbol_id = self._data.next_id(FOF.SYMBOLS)
                 symbol = {"id": symbol_id, "asset": asset_id}
                 self._uppend_keys_from(symbol, asset_info, ['symbol', 'currency', 'note', 'alt_symbol'])
                 self._data[FOF.SYMBOLS].append(symbol)
@@ -693,13 +869,14 @@ class Statement(QObject):   # derived from QObject to have proper string transla
         if asset_data is None:
             if {'reg_number', 'expiry', 'principal'}.intersection(set(asset_info)):  # if keys are present in info
                 asset_data = {}
-                data_id = max([0] + [x['id'] for x in self._data[FOF.ASSETS_DATA]]) + 1
+                data_id = self._data.next_id(FOF.ASSETS_DATA)
                 asset_data['id'] = data_id
                 asset_data['asset'] = asset_id
                 self._data[FOF.ASSETS_DATA].append(asset_data)
             else:
                 return
         self._uppend_keys_from(asset_data, asset_info, ['reg_number', 'expiry'])
+        self._data.update_index(FOF.ASSETS_DATA, asset_data, 'reg_number')
 
     # Removes asset and all links to it from self._data
     def remove_asset(self, asset_id):
@@ -3,7 +3,7 @@ import re
 import pandas
 from datetime import datetime, timezone
 from zipfile import ZipFile
-from jal.data_import.statement import Statement, FOF, Statement_ImportError
+from jal.data_import.statement import Statement, StatementData, FOF, Statement_ImportError
 
 
 # -----------------------------------------------------------------------------------------------------------------------
@@ -28,13 +28,14 @@ class StatementXLS(Statement):
 
     def __init__(self):
         super().__init__()
-        self._data = {}
+        self._data = StatementData()
         self._statement = None
         self._account_number = ''
 
     # Loads xls(x) or zipped xls(x) file into pandas dataset
     def load(self, filename: str) -> None:
-        self._data = {
+        self._db_reads = []
+        self._data = StatementData({
             FOF.PERIOD: [None, None],
             FOF.ACCOUNTS: [],
             FOF.ASSETS: [],
@@ -45,7 +46,7 @@ class StatementXLS(Statement):
             FOF.CORP_ACTIONS: [],
             FOF.ASSET_PAYMENTS: [],
             FOF.INCOME_SPENDING: []
-        }
+        })
 
         if filename.endswith(".zip"):
             with ZipFile(filename) as zip_file:
@@ -179,7 +180,7 @@ class StatementXLS(Statement):
     def _load_accounts(self):
         currencies = [x for x in self._data[FOF.ASSETS] if x['type'] == FOF.ASSET_MONEY]
         for currency in currencies:
-            id = max([0] + [x['id'] for x in self._data[FOF.ACCOUNTS]]) + 1
+            id = self._data.next_id(FOF.ACCOUNTS)
             account = {"id": id, "number": self._account_number, "currency": currency['id']}
             self._data[FOF.ACCOUNTS].append(account)
 
@@ -239,7 +240,7 @@ class StatementXLS(Statement):
                 return match[0]['id']
             else:
                 raise Statement_ImportError(self.tr("Multiple accounts found: ") + f"{number}/{currency}")
-        new_id = max([0] + [x['id'] for x in self._data[FOF.ACCOUNTS]]) + 1
+        new_id = self._data.next_id(FOF.ACCOUNTS)
         new_account = {"id": new_id, "number": number, 'currency': currency_id}
         self._data[FOF.ACCOUNTS].append(new_account)
         return new_id
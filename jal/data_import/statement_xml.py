@@ -1,8 +1,10 @@
+import re
+import mmap
 import logging
 from datetime import datetime, timezone
 from lxml import etree
 from PySide6.QtWidgets import QApplication
-from jal.data_import.statement import Statement, FOF, Statement_ImportError
+from jal.data_import.statement import Statement, StatementData, FOF, Statement_ImportError
 
 
 # -----------------------------------------------------------------------------------------------------------------------
@@ -11,11 +13,14 @@ class StatementXML(Statement):
     statements_path = ''    # Where in XML structure search for statements
     statement_tag = ''      # Tag of the statement in XML (there might be several statements in one XML)
     level_tag = ''          # Tag to filter out some records
+    streaming = False       # Load statement with iterparse() without keeping the whole XML tree in memory
     STATEMENT_ROOT = '<statement_root>'
 
     def __init__(self):
         super().__init__()
         self._statement = None
+        self._filename = ''
+        self._index = 0
         self._sections = {}
         self._init_data()
         self.attr_loader = {
@@ -25,7 +30,7 @@ class StatementXML(Statement):
         }
 
     def _init_data(self):
-        self._data = {
+        self._data = StatementData({
             FOF.PERIOD: [None, None],
             FOF.ACCOUNTS: [],
             FOF.ASSETS: [],
@@ -36,7 +41,7 @@ class StatementXML(Statement):
             FOF.CORP_ACTIONS: [],
             FOF.ASSET_PAYMENTS: [],
             FOF.INCOME_SPENDING: []
-        }
+        })
 
     # -----------------------------------------------------------------------------------------------------------------------
     # Helpers to get values from XML tag properties
@@ -81,12 +86,19 @@ class StatementXML(Statement):
     # XML file can contain several statements - load 1st one by default, but may be changed by index
     def load(self, filename: str, index : int = 0) -> None:
         self._init_data()
+        self._db_reads = []
+        self._statement = None
+        self._filename = filename
+        self._index = index
+        if self.streaming:
+            self._load_stream(filename, index)
+            return
         try:
             xml_root = etree.parse(filename)
         except etree.XMLSyntaxError as e:
             raise Statement_ImportError(self.tr("Can't parse XML file: ") + e.msg)
         self.validate_file_header_attributes(xml_root.findall('.')[0].attrib)
-        statements = xml_root.findall(self.statements_path)
+        statements = self._find_statements(xml_root)
         if len(statements) == 0:
             logging.info(self.tr("No statement was found in file: " + filename))
             return
@@ -112,6 +124,149 @@ class StatementXML(Statement):
                 self._sections[section]['loader'](section_data)
         self.strip_unused_data()
 
+    # Loads statement in the same way as load() does but with etree.iterparse(). Rows of a section are parsed as soon
+    # as they are read and section data is passed to its loader when section element is completed. Processed nodes
+    # are cleared so memory doesn't depend on statement size. Sections are still loaded in order of self._sections:
+    # if a section comes before the sections that should be loaded prior to it then it is kept until its turn comes.
+    def _load_stream(self, filename: str, index: int) -> None:
+        path = [x for x in self.statements_path.split('/') if x not in ['', '.']]
+        statement_depth = len(path)
+        statement_name = path[-1] if path else '*'
+        present = self._present_sections(filename)
+        order = [x for x in self._sections if x != StatementXML.STATEMENT_ROOT and x in present]
+        loaded = 0         # Number of sections from 'order' that were passed to loaders
+        completed = {}     # Sections that were read before their turn: {tag: element}
+        active = None      # Section that is being read and parsed now
+        rows = []          # Parsed rows of active section
+        depth = 0
+        count = 0          # Number of statements that were met in the file
+        statement = None
+        try:
+            for event, element in etree.iterparse(filename, events=('start', 'end')):
+                if event == 'start':
+                    if depth == 0:
+                        self.validate_file_header_attributes(element.attrib)
+                    if depth == statement_depth and statement_name in ['*', element.tag]:
+                        count += 1
+                        if count == index + 1:
+                            if element.tag != self.statement_tag:
+                                logging.warning(self.tr("Unknown statement tag: ") + f"'{element.tag}'@{filename}")
+                                return
+                            statement = element
+                            header_data = self.parse_attributes(StatementXML.STATEMENT_ROOT, element)
+                            self._sections[StatementXML.STATEMENT_ROOT]['loader'](header_data)
+                    elif statement is not None and depth == statement_depth + 1:
+                        if loaded < len(order) and element.tag == order[loaded]:
+                            active = element.tag
+                            rows = []
+                    depth += 1
+                    continue
+                depth -= 1
+                if statement is None:
+                    if depth > 0:
+                        self._drop_element(element)   # Element doesn't belong to required statement
+                    continue
+                if depth == statement_depth + 2:
+                    section = element.getparent().tag
+                    if section == active:
+                        if element.tag == self._sections[active]['tag']:
+                            attributes = self.parse_attributes(active, element)
+                            if attributes is not None:
+                                rows.append(attributes)
+                        self._drop_element(element)
+                    elif section not in order[loaded:] or section in completed:
+                        self._drop_element(element)   # Section isn't used or was met before and will be ignored
+                elif depth == statement_depth + 1:
+                    if element.tag == active:
+                        self._sections[active]['loader'](rows)
+                        loaded += 1
+                        active = None
+                        rows = []
+                        self._drop_element(element)
+                        loaded = self._load_completed(order, loaded, completed)
+                    elif element.tag in order[loaded:] and element.tag not in completed:
+                        completed[element.tag] = element   # Keep section until sections before it are loaded
+                    else:
+                        self._drop_element(element)
+                elif depth == statement_depth:
+                    break
+        except etree.XMLSyntaxError as e:
+            raise Statement_ImportError(self.tr("Can't parse XML file: ") + e.msg)
+        if statement is None:
+            if count == 0:
+                logging.info(self.tr("No statement was found in file: " + filename))
+            else:
+                logging.warning(self.tr("Failed to find statement index: ") + f"{index}@{filename}")
+            return
+        for section in order[loaded:]:   # Load remaining sections if some of their predecessors were absent
+            if section in completed:
+                self._sections[section]['loader'](self.get_section_data(completed[section]))
+        self.strip_unused_data()
+
+    # Passes sections from 'completed' to their loaders while they go one by one in 'order' after 'loaded' position.
+    # Returns new number of loaded sections
+    def _load_completed(self, order: list, loaded: int, completed: dict) -> int:
+        while loaded < len(order) and order[loaded] in completed:
+            element = completed.pop(order[loaded])
+            self._sections[order[loaded]]['loader'](self.get_section_data(element))
+            self._drop_element(element)
+            loaded += 1
+        return loaded
+
+    # Clears processed element and removes preceding siblings from its parent as they were processed before
+    @staticmethod
+    def _drop_element(element):
+        element.clear()
+        parent = element.getparent()
+        if parent is None:
+            return
+        while element.getprevious() is not None:
+            del parent[0]
+
+    # Returns a set of section tags that are present in XML file. A quick text search over the file allows streaming
+    # load not to wait for sections that never come. All sections are considered present if nothing was found.
+    def _present_sections(self, filename: str) -> set:
+        sections = [x for x in self._sections if x != StatementXML.STATEMENT_ROOT]
+        if not sections:
+            return set()
+        pattern = re.compile(rb"<(" + b"|".join([re.escape(x.encode('utf-8')) for x in sections]) + rb")[\s/>]")
+        present = set()
+        with open(filename, 'rb') as xml_file:
+            try:
+                with mmap.mmap(xml_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    for match in pattern.finditer(data):
+                        present.add(match.group(1).decode('utf-8'))
+                        if len(present) == len(sections):
+                            break
+            except ValueError:   # Empty file can't be mapped
+                pass
+        return present if present else set(sections)
+
+    def load_result(self) -> dict:
+        result = super().load_result()
+        result.update({'filename': self._filename, 'index': self._index})
+        return result
+
+    # XML tree isn't passed with load result, it is parsed again by statement_element() if required
+    def set_load_result(self, result: dict) -> None:
+        super().set_load_result(result)
+        self._statement = None
+        self._filename = result['filename']
+        self._index = result['index']
+
+    # Returns a list of statement elements of given XML tree. Search of absolute path in ElementTree is done
+    # relative to the root element, so the path is made relative explicitly.
+    def _find_statements(self, xml_tree) -> list:
+        path = '.' + self.statements_path if self.statements_path.startswith('/') else self.statements_path
+        return xml_tree.findall(path)
+
+    # Returns XML element of loaded statement. Streaming load doesn't keep the tree and file is parsed again here
+    def statement_element(self):
+        if self._statement is None and self._filename:
+            statements = self._find_statements(etree.parse(self._filename))
+            self._statement = statements[self._index]
+        return self._statement
+
     def validate_file_header_attributes(self, xml_data):
         return
 
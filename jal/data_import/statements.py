@@ -1,11 +1,15 @@
 import logging
 import importlib
+import multiprocessing
 import os
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 from PySide6.QtCore import QObject, Signal
 from PySide6.QtWidgets import QFileDialog
+from PySide6.QtSql import QSqlDatabase
 from jal.constants import Setup
+from jal.db.db import JalDB
 from jal.db.helpers import get_app_path
 from jal.db.settings import JalSettings, FolderFor
 from jal.data_import.statement import Statement_ImportError, Statement_Capabilities
@@ -73,18 +77,91 @@ class Statements(QObject):
             statement_files = class_instance.order_statements(statement_files)
         if not statement_files:
             return
-        for statement_file in statement_files:
-            statement = class_instance()
-            try:
-                statement.load(statement_file)
-                logging.info(self.tr("Statement file loaded successfully"))
-                statement.validate_format()
-                statement.match_db_ids()
-                logging.info(self.tr("Importing statement into database..."))
-                totals = statement.import_into_db()
-                logging.info(self.tr("Statement import completed successfully"))
-            except Statement_ImportError as e:
-                logging.error(self.tr("Import failed: ") + str(e))
-                self.load_failed.emit()
-                return
+        self.import_files(module.__name__, statement_loader['loader_class'], statement_files)
+
+    # Imports statement files one by one in given order. If there are several files then they are loaded in parallel
+    # by worker processes while previous files are imported. Load result of a worker is used only if database reads
+    # that were made by the worker give the same results after import of previous files, otherwise the file is
+    # loaded again. Completion signal is emitted once after import of all files.
+    def import_files(self, module_name, class_name, statement_files, workers=None):
+        class_instance = getattr(importlib.import_module(module_name), class_name)
+        workers = min(len(statement_files), os.cpu_count() if workers is None else workers)
+        pool = None
+        tasks = [None] * len(statement_files)
+        if workers > 1:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_load_worker,
+                                       initargs=(JalDB._db_path(), logging.getLogger().getEffectiveLevel()))
+            tasks = [pool.submit(_load_worker, module_name, class_name, x) for x in statement_files]
+        try:
+            for statement_file, task in zip(statement_files, tasks):
+                statement = class_instance()
+                try:
+                    self._load_statement(statement, statement_file, task)
+                    logging.info(self.tr("Statement file loaded successfully"))
+                    statement.validate_format()
+                    statement.match_db_ids()
+                    logging.info(self.tr("Importing statement into database..."))
+                    totals = statement.import_into_db()
+                    logging.info(self.tr("Statement import completed successfully"))
+                except Statement_ImportError as e:
+                    logging.error(self.tr("Import failed: ") + str(e))
+                    self.load_failed.emit()
+                    return
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
         self.load_completed.emit(statement.period()[1], totals)
+
+    # Loads statement from file or takes result of worker process 'task' if it is still valid
+    def _load_statement(self, statement, statement_file, task):
+        if task is not None:
+            try:
+                result, records = task.result()
+            except Exception as e:
+                logging.debug(f"Parallel load of {statement_file} failed: {e}")
+            else:
+                statement.set_load_result(result)
+                if not statement.db_changed():
+                    for record in records:
+                        logging.getLogger().handle(record)
+                    return
+        statement.load(statement_file)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Keeps log records of worker process in order to pass them to the main process together with load result
+class _LogCollector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        record.msg = record.getMessage()    # Arguments and traceback might be not picklable
+        record.args = None
+        record.exc_info = None
+        self.records.append(record)
+
+
+_log_collector = None
+
+
+# Initializes worker process of parallel statements load with its own read-only connection to DB file
+def _init_load_worker(db_file, log_level):
+    global _log_collector
+    db = QSqlDatabase.addDatabase("QSQLITE", Setup.DB_CONNECTION)
+    db.setDatabaseName(db_file)
+    db.open()
+    _ = JalDB._exec("PRAGMA query_only = ON")
+    _log_collector = _LogCollector()
+    logging.getLogger().addHandler(_log_collector)
+    logging.getLogger().setLevel(log_level)
+
+
+# Loads statement file in worker process. Returns load result and log records that were emitted by load
+def _load_worker(module_name, class_name, statement_file) -> tuple:
+    _log_collector.records = []
+    statement = getattr(importlib.import_module(module_name), class_name)()
+    statement.debug_dump = False    # Dump is saved by main process if load fails there
+    statement.load(statement_file)
+    return statement.load_result(), _log_collector.records
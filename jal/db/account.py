@@ -204,69 +204,189 @@ class JalAccount(JalDB):
     def assets_list(self, timestamp: int) -> list:
         assets = []
         query = self._exec(
-            "WITH _last_ids AS ("
+            "WITH _snapshot AS ("
+            "SELECT coalesce(MAX(timestamp), -1) AS timestamp FROM ledger_snapshots "
+            "WHERE account_id=:account_id AND timestamp<=:timestamp"
+            "), _last_ids AS ("
             "SELECT MAX(id) AS id, asset_id FROM ledger "
-            "WHERE account_id=:account_id AND timestamp<=:timestamp GROUP BY asset_id"
+            "WHERE account_id=:account_id AND book_account=:assets AND timestamp<=:timestamp "
+            "AND timestamp>(SELECT timestamp FROM _snapshot) GROUP BY asset_id"
             ") "
             "SELECT l.asset_id, amount_acc, value_acc "
             "FROM ledger l JOIN _last_ids d ON l.asset_id=d.asset_id AND l.id=d.id "
-            "WHERE amount_acc!='0' AND book_account=:assets",
+            "WHERE CAST(amount_acc AS TEXT)!='0' "
+            "UNION ALL "
+            "SELECT s.asset_id, s.amount_acc, s.value_acc FROM ledger_snapshots s "
+            "WHERE s.account_id=:account_id AND s.book_account=:assets AND CAST(s.amount_acc AS TEXT)!='0' "
+            "AND s.timestamp=(SELECT timestamp FROM _snapshot) AND s.asset_id NOT IN (SELECT asset_id FROM _last_ids) "
+            "ORDER BY asset_id",
             [(":account_id", self._id), (":timestamp", timestamp), (":assets", BookAccount.Assets)])
         while query.next():
             try:
-                asset_id, amount, value = self._read_record(query, cast=[int, Decimal, Decimal])
+                asset_id, amount, value = self._read_record(query, cast=[int, str, str])
             except TypeError:  # Skip if None is returned (i.e. there are no assets)
                 continue
+            amount, value = self._from_ledger(amount, self._precision), self._from_ledger(value, self._precision)
             assets.append({"asset": JalAsset(asset_id), "amount": amount, "value": value})
         return assets
 
+    # Returns positions of all active accounts of given type at given timestamp, calculated by one query.
+    # Result is a dict {account_id: {"account": JalAccount, "assets": [], "money": Decimal}} where "assets" is a list
+    # of dictionaries in the same format as assets_list() returns and "money" is a sum of money and liabilities in
+    # account currency (the same as get_asset_amount() returns for account currency)
+    @classmethod
+    def positions(cls, timestamp: int, account_type: int = PredefinedAccountType.Investment) -> dict:
+        positions = {x.id(): {"account": x, "assets": [], "money": Decimal('0')} for x in
+                     cls.get_all_accounts(account_type=account_type)}
+        query = cls._exec(
+            "WITH _accounts AS ("
+            "SELECT id, currency_id FROM accounts WHERE (type_id=:type OR :type IS NULL) AND active=1"
+            "), _snapshots AS ("
+            "SELECT a.id AS account_id, coalesce((SELECT MAX(s.timestamp) FROM ledger_snapshots s "
+            "WHERE s.account_id=a.id AND s.timestamp<=:timestamp), -1) AS timestamp FROM _accounts a"
+            "), _last_ids AS ("
+            "SELECT MAX(l.id) AS id, l.account_id, l.book_account, l.asset_id FROM ledger l "
+            "JOIN _snapshots s ON l.account_id=s.account_id AND l.timestamp>s.timestamp "
+            "WHERE l.book_account IN (:assets, :money, :liabilities) AND l.timestamp<=:timestamp "
+            "GROUP BY l.account_id, l.book_account, l.asset_id"
+            "), _positions AS ("
+            "SELECT l.account_id, l.book_account, l.asset_id, l.amount_acc, l.value_acc "
+            "FROM ledger l JOIN _last_ids d ON l.id=d.id "
+            "UNION ALL "
+            "SELECT s.account_id, s.book_account, s.asset_id, s.amount_acc, s.value_acc "
+            "FROM ledger_snapshots s JOIN _snapshots t ON s.account_id=t.account_id AND s.timestamp=t.timestamp "
+            "WHERE s.book_account IN (:assets, :money, :liabilities) AND NOT EXISTS("
+            "SELECT 1 FROM _last_ids d WHERE d.account_id=s.account_id AND d.book_account=s.book_account "
+            "AND d.asset_id=s.asset_id)"
+            ") "
+            "SELECT p.account_id, p.book_account, p.asset_id, p.amount_acc, p.value_acc "
+            "FROM _positions p JOIN _accounts a ON p.account_id=a.id "
+            "WHERE CAST(p.amount_acc AS TEXT)!='0' AND (p.book_account=:assets OR p.asset_id=a.currency_id) "
+            "ORDER BY p.account_id, p.asset_id",
+            [(":type", account_type), (":timestamp", timestamp), (":assets", BookAccount.Assets),
+             (":money", BookAccount.Money), (":liabilities", BookAccount.Liabilities)])
+        while query.next():
+            account_id, book, asset_id, amount, value = cls._read_record(query, cast=[int, int, int, str, str])
+            if account_id not in positions:
+                continue
+            precision = positions[account_id]["account"].precision()
+            amount, value = cls._from_ledger(amount, precision), cls._from_ledger(value, precision)
+            if book == BookAccount.Assets:
+                positions[account_id]["assets"].append({"asset": JalAsset(asset_id), "amount": amount, "value": value})
+            else:
+                positions[account_id]["money"] += amount
+        return positions
+
+    # Returns a list of account balances for given list of timestamps. Every element is a dictionary
+    # {"timestamp": int, "assets": value of assets in account currency, "money": money and liabilities in account
+    # currency, "value": total balance converted into 'currency_id' (or account currency if None)}.
+    # Positions are taken from _positions_history() and valued with quotes as of every timestamp.
+    def balances(self, timestamps: list, currency_id: int = None) -> list:
+        currency_id = self._currency_id if currency_id is None else currency_id
+        history = self._positions_history(timestamps)
+        balances = []
+        for timestamp in timestamps:
+            assets_value = money = Decimal('0')
+            for (book, asset_id), amount in history[timestamp]:
+                if book == BookAccount.Assets:
+                    assets_value += amount * JalAsset(asset_id).quote(timestamp, self._currency_id)[1]
+                elif asset_id == self._currency_id:
+                    money += amount
+            rate = JalAsset(self._currency_id).quote(timestamp, currency_id)[1]
+            balances.append({"timestamp": timestamp, "assets": assets_value, "money": money,
+                             "value": (assets_value + money) * rate})
+        return balances
+
+    # Returns a dict {timestamp: [((book, asset_id), amount)]} with non-zero amounts of assets, money and liabilities
+    # at every given timestamp. Ledger records of the account are read once starting from the nearest snapshot before
+    # the first timestamp that isn't known yet. Results are kept in ledger cache and stay there until ledger changes.
+    def _positions_history(self, timestamps: list) -> dict:
+        history = self.ledger_cache().setdefault(('positions', self._id), {})
+        missing = sorted(set(timestamps) - history.keys())
+        if not missing:
+            return history
+        snapshot = self._read("SELECT coalesce(MAX(timestamp), -1) FROM ledger_snapshots "
+                              "WHERE account_id=:account_id AND timestamp<=:timestamp",
+                              [(":account_id", self._id), (":timestamp", missing[0])])
+        state = {}
+        query = self._exec("SELECT book_account, asset_id, amount_acc FROM ledger_snapshots "
+                           "WHERE account_id=:account_id AND timestamp=:snapshot "
+                           "AND book_account IN (:money, :assets, :liabilities)",
+                           [(":account_id", self._id), (":snapshot", snapshot), (":money", BookAccount.Money),
+                            (":assets", BookAccount.Assets), (":liabilities", BookAccount.Liabilities)])
+        while query.next():
+            book, asset_id, amount = self._read_record(query, cast=[int, int, str])
+            state[(book, asset_id)] = amount
+        query = self._exec("SELECT timestamp, book_account, asset_id, amount_acc FROM ledger "
+                           "WHERE account_id=:account_id AND book_account IN (:money, :assets, :liabilities) "
+                           "AND timestamp>:snapshot AND timestamp<=:timestamp ORDER BY id",
+                           [(":account_id", self._id), (":money", BookAccount.Money), (":assets", BookAccount.Assets),
+                            (":liabilities", BookAccount.Liabilities), (":snapshot", snapshot),
+                            (":timestamp", missing[-1])], forward_only=True)
+        i = 0
+        while query.next():
+            timestamp, book, asset_id, amount = self._read_record(query, cast=[int, int, int, str])
+            while timestamp > missing[i]:
+                history[missing[i]] = self._positions_state(state)
+                i += 1
+            state[(book, asset_id)] = amount
+        for timestamp in missing[i:]:
+            history[timestamp] = self._positions_state(state)
+        return history
+
+    # Converts {(book, asset_id): amount_acc} dict with raw ledger values into sorted list of non-zero positions
+    def _positions_state(self, state: dict) -> list:
+        positions = [(key, self._from_ledger(amount, self._precision)) for key, amount in sorted(state.items())]
+        return [x for x in positions if x[1]]
+
+    # Returns accumulated amount (or value if field='value_acc') of asset in given book of account at given timestamp
+    # (or the latest one if timestamp is None). The nearest snapshot from 'ledger_snapshots' table is used as a
+    # starting point, so only ledger records after this snapshot are scanned.
+    def ledger_total(self, book: int, asset_id: int, timestamp: int = None, field: str = 'amount_acc') -> Decimal:
+        assert field in ['amount_acc', 'value_acc']
+        timestamp = Setup.MAX_TIMESTAMP if timestamp is None else timestamp
+        value = self._read(
+            f"WITH _snapshot AS ("
+            f"SELECT coalesce(MAX(timestamp), -1) AS timestamp FROM ledger_snapshots "
+            f"WHERE account_id=:account_id AND timestamp<=:timestamp"
+            f") "
+            f"SELECT coalesce("
+            f"(SELECT {field} FROM ledger WHERE account_id=:account_id AND book_account=:book "
+            f"AND asset_id=:asset_id AND timestamp<=:timestamp AND timestamp>(SELECT timestamp FROM _snapshot) "
+            f"ORDER BY id DESC LIMIT 1), "
+            f"(SELECT {field} FROM ledger_snapshots WHERE account_id=:account_id AND book_account=:book "
+            f"AND asset_id=:asset_id AND timestamp=(SELECT timestamp FROM _snapshot)))",
+            [(":account_id", self._id), (":book", book), (":asset_id", asset_id), (":timestamp", timestamp)])
+        return self._from_ledger(value, self._precision)
+
     # Return amount of asset accumulated on account at given timestamp
     def get_asset_amount(self, timestamp: int, asset_id: int) -> Decimal:
         asset =JalAsset(asset_id)
         if asset.type() == PredefinedAsset.Money:
-            money = self._read("SELECT amount_acc FROM ledger "
-                               "WHERE account_id=:account_id AND asset_id=:asset_id AND timestamp<=:timestamp "
-                               "AND book_account=:money ORDER BY id DESC LIMIT 1",
-                               [(":account_id", self._id), (":asset_id", asset_id),
-                                (":timestamp", timestamp), (":money", BookAccount.Money)])
-            money = Decimal('0') if money is None else Decimal(money)
-            debt = self._read("SELECT amount_acc FROM ledger "
-                              "WHERE account_id=:account_id AND asset_id=:asset_id AND timestamp<=:timestamp "
-                              "AND book_account=:liabilities ORDER BY id DESC LIMIT 1",
-                              [(":account_id", self._id), (":asset_id", asset_id),
-                               (":timestamp", timestamp), (":liabilities", BookAccount.Liabilities)])
-            debt = Decimal('0') if debt is None else Decimal(debt)
+            money = self.ledger_total(BookAccount.Money, asset_id, timestamp)
+            debt = self.ledger_total(BookAccount.Liabilities, asset_id, timestamp)
             return money + debt
         else:
-            value = self._read("SELECT amount_acc FROM ledger "
-                               "WHERE account_id=:account_id AND asset_id=:asset_id AND timestamp<=:timestamp "
-                               "AND book_account=:assets ORDER BY id DESC LIMIT 1",
-                               [(":account_id", self._id), (":asset_id", asset_id),
-                                (":timestamp", timestamp), (":assets", BookAccount.Assets)])
-            amount = Decimal(value) if value is not None else Decimal('0')
-            return amount
+            return self.ledger_total(BookAccount.Assets, asset_id, timestamp)
 
     def get_book_turnover(self, book, begin, end) -> Decimal:
         value = self._read("SELECT SUM(amount) FROM ledger WHERE account_id=:account_id AND book_account=:book "
                            "AND timestamp>=:begin AND timestamp<=:end",
                            [(":account_id", self._id), (":book", book), (":begin", begin), (":end", end)])
-        value = Decimal(value) if value else Decimal('0')
-        return value
+        return self._from_ledger(value, self._precision)
 
     def get_category_turnover(self, category_id, begin, end) -> Decimal:
         value = self._read("SELECT SUM(amount) FROM ledger WHERE account_id=:account_id AND category_id=:category "
                            "AND timestamp>=:begin AND timestamp<=:end",
                            [(":account_id", self._id), (":category", category_id), (":begin", begin), (":end", end)])
-        value = Decimal(value) if value else Decimal('0')
-        return value
+        return self._from_ledger(value, self._precision)
 
-    # Returns a list of JalClosedTrade objects recorded for the account
-    def closed_trades_list(self) -> list:
-        trades = []
-        query = self._exec("SELECT id FROM trades_closed WHERE account_id=:account", [(":account", self._id)])
-        while query.next():
-            trades.append(jal.db.closed_trade.JalClosedTrade(self._read_record(query, cast=[int])))
-        return trades
+    # Returns a list of closed trades of the account (see JalClosedTrade.get_list() for filtering parameters)
+    def closed_trades_list(self, begin: int = 0, end: int = Setup.MAX_TIMESTAMP, asset_types: list = None,
+                           open_types: list = None, close_types: list = None, settlement: bool = False) -> list:
+        return jal.db.closed_trade.JalClosedTrade.get_list(self._id, begin, end, asset_types=asset_types,
+                                                           open_types=open_types, close_types=close_types,
+                                                           settlement=settlement)
 
     # Returns a list of {"operation": LedgerTransaction, "price": Decimal, "remaining_qty": Decimal}
     # that represents all trades that were opened for given asset on this account
@@ -339,7 +459,25 @@ class JalAccount(JalDB):
         }
         value = self._read(sql[flow_type] + " AND account_id=:account_id AND timestamp>=:begin AND timestamp<=:end",
                            [(":sign", sign), (":account_id", self._id), (":begin", begin), (":end", end)])
-        if value:
-            return Decimal(value)
-        else:
-            return Decimal('0')
+        return self._from_ledger(value, self._precision)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Keeps lookup table of accounts by (number, currency) loaded from database with one query.
+# find() gives the same result as JalAccount(data=..., search=True).id() but without query per account
+class JalAccountIndex(JalDB):
+    def __init__(self):
+        super().__init__()
+        self._accounts = {}    # {(number, currency_id): account_id}, None value for ambiguous keys
+        query = self._exec("SELECT id, number, currency_id FROM accounts")
+        while query.next():
+            account_id, number, currency_id = self._read_record(query)
+            key = (number, currency_id)
+            self._accounts[key] = None if key in self._accounts else account_id
+
+    # Returns id of account with given data['number'] and data['currency'] or 0 if it isn't found or isn't unique
+    def find(self, data: dict) -> int:
+        if data.get('number') is None:
+            return 0
+        account_id = self._accounts.get((str(data['number']), data['currency']))
+        return account_id if account_id is not None else 0
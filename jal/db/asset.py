@@ -3,6 +3,7 @@ from decimal import Decimal, InvalidOperation
 from PySide6.QtCore import Qt, QDate
 from jal.constants import BookAccount, MarketDataFeed, AssetData, PredefinedAsset
 from jal.db.db import JalDB
+from jal.db.quote_cache import QuoteCache
 from jal.db.helpers import format_decimal, year_begin, year_end
 from jal.db.country import JalCountry
 from jal.db.tag import JalTag
@@ -53,6 +54,7 @@ class JalAsset(JalDB):
 
     def invalidate_cache(self):
         self._fetch_data()
+        QuoteCache.clear()   # quotes and base currency might be modified via reference data dialogs
 
     # JalAsset maintains single cache available for all instances
     @classmethod
@@ -138,49 +140,95 @@ class JalAsset(JalDB):
     # Returns tuple in form of (timestamp:int, quote:Decimal) that contains last found quotation in given currency.
     # Returns (timestamp, 1) if quotation is requested relative to itself
     # Returned timestamp might be less than given. Returns (0, 0) if no quotation information present in db.
+    # Quotes are taken from process-wide QuoteCache that loads every series from db only once.
     def quote(self, timestamp: int, currency_id: int) -> tuple:
         if self._id == currency_id:
             return timestamp, Decimal('1')
-        quote = self._read("SELECT timestamp, quote FROM quotes WHERE asset_id=:asset_id "
-                           "AND currency_id=:currency_id AND timestamp<=:timestamp ORDER BY timestamp DESC LIMIT 1",
-                           [(":asset_id", self._id), (":currency_id", currency_id), (":timestamp", timestamp)])
+        quote = QuoteCache.quote(self._id, currency_id, timestamp, lambda: self._load_quotes(currency_id))
         if quote is None:
-            if self._type == PredefinedAsset.Money and currency_id != self.get_base_currency(timestamp):  # find a cross-rate
-                rate1 = self.quote(timestamp, self.get_base_currency(timestamp))[1]
-                rate2 = JalAsset(currency_id).quote(timestamp, self.get_base_currency(timestamp))[1]
+            base_currency = self.get_base_currency(timestamp)
+            if self._type == PredefinedAsset.Money and currency_id != base_currency:  # find a cross-rate
+                rate1 = self.quote(timestamp, base_currency)[1]
+                rate2 = JalAsset(currency_id).quote(timestamp, base_currency)[1]
                 rate = 0 if rate2 == Decimal('0') else rate1 / rate2
                 return timestamp, rate
             else:
                 logging.warning(self.tr("There are no quote/rate for ") +
                                 f"{self.symbol(currency_id)} ({JalAsset(currency_id).symbol()}) {ts2d(timestamp)}")
                 return 0, Decimal('0')
-        return int(quote[0]), Decimal(quote[1])
+        return quote
+
+    # Returns a dict {(asset_id, currency_id): (timestamp, quote)} with quotes at given timestamp for all given
+    # (asset_id, currency_id) pairs. Every pair is looked up only once, and every series is loaded only once into
+    # QuoteCache, so later calls for other timestamps don't access db at all
+    @classmethod
+    def get_quotes(cls, pairs, timestamp: int) -> dict:
+        quotes = {}
+        for asset_id, currency_id in pairs:
+            if (asset_id, currency_id) not in quotes:
+                quotes[(asset_id, currency_id)] = JalAsset(asset_id).quote(timestamp, currency_id)
+        return quotes
 
     # Return a list of tuples (timestamp:int, quote:Decimal) of all quotes available for asset
     # for time interval begin-end
     def quotes(self, begin: int, end: int, currency_id: int) -> list:
-        quotes = []
-        query = self._exec(
-            "SELECT timestamp, quote FROM quotes WHERE asset_id=:asset_id "
-            "AND currency_id=:currency_id AND timestamp>=:begin AND timestamp<=:end ORDER BY timestamp",
-            [(":asset_id", self._id), (":currency_id", currency_id), (":begin", begin), (":end", end)])
-        while query.next():
-            timestamp, quote = self._read_record(query, cast=[int, Decimal])
-            quotes.append((timestamp, quote))
-        return quotes
+        return QuoteCache.quotes(self._id, currency_id, begin, end, lambda: self._load_quotes(currency_id))
 
     # Returns tuple (begin_timestamp: int, end_timestamp: int) that defines timestamp range for which quotest are
     # available in database for given currency
     def quotes_range(self, currency_id: int) -> tuple:
-        try:
-            begin, end = self._read("SELECT MIN(timestamp), MAX(timestamp) FROM quotes "
-                                    "WHERE asset_id=:asset_id AND currency_id=:currency_id",
-                                    [(":asset_id", self._id), (":currency_id", currency_id)])
-        except TypeError:
-            begin = end = 0
-        begin = db_timestamp2int(begin)
-        end = db_timestamp2int(end)
-        return begin, end
+        timestamps, _ = QuoteCache.series(self._id, currency_id, lambda: self._load_quotes(currency_id))
+        if not timestamps:
+            return 0, 0
+        return timestamps[0], timestamps[-1]
+
+    # Loads all quotes of the asset in given currency from db for QuoteCache.
+    # Returns a tuple of 2 lists ([timestamp:int], [quote:Decimal]) sorted by timestamp
+    def _load_quotes(self, currency_id: int) -> tuple:
+        timestamps = []
+        quotes = []
+        query = self._exec("SELECT timestamp, quote FROM quotes WHERE asset_id=:asset_id AND currency_id=:currency_id "
+                           "ORDER BY timestamp", [(":asset_id", self._id), (":currency_id", currency_id)])
+        while query.next():
+            timestamp, quote = self._read_record(query, cast=[int, Decimal])
+            timestamps.append(timestamp)
+            quotes.append(quote)
+        return timestamps, quotes
+
+    # Returns a list of (begin_ts, end_ts, fetched) tuples sorted by time - intervals for which quotes in given currency
+    # were downloaded from data source 'source_id' and timestamps of last downloads
+    def quote_coverage(self, currency_id: int, source_id: int) -> list:
+        coverage = []
+        query = self._exec("SELECT begin_ts, end_ts, fetched FROM quote_coverage "
+                           "WHERE asset_id=:asset_id AND currency_id=:currency_id AND source_id=:source_id "
+                           "ORDER BY begin_ts",
+                           [(":asset_id", self._id), (":currency_id", currency_id), (":source_id", source_id)])
+        while query.next():
+            coverage.append(tuple(self._read_record(query, cast=[int, int, int])))
+        return coverage
+
+    # Marks interval [begin, end] as downloaded from data source 'source_id' at 'fetched' time. Overlapping and
+    # adjacent intervals are merged into one
+    def add_quote_coverage(self, currency_id: int, source_id: int, begin: int, end: int, fetched: int) -> None:
+        if end < begin:
+            return
+        coverage = []
+        for interval in sorted(self.quote_coverage(currency_id, source_id) + [(begin, end, fetched)]):
+            if coverage and interval[0] <= coverage[-1][1] + 1:
+                last = coverage[-1]
+                coverage[-1] = (last[0], max(last[1], interval[1]), max(last[2], interval[2]))
+            else:
+                coverage.append(interval)
+        _ = self._exec("DELETE FROM quote_coverage "
+                       "WHERE asset_id=:asset_id AND currency_id=:currency_id AND source_id=:source_id",
+                       [(":asset_id", self._id), (":currency_id", currency_id), (":source_id", source_id)])
+        _ = self._exec_batch("INSERT INTO quote_coverage (asset_id, currency_id, source_id, begin_ts, end_ts, fetched) "
+                             "VALUES (:asset_id, :currency_id, :source_id, :begin, :end, :fetched)",
+                             [(":asset_id", [self._id] * len(coverage)),
+                              (":currency_id", [currency_id] * len(coverage)),
+                              (":source_id", [source_id] * len(coverage)),
+                              (":begin", [x[0] for x in coverage]), (":end", [x[1] for x in coverage]),
+                              (":fetched", [x[2] for x in coverage])], commit=True)
 
     # Returns a quote source id defined for given currency (currency_id can be None)
     def quote_source(self, currency_id: int) -> int:
@@ -199,18 +247,60 @@ class JalAsset(JalDB):
 
     # Set quotations for given currency_id. Quotations is a list of {'timestamp':int, 'quote':Decimal} values
     def set_quotes(self, quotations: list, currency_id: int) -> None:
-        data = [x for x in quotations if x['timestamp'] is not None and x['quote'] is not None]  # Drop Nones
-        if data:
-            for quote in quotations:
-                _ = self._exec("INSERT OR REPLACE INTO quotes (asset_id, currency_id, timestamp, quote) "
-                               "VALUES(:asset_id, :currency_id, :timestamp, :quote)",
-                               [(":asset_id", self._id), (":currency_id", currency_id),
-                                (":timestamp", quote['timestamp']), (":quote", format_decimal(quote['quote']))])
-            begin = min(data, key=lambda x: x['timestamp'])['timestamp']
-            end = max(data, key=lambda x: x['timestamp'])['timestamp']
+        self.store_quotes([x['timestamp'] for x in quotations], [x['quote'] for x in quotations], currency_id)
+
+    # Stores quotations for given currency_id in bulk. 'timestamps' and 'quotes' are sequences of equal length
+    # (lists, numpy arrays, pandas Series or DataFrame columns) with int timestamps and Decimal quotes (str and float
+    # values are accepted also). Points with None/NaN values are dropped, points that are equal to already stored
+    # quotes are skipped and the rest is written in one transaction with batched binds. Inside of a transaction that was
+    # started by JalDB.begin_transaction() quotes become a part of it and RuntimeError is raised on failure.
+    # Returns a dict {'inserted': int, 'updated': int, 'skipped': int} with number of points in every category.
+    def store_quotes(self, timestamps, quotes, currency_id: int) -> dict:
+        result = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        data = {}
+        for timestamp, quote in zip(timestamps, quotes):
+            if timestamp is None or quote is None or (isinstance(quote, (float, Decimal)) and quote != quote):  # NaN
+                continue
+            data[int(timestamp)] = quote if isinstance(quote, Decimal) else Decimal(str(quote))
+        if not data:
+            return result
+        stored_timestamps, stored_quotes = QuoteCache.series(self._id, currency_id,
+                                                             lambda: self._load_quotes(currency_id))
+        stored = dict(zip(stored_timestamps, stored_quotes))
+        new_timestamps = []
+        new_quotes = []
+        for timestamp, quote in data.items():
+            stored_quote = stored.get(timestamp)
+            if stored_quote is None:
+                result['inserted'] += 1
+            elif stored_quote != quote:
+                result['updated'] += 1
+            else:
+                result['skipped'] += 1
+                continue
+            new_timestamps.append(timestamp)
+            new_quotes.append(format_decimal(quote))
+        if new_timestamps:
+            own_transaction = not JalDB._transaction   # Outer transaction is controlled by its owner only
+            if own_transaction:
+                self.connection().transaction()
+            query = self._exec_batch("INSERT OR REPLACE INTO quotes (asset_id, currency_id, timestamp, quote) "
+                                     "VALUES(:asset_id, :currency_id, :timestamp, :quote)",
+                                     [(":asset_id", [self._id] * len(new_timestamps)),
+                                      (":currency_id", [currency_id] * len(new_timestamps)),
+                                      (":timestamp", new_timestamps), (":quote", new_quotes)])
+            if query is None:
+                if not own_transaction:
+                    raise RuntimeError(self.tr("Failed to store quotations for ") + f"{self.symbol(currency_id)}")
+                self.connection().rollback()
+                return {'inserted': 0, 'updated': 0, 'skipped': 0}
             self.commit()
-            logging.info(self.tr("Quotations were updated: ") +
-                         f"{self.symbol(currency_id)} ({JalAsset(currency_id).symbol()}) {ts2d(begin)} - {ts2d(end)}")
+            QuoteCache.invalidate(self._id, currency_id)
+        logging.info(self.tr("Quotations were updated: ") +
+                     f"{self.symbol(currency_id)} ({JalAsset(currency_id).symbol()}) "
+                     f"{ts2d(min(data))} - {ts2d(max(data))} ({result['inserted']} / {result['updated']} / "
+                     f"{result['skipped']})")
+        return result
 
     def expiry(self):
         return self._expiry
@@ -370,7 +460,7 @@ class JalAsset(JalDB):
                           "FROM ledger l LEFT JOIN accounts a ON a.id=l.account_id "
                           "WHERE l.book_account=:assets "
                           "GROUP BY l.asset_id, a.currency_id "
-                          "HAVING l.amount_acc!='0' OR (l.timestamp>=:begin AND l.timestamp<=:end)",
+                          "HAVING CAST(l.amount_acc AS TEXT)!='0' OR (l.timestamp>=:begin AND l.timestamp<=:end)",
                           [(":assets", BookAccount.Assets), (":begin", begin), (":end", end)])
         while query.next():
             try:
@@ -404,13 +494,20 @@ class JalAsset(JalDB):
     def get_base_currency(cls, timestamp: int=None) -> int:
         if timestamp is None:
             timestamp = QDate.currentDate().startOfDay(Qt.UTC).toSecsSinceEpoch()
-        base_id = cls._read("SELECT currency_id FROM base_currency WHERE since_timestamp<=:timestamp "
-                            "ORDER BY since_timestamp DESC LIMIT 1", [(":timestamp", timestamp)])
-        try:
-            base_id = int(base_id)
-        except TypeError:
-            base_id = 0
-        return base_id
+        return QuoteCache.base_currency(timestamp, cls._load_base_currency)
+
+    # Loads base currency history from db for QuoteCache.
+    # Returns a tuple of 2 lists ([since_timestamp:int], [currency_id:int]) sorted by timestamp
+    @classmethod
+    def _load_base_currency(cls) -> tuple:
+        timestamps = []
+        currencies = []
+        query = cls._exec("SELECT since_timestamp, currency_id FROM base_currency ORDER BY since_timestamp")
+        while query.next():
+            timestamp, currency_id = cls._read_record(query, cast=[int, int])
+            timestamps.append(timestamp)
+            currencies.append(currency_id)
+        return timestamps, currencies
 
     # Return a list of (timestamp, currency_id) tuples that represent currency valid currency IDs that were in force
     # after between beginning_of_the_year(begin) and end_of_the_year(end) timestamps.
@@ -424,3 +521,83 @@ class JalAsset(JalDB):
         while query.next():
             history.append(cls._read_record(query, cast=[int, int]))
         return history
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# SQLite NOCASE collation folds only ASCII letters, so the same folding is used for in-memory keys
+_NOCASE = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def _nocase(text) -> str:
+    return text.translate(_NOCASE) if text is not None else None
+
+
+# Keeps lookup tables of assets' search keys (ISIN, registration code, symbol, type, expiry and name) loaded from
+# database with a few queries. find() gives the same result as JalAsset(data=..., search=True).id() but without
+# queries per asset, it is used to match a lot of assets at once (e.g. during statement import)
+class JalAssetIndex(JalDB):
+    def __init__(self):
+        super().__init__()
+        self._isin = {}                 # {isin: asset_id}
+        self._symbol_isin = {}          # {(symbol, isin): asset_id}
+        self._reg_number = {}           # {reg_number: asset_id}
+        self._symbol = {}               # {nocase symbol: asset_id}
+        self._symbol_type = {}          # {(nocase symbol, type): asset_id}
+        self._symbol_type_expiry = {}   # {(nocase symbol, type, expiry): asset_id}
+        self._name = {}                 # {nocase name: asset_id}
+        self._load()
+
+    # Lookup tables keep the first asset in order of assets_ext view (i.e. the lowest id) as SQL queries do
+    def _load(self):
+        expiry = {}
+        query = self._exec("SELECT asset_id, datatype, value FROM asset_data "
+                           "WHERE datatype=:reg_code OR datatype=:expiry ORDER BY id",
+                           [(":reg_code", AssetData.RegistrationCode), (":expiry", AssetData.ExpiryDate)])
+        while query.next():
+            asset_id, datatype, value = self._read_record(query)
+            if datatype == AssetData.RegistrationCode:
+                self._reg_number.setdefault(value, asset_id)
+            else:
+                expiry[asset_id] = value
+        query = self._exec("SELECT id, type_id, symbol, full_name, isin FROM assets_ext ORDER BY id")
+        while query.next():
+            asset_id, type_id, symbol, name, isin = self._read_record(query)
+            self._isin.setdefault(isin, asset_id)
+            self._symbol_isin.setdefault((symbol, isin), asset_id)
+            self._symbol.setdefault(_nocase(symbol), asset_id)
+            self._symbol_type.setdefault((_nocase(symbol), type_id), asset_id)
+            if asset_id in expiry:
+                self._symbol_type_expiry.setdefault((_nocase(symbol), type_id, expiry[asset_id]), asset_id)
+            self._name.setdefault(_nocase(name), asset_id)
+
+    # Returns id of asset that matches search data or 0 if there is no match. Precedence of keys is the same as in
+    # JalAsset._find_asset()
+    def find(self, data: dict) -> int:
+        isin = data.get('isin', '')
+        symbol = data.get('symbol', '')
+        if isin:
+            if symbol:
+                ids = [x for x in (self._symbol_isin.get((symbol, isin)), self._symbol_isin.get((symbol, '')))
+                       if x is not None]
+                asset_id = min(ids) if ids else self._isin.get(isin)
+            else:
+                asset_id = self._isin.get(isin)
+            return asset_id if asset_id is not None else 0
+        asset_id = None
+        if data.get('reg_number', ''):
+            asset_id = self._reg_number.get(data['reg_number'])
+            if asset_id is not None:
+                return asset_id
+        if symbol:
+            if 'type' in data:
+                if 'expiry' in data:
+                    asset_id = self._symbol_type_expiry.get((_nocase(symbol), data['type'], str(data['expiry'])))
+                else:
+                    asset_id = self._symbol_type.get((_nocase(symbol), data['type']))
+            else:
+                asset_id = self._symbol.get(_nocase(symbol))
+            if asset_id is not None:
+                return asset_id
+        if data.get('name', ''):
+            asset_id = self._name.get(_nocase(data['name']))
+        return asset_id if asset_id is not None else 0
@@ -119,6 +119,7 @@ class JalBackup:
         self.get_filename(False)
         if self.backup_name is None:
             return
+        JalDB.clear_statement_cache()
         JalDB.connection().close()
 
         if not self.validate_backup():
@@ -1,4 +1,6 @@
 from decimal import Decimal
+import numpy as np
+import pandas as pd
 from jal.constants import BookAccount
 from jal.db.db import JalDB
 from jal.db.asset import JalAsset
@@ -35,14 +37,15 @@ class JalCategory(JalDB):
     # (conversion rate is used for the day of operation)
     def get_turnover(self, begin: int, end: int, output_currency_id: int) -> Decimal:
         turnover = Decimal('0')
-        query = self._exec("SELECT l.timestamp, l.amount, a.currency_id FROM ledger l "
+        query = self._exec("SELECT l.timestamp, l.amount, a.currency_id, a.precision FROM ledger l "
                            "LEFT JOIN accounts AS a ON l.account_id=a.id "
                            "WHERE (l.book_account=:book_costs OR l.book_account=:book_incomes) "
                            "AND l.timestamp>=:begin AND l.timestamp<=:end AND l.category_id=:category_id",
                            [(":book_costs", BookAccount.Costs), (":book_incomes", BookAccount.Incomes),
                             (":begin", begin), (":end", end), (":category_id", self._id)])
         while query.next():
-            timestamp, amount, currency_id = self._read_record(query, cast=[int, Decimal, int])
+            timestamp, amount, currency_id, precision = self._read_record(query, cast=[int, str, int, int])
+            amount = self._from_ledger(amount, precision)
             if currency_id == output_currency_id:
                 rate = Decimal('1')
             else:
@@ -50,6 +53,71 @@ class JalCategory(JalDB):
             turnover += amount * rate
         return -turnover
 
+    # Calculates turnovers of all categories for a list of periods in given currency in a single pass.
+    # periods is a list of dicts with 'begin_ts' and 'end_ts' keys (see month_list() and week_list()), periods may
+    # overlap. Returns a dict {(category_id, period_index): turnover} with the same values as get_turnover() would give
+    # for every category and period. Only non-empty turnovers are included.
+    # All Costs/Incomes ledger records of the range are loaded with one query, currency rates are attached by as-of
+    # join with quotes and records of every period are found by binary search in per-category timestamp arrays.
+    @classmethod
+    def get_turnovers(cls, periods: list, output_currency_id: int) -> dict:
+        turnovers = {}
+        if not periods:
+            return turnovers
+        begins = np.array([x['begin_ts'] for x in periods], dtype=np.int64)
+        ends = np.array([x['end_ts'] for x in periods], dtype=np.int64)
+        records = []
+        query = cls._exec("SELECT l.timestamp, l.category_id, l.amount, a.currency_id, a.precision FROM ledger l "
+                          "LEFT JOIN accounts AS a ON l.account_id=a.id "
+                          "WHERE l.book_account IN (:book_costs, :book_incomes) "
+                          "AND l.timestamp>=:begin AND l.timestamp<=:end",
+                          [(":book_costs", BookAccount.Costs), (":book_incomes", BookAccount.Incomes),
+                           (":begin", int(begins.min())), (":end", int(ends.max()))])
+        while query.next():
+            timestamp, category_id, amount, currency_id, precision = \
+                cls._read_record(query, cast=[int, int, str, int, int])
+            records.append((timestamp, category_id, cls._from_ledger(amount, precision), currency_id))
+        if not records:
+            return turnovers
+        ledger = pd.DataFrame(records, columns=['timestamp', 'category_id', 'amount', 'currency_id'])
+        ledger = ledger.sort_values('timestamp', kind='stable').reset_index(drop=True)
+        ledger['rate'] = cls._rates_asof(ledger, output_currency_id)
+        ledger['value'] = ledger['amount'] * ledger['rate']
+        for category_id, data in ledger.groupby('category_id', sort=False):
+            timestamps = data['timestamp'].to_numpy()
+            values = data['value'].tolist()
+            lows = np.searchsorted(timestamps, begins, side='left')
+            highs = np.searchsorted(timestamps, ends, side='right')
+            for i in np.flatnonzero(highs > lows):
+                turnovers[(int(category_id), int(i))] = -sum(values[lows[i]:highs[i]], Decimal('0'))
+        return turnovers
+
+    # Returns a series of rates to convert 'amount' of ledger DataFrame (sorted by 'timestamp') from 'currency_id' into
+    # output currency. Rates are taken by as-of join with quotes and JalAsset.quote() is used for the rest (cross-rates)
+    @classmethod
+    def _rates_asof(cls, ledger: pd.DataFrame, output_currency_id: int) -> pd.Series:
+        quotes = []
+        for currency_id in ledger['currency_id'].unique():
+            if currency_id == output_currency_id:
+                continue
+            currency = JalAsset(int(currency_id))
+            rates = currency.quotes(0, int(ledger['timestamp'].iat[-1]), output_currency_id)
+            quotes.append(pd.DataFrame({'quote_ts': [x[0] for x in rates], 'currency_id': currency_id,
+                                        'rate': pd.Series([x[1] for x in rates], dtype=object)}))
+        rates = pd.Series([Decimal('1')] * len(ledger), index=ledger.index, dtype=object)
+        if not quotes:
+            return rates
+        quotes = pd.concat(quotes, ignore_index=True)
+        quotes['quote_ts'] = quotes['quote_ts'].astype(np.int64)
+        joined = pd.merge_asof(ledger[['timestamp', 'currency_id']], quotes.sort_values('quote_ts'),
+                               left_on='timestamp', right_on='quote_ts', by='currency_id', direction='backward')
+        converted = ledger['currency_id'] != output_currency_id
+        rates[converted] = joined['rate'][converted]
+        for i in rates.index[converted & joined['rate'].isna()]:
+            rates[i] = JalAsset(int(ledger['currency_id'].iat[i])).quote(int(ledger['timestamp'].iat[i]),
+                                                                        output_currency_id)[1]
+        return rates
+
     def add_or_update_mapped_name(self, name: str) -> None:
         _ = self._exec("INSERT OR REPLACE INTO map_category (value, mapped_to) "
                        "VALUES (:item_name, :category_id)",
@@ -1,4 +1,5 @@
 from decimal import Decimal
+from jal.constants import Setup
 from jal.db.db import JalDB
 import jal.db.account
 import jal.db.asset
@@ -6,24 +7,27 @@ import jal.db.operations
 from jal.db.asset import JalAsset
 
 
-class JalClosedTrade(JalDB):
-    def __init__(self, id: int = 0) -> None:
-        super().__init__()
-        self._id = id
-        self._data = self._read("SELECT account_id, asset_id, open_op_type, open_op_id, open_timestamp, open_price, "
-                                "close_op_type, close_op_id, close_timestamp, close_price, qty "
-                                "FROM trades_closed WHERE id=:id", [(":id", self._id)], named=True)
-        if self._data:
-            self._account = jal.db.account.JalAccount(self._data['account_id'])
-            self._asset = jal.db.asset.JalAsset(self._data['asset_id'])
-            self._open_op = jal.db.operations.LedgerTransaction.get_operation(self._data['open_op_type'], self._data['open_op_id'], jal.db.operations.Transfer.Incoming)
-            self._close_op = jal.db.operations.LedgerTransaction.get_operation(self._data['close_op_type'], self._data['close_op_id'], jal.db.operations.Transfer.Outgoing)
-            self._open_price = Decimal(self._data['open_price'])
-            self._close_price = Decimal(self._data['close_price'])
-            self._qty = Decimal(self._data['qty'])
-        else:
-            self._account = self._asset = self._open_op = self._close_op = None
-            self._open_price = self._close_price = self._qty = Decimal('0')
+# ----------------------------------------------------------------------------------------------------------------------
+# Lightweight closed trade record that keeps already loaded account, asset and operation objects.
+# It provides accessors for JalClosedTrade and is created directly by JalClosedTrade.get_list()
+class ClosedTrade:
+    __slots__ = ('_id', '_account', '_currency', '_asset', '_open_op', '_close_op', '_open_price', '_close_price',
+                 '_qty')
+
+    # 'currency' - JalAsset of account currency, it may be given to share one object between trades of the account
+    def __init__(self, trade_id, account, asset, open_op, close_op, open_price, close_price, qty,
+                 currency=None) -> None:
+        self._id = trade_id
+        self._account = account
+        if currency is None and account is not None:
+            currency = JalAsset(account.currency())
+        self._currency = currency
+        self._asset = asset
+        self._open_op = open_op
+        self._close_op = close_op
+        self._open_price = open_price
+        self._close_price = close_price
+        self._qty = qty
 
     def dump(self) -> list:
         return [
@@ -66,7 +70,7 @@ class JalClosedTrade(JalDB):
     # given timestamp and returns it. Otherwise, simply returns unchanged value
     def adjusted(self, value: Decimal, currency_id: int, timestamp: int) -> Decimal:
         if currency_id and currency_id != self._account.currency():
-            return value * JalAsset(self._account.currency()).quote(timestamp, currency_id)[1]
+            return value * self._currency.quote(timestamp, currency_id)[1]
         else:
             return value
 
@@ -111,3 +115,68 @@ class JalClosedTrade(JalDB):
         if percent:
             profit = Decimal('100') * profit / (self._qty * self._open_price) if self._open_price else Decimal('0')
         return profit
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class JalClosedTrade(ClosedTrade, JalDB):
+    _db_select = "SELECT c.id, c.account_id, c.asset_id, c.open_op_type, c.open_op_id, c.open_price, " \
+                 "c.close_op_type, c.close_op_id, c.close_price, c.qty "
+
+    def __init__(self, id: int = 0) -> None:
+        JalDB.__init__(self)
+        data = self._read("SELECT account_id, asset_id, open_op_type, open_op_id, open_timestamp, open_price, "
+                          "close_op_type, close_op_id, close_timestamp, close_price, qty "
+                          "FROM trades_closed WHERE id=:id", [(":id", id)], named=True)
+        if data:
+            ClosedTrade.__init__(
+                self, id, jal.db.account.JalAccount(data['account_id']), jal.db.asset.JalAsset(data['asset_id']),
+                jal.db.operations.LedgerTransaction.get_operation(data['open_op_type'], data['open_op_id'],
+                                                                  jal.db.operations.Transfer.Incoming),
+                jal.db.operations.LedgerTransaction.get_operation(data['close_op_type'], data['close_op_id'],
+                                                                  jal.db.operations.Transfer.Outgoing),
+                Decimal(data['open_price']), Decimal(data['close_price']), Decimal(data['qty']))
+        else:
+            ClosedTrade.__init__(self, id, None, None, None, None, Decimal('0'), Decimal('0'), Decimal('0'))
+
+    # Returns a list of ClosedTrade records of given account that were closed between 'begin' and 'end' (by closing
+    # operation timestamp or by its settlement if 'settlement' is True). Lists 'asset_types', 'open_types' and
+    # 'close_types' limit output to given asset types and types of opening/closing operations if given.
+    # Trades and all their operations are loaded with one query per table.
+    @classmethod
+    def get_list(cls, account_id: int, begin: int = 0, end: int = Setup.MAX_TIMESTAMP, asset_types: list = None,
+                 open_types: list = None, close_types: list = None, settlement: bool = False) -> list:
+        operation = jal.db.operations.LedgerTransaction
+        if settlement:
+            close_timestamp = "CASE c.close_op_type WHEN :trade_type THEN ct.settlement " \
+                              "WHEN :transfer_type THEN cx.deposit_timestamp ELSE c.close_timestamp END"
+        else:
+            close_timestamp = "c.close_timestamp"
+        source = "FROM trades_closed c LEFT JOIN assets ca ON ca.id=c.asset_id " \
+                 "LEFT JOIN trades ct ON c.close_op_type=:trade_type AND ct.id=c.close_op_id " \
+                 "LEFT JOIN transfers cx ON c.close_op_type=:transfer_type AND cx.id=c.close_op_id " \
+                 f"WHERE c.account_id=:account AND {close_timestamp}>=:begin AND {close_timestamp}<=:end"
+        for field, values in [("ca.type_id", asset_types), ("c.open_op_type", open_types),
+                              ("c.close_op_type", close_types)]:
+            if values is not None:
+                source += f" AND {field} IN ({','.join([str(int(x)) for x in values])})"
+        params = [(":trade_type", operation.Trade), (":transfer_type", operation.Transfer),
+                  (":account", account_id), (":begin", begin), (":end", end)]
+        operations = jal.db.operations.OperationsLoader()
+        operations.load_closed_trades(source, params)
+        account = jal.db.account.JalAccount(account_id)
+        currency = JalAsset(account.currency())
+        assets = {}
+        trades = []
+        query = cls._exec(cls._db_select + source + " ORDER BY c.id", params)
+        while query.next():
+            data = cls._read_record(query, named=True)
+            if data['asset_id'] not in assets:
+                assets[data['asset_id']] = JalAsset(data['asset_id'])
+            trades.append(ClosedTrade(
+                data['id'], account, assets[data['asset_id']],
+                operations.get_operation(data['open_op_type'], data['open_op_id'],
+                                         jal.db.operations.Transfer.Incoming),
+                operations.get_operation(data['close_op_type'], data['close_op_id'],
+                                         jal.db.operations.Transfer.Outgoing),
+                Decimal(data['open_price']), Decimal(data['close_price']), Decimal(data['qty']), currency))
+        return trades
@@ -1,15 +1,18 @@
 from typing import Union
+from decimal import Decimal
 import os
 import sys
 import re
 import logging
 import sqlparse
+from collections import OrderedDict
 from pkg_resources import parse_version
 from PySide6.QtWidgets import QApplication, QMessageBox
 from PySide6.QtSql import QSql, QSqlDatabase, QSqlQuery, QSqlTableModel
 
 from jal.constants import Setup
-from jal.db.helpers import get_dbfilename
+from jal.db.helpers import get_dbfilename, format_decimal
+from jal.db.quote_cache import QuoteCache
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -78,8 +81,15 @@ class JalSqlError:
 
 # ----------------------------------------------------------------------------------------------------------------------
 class JalDB:
+    STATEMENT_CACHE_SIZE = 256     # Max number of SQL texts with parsed parameters or prepared queries kept in cache
     _tables = []
     _instances_with_cache = []
+    _statements = OrderedDict()    # LRU-cache of parameter names of SQL texts, see _prepare()
+    _prepared = {}                 # LRU-caches of free prepared queries for DB connections, see _prepare()
+    _strict = False                # Enables extra checks of SQL query parameters
+    _fixed_point = None            # Storage format of ledger amounts, see ledger_fixed_point()
+    _ledger_cache = (None, {})     # (ledger state stamp, {key: value}) - values calculated from ledger, see ledger_cache()
+    _transaction = False           # True while transaction started by begin_transaction() is active
 
     # By default, db objects don't cache data. But if and object may cache db data we need to track it so parameter
     # 'cached' to be set to True. Such objects should implement invalidate_cache(), class_cache() methods also.
@@ -99,6 +109,10 @@ class JalDB:
     #    if schema version is invalid it will close DB
     # Returns: LedgerInitError(code == NoError(0) if db was initialized successfully)
     def init_db(self, db_path) -> JalDBError:
+        self.clear_statement_cache()
+        self.set_ledger_storage(None)
+        self.clear_ledger_cache()
+        QuoteCache.clear()
         db = QSqlDatabase.addDatabase("QSQLITE", Setup.DB_CONNECTION)
         if not db.isValid():
             return JalDBError(JalDBError.DbDriverFailure)
@@ -107,6 +121,7 @@ class JalDB:
         db.open()
         sqlite_version = self.get_engine_version()
         if parse_version(sqlite_version) < parse_version(Setup.SQLITE_MIN_VERSION):
+            self.clear_statement_cache()
             db.close()
             return JalDBError(JalDBError.OutdatedSqlite)
         JalDB._tables = db.tables(QSql.Tables) + db.tables(QSql.Views)  # Bitwise or somehow doesn't work here :(
@@ -116,6 +131,7 @@ class JalDB:
             if error.code != JalDBError.NoError:
                 return error
         if self._read("SELECT value FROM settings WHERE name='CleanDB'") == 1:
+            self.clear_statement_cache()
             db.close()
             os.remove(get_dbfilename(db_path))
             db.open()
@@ -124,9 +140,11 @@ class JalDB:
                 return error
         schema_version = self._read("SELECT value FROM settings WHERE name='SchemaVersion'")
         if schema_version < Setup.DB_REQUIRED_VERSION:
+            self.clear_statement_cache()
             db.close()
             return JalDBError(JalDBError.OutdatedDbSchema)
         elif schema_version > Setup.DB_REQUIRED_VERSION:
+            self.clear_statement_cache()
             db.close()
             return JalDBError(JalDBError.NewerDbSchema,
                               details=f"(expected: {Setup.DB_REQUIRED_VERSION}, got: {schema_version})")
@@ -171,16 +189,17 @@ class JalDB:
         if params is None:
             params = []
         db = cls.connection()
-        query = QSqlQuery(db)
-        query.setForwardOnly(forward_only)
-        if not query.prepare(sql_text):
-            logging.error(f"SQL query preparation failure: '{query.lastError().text()}' for query '{sql_text}'")
+        statement = cls._prepare(db, sql_text, forward_only)
+        if statement is None:
             return None
-        query_params = set(re.findall(r":(\w+)", sql_text, re.IGNORECASE))  # get all parameter names in query text
-        assert len(query_params) == len(params), f"SQL: wrong number of parameters {params} for '{sql_text}'"
+        query, query_params = statement
+        if cls._strict:
+            assert len(query_params) == len(params), f"SQL: wrong number of parameters {params} for '{sql_text}'"
         for param in params:
             query.bindValue(param[0], param[1])
-            assert query.boundValue(param[0]) == param[1], f"SQL: failed to assign parameter {param} in '{sql_text}'"
+            if cls._strict:
+                assert query.boundValue(param[0]) == param[1], \
+                    f"SQL: failed to assign parameter {param} in '{sql_text}'"
         if not query.exec():
             error = JalSqlError(query.lastError().text())
             if error.custom():
@@ -188,10 +207,101 @@ class JalDB:
             else:
                 logging.error(f"SQL failure: '{error.message()}' for query '{sql_text}' with params '{params}'")
             return None
-        if commit:
+        if commit and not JalDB._transaction:
+            db.commit()
+        return query
+
+    # -------------------------------------------------------------------------------------------------------------------
+    # Executes an SQL query from given sql_text for a batch of records at once
+    # params is a list of tuples (":param", [value1, value2, ...]) where all value lists have the same length
+    # Current transaction will be committed if 'commit' set to true
+    # return value - QSqlQuery object or None if execution failed
+    @classmethod
+    def _exec_batch(cls, sql_text, params, commit=False):
+        db = cls.connection()
+        statement = cls._prepare(db, sql_text, True)
+        if statement is None:
+            return None
+        query, query_params = statement
+        if cls._strict:
+            assert len(query_params) == len(params), f"SQL: wrong number of parameters for '{sql_text}'"
+            assert len(set(len(x[1]) for x in params)) <= 1, f"SQL: unequal length of batch values for '{sql_text}'"
+        for param in params:
+            query.bindValue(param[0], list(param[1]))
+        if not query.execBatch():
+            error = JalSqlError(query.lastError().text())
+            if error.custom():
+                error.show()
+            else:
+                logging.error(f"SQL failure: '{error.message()}' for batch query '{sql_text}'")
+            return None
+        if commit and not JalDB._transaction:
             db.commit()
         return query
 
+    # -------------------------------------------------------------------------------------------------------------------
+    # Returns a tuple (QSqlQuery, set of parameter names) with query prepared for given sql_text or None if
+    # preparation failed. Prepared queries that were released by their owners (see _release()) are kept in LRU-cache
+    # of the connection. Such query is taken out of the cache, so it is owned by the caller only, and a new query is
+    # prepared only if there is no free one. Parameter names of sql_text are kept in LRU-cache also.
+    @classmethod
+    def _prepare(cls, db, sql_text, forward_only):
+        free_queries = cls._prepared.setdefault(db.connectionName(), OrderedDict()).get((sql_text, forward_only), None)
+        if free_queries:
+            query = free_queries.pop()
+        else:
+            query = QSqlQuery(db)
+            query.setForwardOnly(forward_only)
+            if not query.prepare(sql_text):
+                logging.error(f"SQL query preparation failure: '{query.lastError().text()}' for query '{sql_text}'")
+                return None
+        query_params = cls._statements.get(sql_text, None)
+        if query_params is None:
+            query_params = set(re.findall(r":(\w+)", sql_text, re.IGNORECASE))  # get all parameter names in query text
+            cls._statements[sql_text] = query_params
+            if len(cls._statements) > cls.STATEMENT_CACHE_SIZE:
+                cls._statements.popitem(last=False)
+        else:
+            cls._statements.move_to_end(sql_text)
+        return query, query_params
+
+    # Puts query that was executed for sql_text into cache of free prepared queries of the connection. It should be
+    # called only by the owner of the query when its results aren't needed anymore.
+    @classmethod
+    def _release(cls, db, sql_text, forward_only, query):
+        query.finish()
+        queries = cls._prepared.setdefault(db.connectionName(), OrderedDict())
+        key = (sql_text, forward_only)
+        queries.setdefault(key, []).append(query)
+        queries.move_to_end(key)
+        if len(queries) > cls.STATEMENT_CACHE_SIZE:
+            queries.popitem(last=False)
+
+    # Drops all prepared queries cached for DB connections (should be called before connection is closed)
+    @classmethod
+    def clear_statement_cache(cls):
+        cls._prepared.clear()
+
+    # Returns a dict that keeps values calculated from the ledger. Content of the dict stays valid while the ledger
+    # isn't changed: it is dropped if ledger frontier or set of invalidated accounts (table 'ledger_dirty') changes.
+    # Ledger rebuild may keep the same frontier, so clear_ledger_cache() should be called after it
+    @classmethod
+    def ledger_cache(cls) -> dict:
+        stamp = tuple(cls._read("SELECT (SELECT ledger_frontier FROM frontier), "
+                                "(SELECT group_concat(account_id || ':' || timestamp) FROM ledger_dirty)"))
+        if JalDB._ledger_cache[0] != stamp:
+            JalDB._ledger_cache = (stamp, {})
+        return JalDB._ledger_cache[1]
+
+    @classmethod
+    def clear_ledger_cache(cls):
+        JalDB._ledger_cache = (None, {})
+
+    # Enables (or disables if strict is False) extra checks of parameters that are passed to SQL queries
+    @classmethod
+    def set_strict_mode(cls, strict: bool):
+        JalDB._strict = strict   # set on base class to be shared by all descendants
+
     # ------------------------------------------------------------------------------------------------------------------
     # Reads the result of 'sql_test' query from the database (with given params - the same as for _exec() method)
     # returns result of the query or None if result is empty
@@ -204,10 +314,11 @@ class JalDB:
         if query.next():
             res = cls._read_record(query, named=named)
             if check_unique and query.next():
-                return None  # More than one record in result when only one expected
-            return res
+                res = None  # More than one record in result when only one expected
         else:
-            return None
+            res = None
+        cls._release(cls.connection(), sql_text, True, query)   # Query isn't visible outside so it may be re-used
+        return res
 
     # ------------------------------------------------------------------------------------------------------------------
     # Method takes current active record of given query and returns its values as:
@@ -234,6 +345,46 @@ class JalDB:
         else:
             return None
 
+    # ------------------------------------------------------------------------------------------------------------------
+    # Returns True if amounts in 'ledger', 'ledger_totals' and 'ledger_snapshots' tables are kept as integers scaled
+    # by 10^(account precision) and False if they are kept as decimal text. Format is detected by existing ledger
+    # records and is taken from 'LedgerFixedPoint' setting for empty ledger.
+    @classmethod
+    def ledger_fixed_point(cls) -> bool:
+        if JalDB._fixed_point is None:
+            stored = cls._read("SELECT typeof(amount_acc) FROM ledger LIMIT 1")
+            if stored is None:
+                setting = cls._read("SELECT value FROM settings WHERE name='LedgerFixedPoint'")
+                JalDB._fixed_point = bool(int(setting)) if setting else False
+            else:
+                JalDB._fixed_point = stored == 'integer'
+        return JalDB._fixed_point
+
+    # Sets format of ledger amounts storage explicitly or forces its detection next time if fixed_point is None
+    @classmethod
+    def set_ledger_storage(cls, fixed_point: Union[bool, None]):
+        JalDB._fixed_point = fixed_point
+
+    # Converts Decimal value into the form that is kept in ledger tables for an account with given precision
+    @classmethod
+    def _to_ledger(cls, value: Decimal, precision: int):
+        if not cls.ledger_fixed_point():
+            return format_decimal(value)
+        scaled = int(value.scaleb(precision).to_integral_value())
+        if abs(scaled) >= 2 ** 63:
+            raise ValueError(f"Value {value} is too big for fixed-point ledger with precision {precision}")
+        return scaled
+
+    # Converts value read from ledger tables (or result of SQL aggregate function over them) back into Decimal.
+    # Empty value is converted into 0
+    @classmethod
+    def _from_ledger(cls, value, precision: int) -> Decimal:
+        if value is None or value == '':
+            return Decimal('0')
+        if cls.ledger_fixed_point():
+            return Decimal(value).scaleb(-precision)
+        return Decimal(value)
+
     # ------------------------------------------------------------------------------------------------------------------
     def invalidate_cache(self):
         processed_cache_classes = set()   # a list of classes that were already invalidated and don't need extra action
@@ -282,6 +433,7 @@ class JalDB:
                     clean_statement = sqlparse.format(statement, strip_comments=True)
                     if self._exec(clean_statement, commit=False) is None:
                         _ = self._exec("ROLLBACK")
+                        self.clear_statement_cache()
                         self.connection().close()
                         return JalDBError(JalDBError.SQLFailure, f"FAILED: {clean_statement}")
                     else:
@@ -307,12 +459,39 @@ class JalDB:
             logging.info(f"Applying delta schema {step}->{step + 1} from {delta_file}")
             error = self.run_sql_script(delta_file)
             if error.code != JalDBError.NoError:
+                self.clear_statement_cache()
                 db.close()
                 return error
         return JalDBError(JalDBError.NoError)
 
     def commit(self):
-        self.connection().commit()
+        if not JalDB._transaction:
+            self.connection().commit()
+
+    # Starts a transaction that groups a lot of changes (e.g. statement import). Commits requested by separate queries
+    # are postponed until end_transaction() is called, so all changes are either committed or rolled back together
+    @classmethod
+    def begin_transaction(cls):
+        cls.connection().transaction()
+        JalDB._transaction = True
+
+    # Ends transaction started by begin_transaction(): changes are committed if 'commit' is True or rolled back otherwise
+    @classmethod
+    def end_transaction(cls, commit=True):
+        JalDB._transaction = False
+        if commit:
+            cls.connection().commit()
+        else:
+            cls.connection().rollback()
+
+    # Invalidates ledger of accounts given as a dict {account_id: timestamp} starting from given timestamps.
+    # It is required to keep the ledger valid if operations were changed while triggers were disabled.
+    @classmethod
+    def invalidate_ledger(cls, accounts: dict):
+        if accounts:
+            _ = cls._exec_batch("INSERT INTO invalidate_ledger(account_id, timestamp) VALUES(:account_id, :timestamp)",
+                                [(":account_id", list(accounts.keys())), (":timestamp", list(accounts.values()))],
+                                commit=True)
 
     # This method creates a db record in 'table' name that describes relevant operation.
     # 'data' is a dict that contains operation data and dict 'fields' describes it having
@@ -385,6 +564,105 @@ class JalDB:
         query = self._exec(query_text, params, commit=True)
         return query.lastInsertId()
 
+    # Batch version of create_operation() that creates db records in 'table_name' for every dict of 'data' list.
+    # Operations that are present in database already (or repeat another operation of the list) are skipped.
+    # Returns a list of ids of created records where 0 is given for skipped operations
+    def create_operations(self, table_name, fields, data) -> list:
+        for item in data:
+            self.validate_operation_data(table_name, fields, item)
+        located = self.locate_operations(table_name, fields, data)
+        for item, oid in zip(data, located):
+            if oid:
+                logging.warning(self.tr("Operation already present in db and was skipped: ") + f"{table_name}, {item}")
+        new_ids = iter(self.insert_operations(table_name, fields, [x for x, oid in zip(data, located) if not oid]))
+        oids = [0 if oid else next(new_ids) for oid in located]
+        children = [x for x in fields if 'children' in fields[x] and fields[x]['children']]
+        for child in children:
+            child_data = []
+            for item, oid in zip(data, oids):
+                if not oid:
+                    continue
+                for child_item in item[child]:
+                    child_item[fields[child]['child_pid']] = oid
+                    child_data.append(child_item)
+            self.create_operations(fields[child]['child_table'], fields[child]['child_fields'], child_data)
+        return oids
+
+    # Batch version of locate_operation(): returns a list of ids of records that are present in 'table_name' already
+    # for every operation of 'data' list, 0 if operation isn't present and -1 if it repeats a previous operation of
+    # the list. Existing validation keys are read by one query for the period covered by operations, and validation
+    # values of operations are passed through a temporary table in order to be compared exactly as SQLite does.
+    def locate_operations(self, table_name, fields, data) -> list:
+        validation_fields = [x for x in fields if 'validation' in fields[x] and fields[x]['validation']]
+        if not validation_fields or not data:
+            return [0] * len(data)
+        for item in data:
+            for field in validation_fields:
+                if field not in item:
+                    item[field] = fields[field]['default']   # set to default value
+        keys = self._validation_keys(table_name, validation_fields, data)
+        query_text = f"SELECT id, {', '.join(validation_fields)} FROM {table_name}"
+        params = []
+        period_field = next((x for x in validation_fields if x.endswith("timestamp")), None)
+        timestamps = [x[validation_fields.index(period_field)] for x in keys] if period_field else []
+        timestamps = [x for x in timestamps if x is not None]
+        if timestamps:
+            query_text += f" WHERE {period_field}>=:begin AND {period_field}<=:end"
+            params = [(":begin", min(timestamps)), (":end", max(timestamps))]
+        existing = {}
+        query = self._exec(query_text + " ORDER BY id", params)
+        while query.next():
+            values = self._read_record(query)
+            existing.setdefault(tuple(values[1:]), values[0])
+        oids = []
+        for key in keys:
+            oids.append(existing.get(key, 0))
+            existing.setdefault(key, -1)   # The next operation with the same key will be skipped
+        return oids
+
+    # Returns a list of tuples with values of 'validation_fields' for every operation of 'data' list. Values are
+    # stored into temporary table with the same column types as 'table_name' has and read back, so they are
+    # converted in the same way as they would be converted by SQLite for comparison with table values
+    def _validation_keys(self, table_name, validation_fields, data) -> list:
+        keys_table = f"temp.{table_name}_keys"
+        _ = self._exec(f"DROP TABLE IF EXISTS {keys_table}")
+        _ = self._exec(f"CREATE TABLE {keys_table} AS SELECT {', '.join(validation_fields)} FROM {table_name} WHERE 0")
+        _ = self._exec_batch(f"INSERT INTO {keys_table} ({', '.join(validation_fields)}) "
+                             f"VALUES ({', '.join(':' + x for x in validation_fields)})",
+                             [(f":{x}", [item[x] for item in data]) for x in validation_fields])
+        keys = []
+        query = self._exec(f"SELECT {', '.join(validation_fields)} FROM {keys_table} ORDER BY rowid")
+        while query.next():
+            values = self._read_record(query)
+            keys.append(tuple(values) if len(validation_fields) > 1 else (values,))
+        query.finish()
+        _ = self._exec(f"DROP TABLE {keys_table}")
+        return keys
+
+    # Batch version of insert_operation(): stores operations of 'data' list into 'table_name' and returns their ids.
+    # Consecutive operations with the same set of fields are inserted by one batch in order to keep their order.
+    def insert_operations(self, table_name, fields, data) -> list:
+        columns = [x for x in fields if not ('children' in fields[x] and fields[x]['children'])]
+        oids = []
+        start = 0
+        while start < len(data):
+            present = [x for x in columns if x in data[start]]
+            end = start + 1
+            while end < len(data) and [x for x in columns if x in data[end]] == present:
+                end += 1
+            last_id = self._read(f"SELECT coalesce(MAX(id), 0) FROM {table_name}")
+            query = self._exec_batch(f"INSERT INTO {table_name} ({', '.join(present)}) "
+                                     f"VALUES ({', '.join(':' + x for x in present)})",
+                                     [(f":{x}", [item[x] for item in data[start:end]]) for x in present], commit=True)
+            if query is None:
+                raise RuntimeError(f"Failed to insert operations into '{table_name}'")
+            query = self._exec(f"SELECT id FROM {table_name} WHERE id>:last_id ORDER BY id", [(":last_id", last_id)])
+            while query.next():
+                oids.append(self._read_record(query))
+            start = end
+        assert len(oids) == len(data), f"Unexpected number of operations inserted into '{table_name}'"
+        return oids
+
 
 # -------------------------------------------------------------------------------------------------------------------
 # Subclassing to hide db connection details
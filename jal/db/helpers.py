@@ -88,4 +88,10 @@ def year_end(timestamp: int) -> int:
     end = end.replace(year=end.year + 1) - timedelta(seconds=1)
     return int(end.replace(tzinfo=timezone.utc).timestamp())
 
+# Returns timestamp of the last second of the month of given timestamp
+def month_end(timestamp: int) -> int:
+    end = datetime.utcfromtimestamp(timestamp).replace(day=1, hour=0, minute=0, second=0)
+    end = end.replace(year=end.year + end.month // 12, month=end.month % 12 + 1) - timedelta(seconds=1)
+    return int(end.replace(tzinfo=timezone.utc).timestamp())
+
 # -------------------------------------------------------------------------------------------------------------------
\ No newline at end of file
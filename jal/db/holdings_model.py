@@ -250,59 +250,78 @@ class HoldingsModel(ReportTreeModel):
         data = index.internalPointer().details()
         return data['account_id'], data['asset_id'], data['currency_id'], data['qty']
 
+    # Returns display attributes of the asset shown in given currency. Attributes are cached in 'cache' dict as the
+    # same assets and currencies appear on many accounts
+    def _asset_attributes(self, asset_id: int, currency_id: int, cache: dict) -> dict:
+        try:
+            return cache[(asset_id, currency_id)]
+        except KeyError:
+            pass
+        asset = JalAsset(asset_id)
+        country = asset.country()
+        cache[(asset_id, currency_id)] = attributes = {
+            "asset": asset.symbol(currency=currency_id),
+            "asset_name": asset.name(),
+            "country_id": country.id(),
+            "country": country.name(),
+            "tag": asset.tag().name() if asset.tag().name() else self.tr("N/A"),
+            "expiry": asset.expiry()
+        }
+        return attributes
+
     # Populate table 'holdings' with data calculated for given parameters of model: _currency, _date,
+    # Positions of all accounts are taken by one query and quotes are looked up once for every (asset, currency) pair
     def prepareData(self):
         holdings = []
-        accounts = JalAccount.get_all_accounts(account_type=PredefinedAccountType.Investment)
-        for account in accounts:
-            account_holdings = []
-            assets = account.assets_list(self._date)
-            rate = JalAsset(account.currency()).quote(self._date, self._currency)[1]
-            for asset_data in assets:
-                asset = asset_data['asset']
-                quote_ts, quote = asset.quote(self._date, account.currency())
+        positions = JalAccount.positions(self._date, account_type=PredefinedAccountType.Investment)
+        pairs = {(x['asset'].id(), p['account'].currency()) for p in positions.values() for x in p['assets']}
+        pairs |= {(p['account'].currency(), self._currency) for p in positions.values()}
+        quotes = JalAsset.get_quotes(pairs, self._date)
+        attributes = {}
+        money_ts = QDate.currentDate().endOfDay(Qt.UTC).toSecsSinceEpoch()
+        for account_positions in positions.values():
+            account = account_positions['account']
+            currency_id = account.currency()
+            currency = self._asset_attributes(currency_id, None, attributes)
+            rate = quotes[(currency_id, self._currency)][1]
+            for asset_data in account_positions['assets']:
+                asset_id = asset_data['asset'].id()
+                quote_ts, quote = quotes[(asset_id, currency_id)]
                 record = {
-                    "currency_id": account.currency(),
-                    "currency": JalAsset(account.currency()).symbol(),
+                    "currency_id": currency_id,
+                    "currency": currency['asset'],
                     "account_id": account.id(),
                     "account": account.name(),
-                    "asset_id": asset.id(),
+                    "asset_id": asset_id,
                     "asset_is_currency": False,
-                    "asset": asset.symbol(currency=account.currency()),
-                    "asset_name": asset.name(),
-                    "country_id": asset.country().id(),
-                    "country": asset.country().name(),
-                    "tag": asset.tag().name() if asset.tag().name() else self.tr("N/A"),
-                    "expiry": asset.expiry(),
                     "qty": asset_data['amount'],
                     "value_i": asset_data['value'],
                     "quote": quote,
                     "quote_ts": quote_ts,
                     "quote_a": rate * quote
                 }
-                account_holdings.append(record)
-            money = account.get_asset_amount(self._date, account.currency())
-            if money:
-                account_holdings.append({
-                    "currency_id": account.currency(),
-                    "currency": JalAsset(account.currency()).symbol(),
+                record.update(self._asset_attributes(asset_id, currency_id, attributes))
+                holdings.append(record)
+            if account_positions['money']:
+                holdings.append({
+                    "currency_id": currency_id,
+                    "currency": currency['asset'],
                     "account_id": account.id(),
                     "account": account.name(),
-                    "asset_id": account.currency(),
+                    "asset_id": currency_id,
                     "asset_is_currency": True,
-                    "asset": JalAsset(account.currency()).symbol(),
-                    "asset_name": JalAsset(account.currency()).name(),
-                    "country_id": JalAsset(account.currency()).country().id(),
-                    "country": JalAsset(account.currency()).country().name(),
+                    "asset": currency['asset'],
+                    "asset_name": currency['asset_name'],
+                    "country_id": currency['country_id'],
+                    "country": currency['country'],
                     "tag": self.tr("Money"),
                     "expiry": 0,
-                    "qty": money,
+                    "qty": account_positions['money'],
                     "value_i": Decimal('0'),
                     "quote": Decimal('1'),
-                    "quote_ts": QDate.currentDate().endOfDay(Qt.UTC).toSecsSinceEpoch(),
+                    "quote_ts": money_ts,
                     "quote_a": rate
                 })
-            holdings += account_holdings
         sort_names = [x.removesuffix("_id") for x in self._groups]
         if 'asset' in sort_names:
             sort_names.insert(sort_names.index('asset'), 'asset_is_currency')  # Need to put currency at the end
@@ -1,16 +1,21 @@
+import os
 import sys
+import bisect
+import multiprocessing
 import logging
 import traceback
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from decimal import Decimal
 from PySide6.QtCore import Signal, QObject, QDate
 from PySide6.QtWidgets import QDialog, QMessageBox
-from jal.constants import BookAccount
-from jal.db.helpers import format_decimal
+from PySide6.QtSql import QSqlDatabase
+from jal.constants import Setup, BookAccount
+from jal.db.helpers import format_decimal, month_end
 from jal.db.db import JalDB
 from jal.db.account import JalAccount
 from jal.db.settings import JalSettings
-from jal.db.operations import LedgerTransaction, LedgerError
+from jal.db.operations import LedgerTransaction, LedgerError, OperationsLoader
 from jal.widgets.helpers import ts2dt, ts2d
 from jal.ui.ui_rebuild_window import Ui_ReBuildDialog
 
@@ -55,6 +60,7 @@ class LedgerAmounts(dict, JalDB):
         super().__init__(*args, **kwargs)
         if total_field is None:
             raise ValueError("Uninitialized field in LedgerAmounts")
+        self.timestamp = timestamp
         if timestamp is None:
             self.__time_filter__ = ''
         else:
@@ -70,20 +76,196 @@ class LedgerAmounts(dict, JalDB):
         try:
             return super().__getitem__(key)
         except KeyError:
-            amount = self._read(f"SELECT {self.total_field} FROM ledger "
-                                f"WHERE book_account = :book AND account_id = :account_id AND asset_id = :asset_id "
-                                f"{self.__time_filter__} "
-                                f"ORDER BY id DESC LIMIT 1",
-                                [(":book", key[BOOK]), (":account_id", key[ACCOUNT]), (":asset_id", key[ASSET])])
-            amount = Decimal(amount) if amount is not None else Decimal('0')
+            if self.total_field in ['amount_acc', 'value_acc']:   # These values are kept in ledger snapshots
+                amount = JalAccount(key[ACCOUNT]).ledger_total(key[BOOK], key[ASSET], self.timestamp,
+                                                               self.total_field)
+            else:
+                amount = self._read(f"SELECT {self.total_field} FROM ledger "
+                                    f"WHERE book_account = :book AND account_id = :account_id "
+                                    f"AND asset_id = :asset_id {self.__time_filter__} ORDER BY id DESC LIMIT 1",
+                                    [(":book", key[BOOK]), (":account_id", key[ACCOUNT]), (":asset_id", key[ASSET])])
+                if self.total_field in ['amount', 'value']:
+                    amount = self._from_ledger(amount, JalAccount(key[ACCOUNT]).precision())
+                else:
+                    amount = Decimal(amount) if amount is not None else Decimal('0')
             super().__setitem__(key, amount)
             return amount
 
 
+# ===================================================================================================================
+# Keeps ledger records in memory column by column (one list per 'ledger' table field) and writes them into DB
+# with batch queries. Records are written in the same order as they were appended so 'id' values are the same
+# as they would be with one-by-one insertion.
+class LedgerBuffer(JalDB):
+    FIELDS = ["timestamp", "op_type", "operation_id", "book_account", "asset_id", "account_id",
+              "amount", "value", "amount_acc", "value_acc", "peer_id", "category_id", "tag_id"]
+    _OP_TYPE, _OPERATION_ID, _BOOK, _VALUE = map(FIELDS.index, ["op_type", "operation_id", "book_account", "value"])
+
+    def __init__(self, size):
+        super().__init__()
+        self._size = size
+        self._columns = [[] for _ in self.FIELDS]
+        self._values = {}   # (op_type, operation_id, book_account) -> [values of buffered records]
+
+    def __len__(self):
+        return len(self._columns[0])
+
+    def full(self) -> bool:
+        return len(self) >= self._size
+
+    # Appends a record with values that go in the same order as FIELDS
+    def append(self, record: tuple) -> None:
+        for column, value in zip(self._columns, record):
+            column.append(value)
+        key = (record[self._OP_TYPE], record[self._OPERATION_ID], record[self._BOOK])
+        self._values.setdefault(key, []).append(record[self._VALUE])
+
+    # Returns a list of 'value' field of all buffered records that belong to given operation and book
+    def values_of(self, op_type, operation_id, book) -> list:
+        return list(self._values.get((op_type, operation_id, book), []))
+
+    # Returns all buffered records as a list of tuples with values in the same order as FIELDS
+    def records(self) -> list:
+        return list(zip(*self._columns))
+
+    # Writes all buffered records into 'ledger' table and clears the buffer
+    def flush(self) -> None:
+        if not len(self):
+            return
+        _ = self._exec_batch(f"INSERT INTO ledger ({', '.join(self.FIELDS)}) "
+                             f"VALUES({', '.join([':' + x for x in self.FIELDS])})",
+                             [(':' + field, column) for field, column in zip(self.FIELDS, self._columns)])
+        self._columns = [[] for _ in self.FIELDS]
+        self._values = {}
+
+
+# ===================================================================================================================
+# Keeps open positions (lots) in memory for FIFO deals matching during ledger rebuild.
+# Lots are loaded from 'trades_opened' table once per (account_id, asset_id) pair when they are required for the first
+# time. All changes are kept in memory and are written into 'trades_opened'/'trades_closed' tables by flush() call.
+class LedgerLots(JalDB):
+    def __init__(self):
+        super().__init__()
+        self._books = {}     # (account_id, asset_id) -> ([sort keys], [lots]) with lots in FIFO order
+        self._count = 0      # Counter of new lots in order to keep FIFO order for lots with the same timestamp
+        self._opened = []    # New lots that aren't written into 'trades_opened' yet
+        self._changed = []   # Lots that are present in 'trades_opened' but have modified remaining quantity
+        self._closed = []    # Deals that aren't written into 'trades_closed' yet
+
+    # Returns FIFO book for given account and asset, loads it from DB if it is requested for the first time
+    def _book(self, account_id, asset_id) -> tuple:
+        try:
+            return self._books[(account_id, asset_id)]
+        except KeyError:
+            keys, lots = [], []
+            query = self._exec("SELECT id, timestamp, op_type, operation_id, price, remaining_qty FROM trades_opened "
+                               "WHERE account_id=:account_id AND asset_id=:asset_id AND remaining_qty!=:zero "
+                               "ORDER BY timestamp, op_type DESC, id",
+                               [(":account_id", account_id), (":asset_id", asset_id),
+                                (":zero", format_decimal(Decimal('0')))])
+            while query.next():
+                lot = self._read_record(query, named=True, cast=[int, int, int, int, Decimal, Decimal])
+                lot.update({'account_id': account_id, 'asset_id': asset_id, 'stored': True, 'changed': False})
+                keys.append((lot['timestamp'], -lot['op_type'], 0, lot['id']))
+                lots.append(lot)
+            self._books[(account_id, asset_id)] = (keys, lots)
+            return keys, lots
+
+    # Creates a new lot that may be closed later. It has the same effect as insertion into 'trades_opened' table
+    def open(self, operation, timestamp, account_id, asset_id, price, qty):
+        lot = {'id': 0, 'timestamp': timestamp, 'op_type': operation.type(), 'operation_id': operation.oid(),
+               'price': price.normalize(), 'remaining_qty': qty.normalize(),
+               'account_id': account_id, 'asset_id': asset_id, 'stored': False, 'changed': False}
+        self._opened.append(lot)
+        if lot['remaining_qty'] == Decimal('0'):
+            return   # Empty lot is stored for consistency but it will never be matched
+        keys, lots = self._book(account_id, asset_id)
+        self._count += 1
+        key = (timestamp, -operation.type(), 1, self._count)   # new lots go after stored ones with the same timestamp
+        position = bisect.bisect(keys, key)
+        keys.insert(position, key)
+        lots.insert(position, lot)
+
+    # Closes lots in FIFO order in the same way as LedgerTransaction._close_deals_fifo() does with DB tables
+    # Returns total qty, value of deals created.
+    def close(self, operation, account_id, asset_id, deal_sign, qty, price):
+        processed_qty = Decimal('0')
+        processed_value = Decimal('0')
+        keys, lots = self._book(account_id, asset_id)
+        closed_count = 0
+        for lot in lots:
+            next_deal_qty = lot['remaining_qty']
+            if (processed_qty + next_deal_qty) > qty:  # We can't close all trades with current operation
+                next_deal_qty = qty - processed_qty    # If it happens - just process the remainder of the trade
+            lot['remaining_qty'] = (lot['remaining_qty'] - next_deal_qty).normalize()
+            if lot['stored'] and not lot['changed']:
+                lot['changed'] = True
+                self._changed.append(lot)
+            if lot['remaining_qty'] == Decimal('0'):
+                closed_count += 1
+            open_price = lot['price']
+            close_price = lot['price'] if price is None else price
+            self._closed.append((account_id, asset_id, lot['op_type'], lot['operation_id'], lot['timestamp'],
+                                 format_decimal(open_price), operation.type(), operation.oid(), operation.timestamp(),
+                                 format_decimal(close_price), format_decimal((-deal_sign) * next_deal_qty)))
+            processed_qty += next_deal_qty
+            processed_value += (next_deal_qty * open_price)
+            if processed_qty == qty:
+                break
+        del keys[:closed_count]   # Fully matched lots are always at the beginning of the book
+        del lots[:closed_count]
+        return processed_qty, processed_value
+
+    # Returns a number of new lots and a number of new closed deals that are kept in memory
+    def counts(self) -> tuple:
+        return len(self._opened), len(self._closed)
+
+    # Returns (new lots, lots with changed remaining quantity, new closed deals) as lists of tuples that are ready
+    # for LedgerLots.write() and marks all these changes as written
+    def take(self) -> tuple:
+        opened = [(x['timestamp'], x['op_type'], x['operation_id'], x['account_id'], x['asset_id'],
+                   format_decimal(x['price']), format_decimal(x['remaining_qty'])) for x in self._opened]
+        changed = [(format_decimal(x['remaining_qty']), x['op_type'], x['operation_id'], x['asset_id'])
+                   for x in self._changed]
+        closed = self._closed
+        for lot in self._opened:
+            lot['stored'] = True
+        for lot in self._changed:
+            lot['changed'] = False
+        self._opened, self._changed, self._closed = [], [], []
+        return opened, changed, closed
+
+    # Writes all changes of open positions and all new closed deals into DB
+    def flush(self):
+        self.write(*self.take())
+
+    # Writes new lots, updates of remaining quantity and closed deals (as they are returned by take()) into DB
+    @classmethod
+    def write(cls, opened, changed, closed):
+        if opened:
+            fields = ["timestamp", "op_type", "operation_id", "account_id", "asset_id", "price", "remaining_qty"]
+            _ = cls._exec_batch(f"INSERT INTO trades_opened({', '.join(fields)}) "
+                                f"VALUES({', '.join([':' + x for x in fields])})",
+                                [(":" + x, [lot[i] for lot in opened]) for i, x in enumerate(fields)])
+        if changed:
+            fields = ["new_remaining_qty", "op_type", "id", "asset_id"]
+            _ = cls._exec_batch("UPDATE trades_opened SET remaining_qty=:new_remaining_qty "
+                                "WHERE op_type=:op_type AND operation_id=:id AND asset_id=:asset_id",
+                                [(":" + x, [lot[i] for lot in changed]) for i, x in enumerate(fields)])
+        if closed:
+            fields = ["account_id", "asset_id", "open_op_type", "open_op_id", "open_timestamp", "open_price",
+                      "close_op_type", "close_op_id", "close_timestamp", "close_price", "qty"]
+            _ = cls._exec_batch(f"INSERT INTO trades_closed({', '.join(fields)}) "
+                                f"VALUES({', '.join([':' + x for x in fields])})",
+                                [(":" + x, [deal[i] for deal in closed]) for i, x in enumerate(fields)])
+
+
 # ===================================================================================================================
 class Ledger(QObject, JalDB):
     updated = Signal()
     SILENT_REBUILD_THRESHOLD = 1000
+    BUFFER_SIZE = 10000   # Default number of ledger records that are kept in memory before write during rebuild
+    PARALLEL_REBUILD_THRESHOLD = 20000   # Minimal number of operations to use process pool if workers aren't given
 
     def __init__(self):
         super().__init__()
@@ -91,6 +273,8 @@ class Ledger(QObject, JalDB):
         self.values = LedgerAmounts("value_acc")      # together with corresponding value
         self.main_window = None
         self.progress_bar = None
+        self._buffer = None   # LedgerBuffer that is used during rebuild if batch mode is active
+        self.lots = None      # LedgerLots that is used for FIFO matching during rebuild if batch mode is active
 
     def setProgressBar(self, main_window, progress_widget):
         self.main_window = main_window
@@ -104,7 +288,10 @@ class Ledger(QObject, JalDB):
         return current_frontier
 
     @classmethod
-    def get_operations_sequence(cls, begin: int, end: int, account_id: int = 0) -> list:
+    # Returns a list of operations from 'operation_sequence' view for given time range and account (all if 0).
+    # Only 'limit' operations starting from 'offset' position are returned if 'limit' is given
+    def get_operations_sequence(cls, begin: int, end: int, account_id: int = 0, offset: int = 0,
+                                limit: int = 0) -> list:
         sequence = []
         query_text = "SELECT op_type, id, timestamp, account_id, subtype " \
                      "FROM operation_sequence WHERE timestamp>=:begin AND timestamp<=:end"
@@ -112,6 +299,9 @@ class Ledger(QObject, JalDB):
         if account_id:
             query_text += " AND account_id=:account"
             params += [(":account", account_id)]
+        if limit:
+            query_text += " LIMIT :limit OFFSET :offset"
+            params += [(":limit", limit), (":offset", offset)]
         query = cls._exec(query_text, params, forward_only=True)
         while query.next():
             sequence.append(cls._read_record(query, named=True))
@@ -178,6 +368,16 @@ class Ledger(QObject, JalDB):
                 (self.values[(book, operation.account_id(), asset_id)] != Decimal('0')):
             rounding_error = Decimal('0') - self.values[(book, operation.account_id(), asset_id)]
             self.values[(book, operation.account_id(), asset_id)] += rounding_error
+        if self._buffer is not None:
+            self._buffer.append((operation.timestamp(), operation.type(), operation.oid(), book, asset_id,
+                                 operation.account_id(), self._to_ledger(amount, precision),
+                                 self._to_ledger(value, precision),
+                                 self._to_ledger(self.amounts[(book, operation.account_id(), asset_id)], precision),
+                                 self._to_ledger(self.values[(book, operation.account_id(), asset_id)], precision),
+                                 peer, category, tag))
+            if self._buffer.full():
+                self.flush()
+            return rounding_error
         _ = self._exec("INSERT INTO ledger (timestamp, op_type, operation_id, book_account, asset_id, "
                        "account_id, amount, value, amount_acc, value_acc, peer_id, category_id, tag_id) "
                        "VALUES(:timestamp, :op_type, :operation_id, :book, :asset_id, :account_id, "
@@ -185,12 +385,35 @@ class Ledger(QObject, JalDB):
                        [(":timestamp", operation.timestamp()), (":op_type", operation.type()),
                         (":operation_id", operation.oid()), (":book", book), (":asset_id", asset_id),
                         (":account_id", operation.account_id()),
-                        (":amount", format_decimal(amount)), (":value", format_decimal(value)),
-                        (":amount_acc", format_decimal(self.amounts[(book, operation.account_id(), asset_id)])),
-                        (":value_acc", format_decimal(self.values[(book, operation.account_id(), asset_id)])),
+                        (":amount", self._to_ledger(amount, precision)), (":value", self._to_ledger(value, precision)),
+                        (":amount_acc",
+                         self._to_ledger(self.amounts[(book, operation.account_id(), asset_id)], precision)),
+                        (":value_acc",
+                         self._to_ledger(self.values[(book, operation.account_id(), asset_id)], precision)),
                         (":peer_id", peer), (":category_id", category), (":tag_id", tag)])
         return rounding_error
 
+    # Writes ledger records and FIFO lots changes accumulated in memory into DB (if batch mode is active)
+    def flush(self):
+        if self._buffer is not None:
+            self._buffer.flush()
+        if self.lots is not None:
+            self.lots.flush()
+
+    # Returns 'value' of ledger record for given operation and book or None if there is no such unique record.
+    # Takes into account both records stored in DB and records that are still kept in memory.
+    # Value is returned in ledger storage format (see JalDB._from_ledger() to convert it into Decimal)
+    def getOperationValue(self, op_type, operation_id, book):
+        values = []
+        query = self._exec("SELECT value FROM ledger "
+                           "WHERE book_account=:book AND op_type=:op_type AND operation_id=:id",
+                           [(":book", book), (":op_type", op_type), (":id", operation_id)])
+        while query.next():
+            values.append(self._read_record(query))
+        if self._buffer is not None:
+            values += self._buffer.values_of(op_type, operation_id, book)
+        return values[0] if len(values) == 1 else None
+
     # Returns Amount measured in current account currency or asset that 'book' has at current ledger frontier
     def getAmount(self, book, account_id, asset_id=None):
         if asset_id is None:
@@ -223,19 +446,24 @@ class Ledger(QObject, JalDB):
     #      will asks for confirmation if we have more than SILENT_REBUILD_THRESHOLD operations require rebuild
     # 0 - re-build from scratch
     # any - re-build all operations after given timestamp
-    def rebuild(self, from_timestamp=-1, fast_and_dirty=False):
+    # buffer_size - number of ledger records to keep in memory before batch write into DB inside one transaction
+    #               (0 - write every record immediately)
+    # workers - number of processes to use for independent groups of accounts (works in batch mode only)
+    #           (0 - use all CPUs if more than PARALLEL_REBUILD_THRESHOLD operations require rebuild, 1 otherwise)
+    def rebuild(self, from_timestamp=-1, fast_and_dirty=False, buffer_size=BUFFER_SIZE, workers=1):
         exception_happened = False
         last_timestamp = 0
         self.amounts.clear()
         self.values.clear()
-        if from_timestamp >= 0:
-            frontier = from_timestamp
-            operations_count = self._read("SELECT COUNT(id) FROM operation_sequence WHERE timestamp >= :frontier",
-                                          [(":frontier", frontier)])
-        else:
-            frontier = self.getCurrentFrontier()
-            operations_count = self._read("SELECT COUNT(id) FROM operation_sequence WHERE timestamp >= :frontier",
-                                          [(":frontier", frontier)])
+        if self.ledger_fixed_point() != bool(int(JalSettings().getValue('LedgerFixedPoint', 0))):
+            from_timestamp = 0   # Storage format of ledger amounts was changed - the whole ledger should be rebuilt
+        frontier = from_timestamp if from_timestamp >= 0 else self.getCurrentFrontier()
+        self._extend_invalidation()
+        start = self._read("SELECT MIN(coalesce(MIN(timestamp), :frontier), :frontier) FROM ledger_dirty",
+                           [(":frontier", frontier)])
+        operations_count = self._read(f"SELECT COUNT(id) FROM operation_sequence AS s "
+                                      f"WHERE {self._rebuild_condition('s')}", [(":frontier", frontier)])
+        if from_timestamp < 0:
             if operations_count > self.SILENT_REBUILD_THRESHOLD:
                 if QMessageBox().warning(None, self.tr("Confirmation"), f"{operations_count}" +
                                          self.tr(" operations require rebuild. Do you want to do it right now?"),
@@ -243,31 +471,39 @@ class Ledger(QObject, JalDB):
                     JalSettings().setValue('RebuildDB', 1)
                     return
         if operations_count == 0:
+            _ = self._exec("DELETE FROM ledger_dirty", commit=True)
             logging.info(self.tr("Leger is empty"))
             return
+        if workers == 0:
+            workers = os.cpu_count() if operations_count > self.PARALLEL_REBUILD_THRESHOLD else 1
         if self.progress_bar is not None:
             self.progress_bar.setRange(0, operations_count)
             self.main_window.showProgressBar(True)
-        logging.info(self.tr("Re-building ledger since: ") + f"{ts2dt(frontier)}")
+        logging.info(self.tr("Re-building ledger since: ") + f"{ts2dt(start)}")
         start_time = datetime.now()
-        _ = self._exec("DELETE FROM trades_closed WHERE close_timestamp >= :frontier", [(":frontier", frontier)])
-        _ = self._exec("DELETE FROM ledger WHERE timestamp >= :frontier", [(":frontier", frontier)])
-        _ = self._exec("DELETE FROM ledger_totals WHERE timestamp >= :frontier", [(":frontier", frontier)])
-        _ = self._exec("DELETE FROM trades_opened WHERE timestamp >= :frontier", [(":frontier", frontier)])
+        _ = self._exec(f"DELETE FROM trades_closed WHERE {self._rebuild_condition('trades_closed', 'close_timestamp')}",
+                       [(":frontier", frontier)])
+        _ = self._exec(f"DELETE FROM ledger WHERE {self._rebuild_condition('ledger')}", [(":frontier", frontier)])
+        _ = self._exec(f"DELETE FROM ledger_totals WHERE {self._rebuild_condition('ledger_totals')}",
+                       [(":frontier", frontier)])
+        _ = self._exec(f"DELETE FROM trades_opened WHERE {self._rebuild_condition('trades_opened')}",
+                       [(":frontier", frontier)])
+        _ = self._exec(f"DELETE FROM ledger_snapshots WHERE {self._rebuild_condition('ledger_snapshots')}",
+                       [(":frontier", frontier)])
+        self.set_ledger_storage(None)   # Empty ledger takes storage format from settings
 
         self.enable_triggers(False)
         if fast_and_dirty:  # For 30k operations difference of execution time is - with 0:02:41 / without 0:11:44
             self.set_synchronous(False)
+        if buffer_size > 0:
+            self._buffer = LedgerBuffer(buffer_size)
+            self.lots = LedgerLots()
+            self.connection().transaction()
         try:
-            query = self._exec("SELECT op_type, id, timestamp, account_id, subtype FROM operation_sequence "
-                               "WHERE timestamp >= :frontier", [(":frontier", frontier)])
-            while query.next():
-                data = self._read_record(query, named=True)
-                last_timestamp = data['timestamp']
-                operation = LedgerTransaction().get_operation(data['op_type'], data['id'], data['subtype'])
-                operation.processLedger(self)
-                if self.progress_bar is not None:
-                    self.progress_bar.setValue(query.at())
+            if workers > 1 and self._buffer is not None:
+                last_timestamp = self._process_parallel(frontier, start, workers)
+            else:
+                last_timestamp = self._process(frontier, start)
         except Exception as e:
             if "pytest" in sys.modules:  # Throw exception if we are in test mode or handle it if we are live
                 raise e
@@ -277,6 +513,11 @@ class Ledger(QObject, JalDB):
             else:
                 logging.error(f"{traceback.format_exc()}")  # and full log for anything unexpected
         finally:
+            if self._buffer is not None:
+                self.flush()
+                self._buffer = None
+                self.lots = None
+                self.commit()
             if fast_and_dirty:
                 self.set_synchronous(True)
             self.enable_triggers(True)
@@ -290,8 +531,11 @@ class Ledger(QObject, JalDB):
             "(op_type, operation_id, timestamp, book_account, asset_id, account_id, amount_acc, value_acc) "
             "SELECT op_type, operation_id, timestamp, book_account, asset_id, account_id, amount_acc, value_acc "
             "FROM ledger "
-            "WHERE id IN (SELECT MAX(id) FROM ledger WHERE timestamp >= :frontier "
+            f"WHERE id IN (SELECT MAX(id) FROM ledger WHERE {self._rebuild_condition('ledger')} "
             "GROUP BY op_type, operation_id, book_account, account_id, asset_id)", [(":frontier", frontier)])
+        self._update_snapshots(frontier, start)
+        if not exception_happened:
+            _ = self._exec("DELETE FROM ledger_dirty", commit=True)
         JalSettings().setValue('RebuildDB', 0)
         if exception_happened:
             logging.error(self.tr("Exception happened. Ledger is incomplete. Please correct errors listed in log"))
@@ -299,10 +543,227 @@ class Ledger(QObject, JalDB):
             logging.info(self.tr("Ledger is complete. Elapsed time: ") + f"{datetime.now() - start_time}" +
                          self.tr(", new frontier: ") + f"{ts2dt(last_timestamp)}")
 
+        self.clear_ledger_cache()
         self.updated.emit()
 
+    # Returns SQL condition that selects records that should be rebuilt: all records after frontier and records of
+    # accounts with invalidated ledger (listed in 'ledger_dirty' table) since the moment of invalidation.
+    # 'table' - name or alias of a table that has 'account_id' field and 'timestamp_field'
+    @staticmethod
+    def _rebuild_condition(table, timestamp_field='timestamp') -> str:
+        return f"({table}.{timestamp_field} >= :frontier OR {table}.{timestamp_field} >= " \
+               f"(SELECT d.timestamp FROM ledger_dirty AS d WHERE d.account_id = {table}.account_id))"
+
+    # Creates ledger snapshots for rebuilt part of the ledger. Snapshot keeps 'amount_acc' and 'value_acc' of the last
+    # ledger record for every (account, book, asset) at the end of every N-th month, where N is 'LedgerSnapshotPeriod'
+    # setting value (0 disables snapshots, full rebuild is required after change of this value).
+    # Every snapshot is built from previous one and ledger records after it (the first snapshot of the rebuild takes the
+    # latest snapshot before it that was kept, or the whole ledger if there is no such snapshot).
+    def _update_snapshots(self, frontier, start):
+        period = int(JalSettings().getValue('LedgerSnapshotPeriod', 0))
+        end = self._read("SELECT MAX(timestamp) FROM ledger")
+        if period <= 0 or not end:
+            return
+        timestamps = self._snapshot_timestamps(start, end, period)
+        if not timestamps:
+            return
+        previous = self._read("SELECT coalesce(MAX(timestamp), -1) FROM ledger_snapshots WHERE timestamp<:first",
+                              [(":first", timestamps[0])])
+        for timestamp in timestamps:
+            params = [(":frontier", frontier), (":snapshot", timestamp), (":previous", previous)]
+            _ = self._exec(
+                "INSERT INTO ledger_snapshots(timestamp, account_id, book_account, asset_id, amount_acc, value_acc) "
+                "SELECT :snapshot, l.account_id, l.book_account, l.asset_id, l.amount_acc, l.value_acc "
+                "FROM ledger AS l WHERE l.id IN (SELECT MAX(id) FROM ledger "
+                "WHERE timestamp<=:snapshot AND timestamp>:previous GROUP BY account_id, book_account, asset_id) "
+                "AND (CAST(l.amount_acc AS TEXT)!='0' OR CAST(l.value_acc AS TEXT)!='0') "
+                "AND (:snapshot>=:frontier OR "
+                ":snapshot>=(SELECT d.timestamp FROM ledger_dirty AS d WHERE d.account_id=l.account_id)) "
+                "UNION ALL "
+                "SELECT :snapshot, s.account_id, s.book_account, s.asset_id, s.amount_acc, s.value_acc "
+                "FROM ledger_snapshots AS s WHERE s.timestamp=:previous "
+                "AND (:snapshot>=:frontier OR "
+                ":snapshot>=(SELECT d.timestamp FROM ledger_dirty AS d WHERE d.account_id=s.account_id)) "
+                "AND NOT EXISTS(SELECT 1 FROM ledger AS x WHERE x.account_id=s.account_id "
+                "AND x.book_account=s.book_account AND x.asset_id=s.asset_id "
+                "AND x.timestamp>:previous AND x.timestamp<=:snapshot)", params)
+            previous = timestamp
+        self.commit()
+
+    # Returns a list of snapshot timestamps between begin and end - last seconds of every 'period'-th month of a year
+    @staticmethod
+    def _snapshot_timestamps(begin, end, period) -> list:
+        timestamps = []
+        timestamp = month_end(max(begin, 0))
+        while timestamp <= end:
+            month = datetime.utcfromtimestamp(timestamp)
+            if (month.year * 12 + month.month) % period == 0:
+                timestamps.append(timestamp)
+            timestamp = month_end(timestamp + 1)
+        return timestamps
+
+    # Returns query that selects operations that should be rebuilt (see _rebuild_condition())
+    def _sequence_query(self, frontier):
+        return self._exec(f"SELECT s.op_type, s.id, s.timestamp, s.account_id, s.subtype FROM operation_sequence AS s "
+                          f"WHERE {self._rebuild_condition('s')}", [(":frontier", frontier)])
+
+    # Extends invalidation of accounts in 'ledger_dirty' table with accounts that received assets by transfers
+    # from invalidated accounts after the moment of invalidation, as incoming transfer takes value from outgoing one.
+    def _extend_invalidation(self):
+        dirty = {}
+        query = self._exec("SELECT account_id, timestamp FROM ledger_dirty")
+        while query.next():
+            account_id, timestamp = self._read_record(query)
+            dirty[account_id] = timestamp
+        if not dirty:
+            return
+        transfers = []
+        query = self._exec("SELECT withdrawal_account, withdrawal_timestamp, deposit_account, deposit_timestamp "
+                           "FROM transfers WHERE withdrawal_timestamp >= :since ORDER BY withdrawal_timestamp",
+                           [(":since", min(dirty.values()))])
+        while query.next():
+            transfers.append(self._read_record(query))
+        extended = {}
+        changed = True
+        while changed:
+            changed = False
+            for withdrawal_account, withdrawal_timestamp, deposit_account, deposit_timestamp in transfers:
+                if withdrawal_account not in dirty or withdrawal_timestamp < dirty[withdrawal_account]:
+                    continue
+                if deposit_account not in dirty or deposit_timestamp < dirty[deposit_account]:
+                    dirty[deposit_account] = extended[deposit_account] = deposit_timestamp
+                    changed = True
+        for account_id, timestamp in extended.items():
+            _ = self._exec("INSERT INTO invalidate_ledger(account_id, timestamp) VALUES(:account_id, :timestamp)",
+                           [(":account_id", account_id), (":timestamp", timestamp)], commit=True)
+
+    # Processes operations that should be rebuilt one by one and returns timestamp of the last processed operation
+    # start - the earliest timestamp of operations to rebuild
+    def _process(self, frontier, start) -> int:
+        last_timestamp = 0
+        operations = OperationsLoader(start)
+        query = self._sequence_query(frontier)
+        while query.next():
+            data = self._read_record(query, named=True)
+            last_timestamp = data['timestamp']
+            operation = operations.get_operation(data['op_type'], data['id'], data['subtype'])
+            operation.processLedger(self)
+            if self.progress_bar is not None:
+                self.progress_bar.setValue(query.at())
+        return last_timestamp
+
+    # Processes operations that should be rebuilt in 'workers' processes. Operations are split into groups of
+    # accounts that don't depend on each other, every process works with its own DB connection and returns results
+    # without DB writes. Then results are written into DB in the order of operation sequence, so all 'id' values are
+    # the same as they would be with sequential processing. If any process fails no results are written at all.
+    # Returns timestamp of the last processed operation.
+    def _process_parallel(self, frontier, start, workers) -> int:
+        sequence = []
+        query = self._sequence_query(frontier)
+        while query.next():
+            sequence.append(self._read_record(query, named=True))
+        buckets = self._split_sequence(sequence, workers)
+        if len(buckets) < 2:
+            return self._process(frontier, start)
+        results = []
+        changed = []
+        error = None
+        with ProcessPoolExecutor(max_workers=len(buckets), mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_rebuild_worker,
+                                 initargs=(self._db_path(), self.ledger_fixed_point())) as pool:
+            tasks = [pool.submit(_rebuild_worker, start, bucket) for bucket in buckets]
+            for task in as_completed(tasks):
+                try:
+                    bucket_results, bucket_changed = task.result()
+                except Exception as e:
+                    error = e if error is None else error
+                    continue
+                results += bucket_results
+                changed += bucket_changed
+                if self.progress_bar is not None:
+                    self.progress_bar.setValue(len(results))
+        if error is not None:   # Nothing is written as results of other buckets may move frontier beyond failed ones
+            raise error
+        results.sort(key=lambda x: x[0])
+        opened = []
+        closed = []
+        for _index, records, operation_opened, operation_closed in results:
+            for record in records:
+                self._buffer.append(record)
+                if self._buffer.full():
+                    self._buffer.flush()
+            opened += operation_opened
+            closed += operation_closed
+        LedgerLots.write(opened, changed, closed)
+        return sequence[results[-1][0]]['timestamp'] if results else 0
+
+    # Splits operation sequence into groups of operations that may be processed independently. Every operation
+    # belongs to the group of its account, transfers join groups of all accounts they involve. Groups are distributed
+    # between not more than 'count' buckets with similar number of operations.
+    # Returns a list of buckets, each bucket is a list of (index in sequence, op_type, id, subtype) tuples.
+    @staticmethod
+    def _split_sequence(sequence, count) -> list:
+        groups = {}   # account_id -> id of account that represents group
+        def group_of(account_id):
+            while groups.setdefault(account_id, account_id) != account_id:
+                account_id = groups[account_id]
+            return account_id
+
+        transfers = {}
+        for item in sequence:
+            group = group_of(item['account_id'])
+            if item['op_type'] == LedgerTransaction.Transfer:
+                linked = group_of(transfers.setdefault(item['id'], group))
+                groups[group] = linked
+        grouped = {}
+        for i, item in enumerate(sequence):
+            grouped.setdefault(group_of(item['account_id']), []).append(
+                (i, item['op_type'], item['id'], item['subtype']))
+        buckets = [[] for _ in range(min(count, len(grouped)))]
+        for group in sorted(grouped.values(), key=len, reverse=True):
+            min(buckets, key=len).extend(group)
+        for bucket in buckets:
+            bucket.sort()
+        return buckets
+
+    # Processes given operations keeping all results in memory and returns them grouped by operation as a list of
+    # (index in sequence, ledger records, new lots, new closed deals) tuples together with a list of changed lots.
+    # It is used by worker processes of parallel rebuild.
+    def _replay(self, start, operations) -> tuple:
+        self._buffer = LedgerBuffer(sys.maxsize)
+        self.lots = LedgerLots()
+        loader = OperationsLoader(start)
+        bounds = []
+        for index, op_type, operation_id, subtype in operations:
+            loader.get_operation(op_type, operation_id, subtype).processLedger(self)
+            bounds.append((index, len(self._buffer), *self.lots.counts()))
+        records = self._buffer.records()
+        opened, changed, closed = self.lots.take()
+        results = []
+        records_start, opened_start, closed_start = 0, 0, 0
+        for index, records_end, opened_end, closed_end in bounds:
+            results.append((index, records[records_start:records_end], opened[opened_start:opened_end],
+                            closed[closed_start:closed_end]))
+            records_start, opened_start, closed_start = records_end, opened_end, closed_end
+        return results, changed
+
     def showRebuildDialog(self, parent):
         rebuild_dialog = RebuildDialog(parent, self.getCurrentFrontier())
         if rebuild_dialog.exec():
             self.rebuild(from_timestamp=rebuild_dialog.getTimestamp(),
-                         fast_and_dirty=rebuild_dialog.isFastAndDirty())
+                         fast_and_dirty=rebuild_dialog.isFastAndDirty(), workers=0)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Initializes worker process of parallel ledger rebuild with its own read-only connection to DB file
+def _init_rebuild_worker(db_file, fixed_point):
+    db = QSqlDatabase.addDatabase("QSQLITE", Setup.DB_CONNECTION)
+    db.setDatabaseName(db_file)
+    db.open()
+    _ = JalDB._exec("PRAGMA query_only = ON")
+    JalDB.set_ledger_storage(fixed_point)   # Use the same storage format as the main process
+
+
+# Processes a bucket of operations in worker process of parallel ledger rebuild (see Ledger._replay())
+def _rebuild_worker(start, operations) -> tuple:
+    return Ledger()._replay(start, operations)
@@ -25,6 +25,7 @@ class LedgerTransaction(JalDB):
     CorporateAction = 5
     _db_table = ''   # Table where operation is stored in DB
     _db_fields = {}
+    _db_ledger_keys = [("account_id", "timestamp")]   # (account, timestamp) fields of ledger invalidation by triggers
 
     def __init__(self, operation_data=None):
         super().__init__()
@@ -47,6 +48,7 @@ class LedgerTransaction(JalDB):
         self._asset = None
         self._number = ''
         self._reconciled = False
+        self._totals = None    # {(account_id, book, asset_id): amount_acc} preloaded by OperationsLoader if any
 
     def tr(self, text):
         return QApplication.translate("LedgerTransaction", text)
@@ -84,6 +86,34 @@ class LedgerTransaction(JalDB):
         else:
             raise ValueError(f"An attempt to create unknown operation type: {operation_type}")
 
+    # Creates new operations of given type for every dict of 'operations_data' list with batched queries.
+    # Returns a dict {account_id: timestamp} with the earliest timestamp of created operations for every account,
+    # i.e. the ledger invalidation that DB triggers would make for these operations
+    @staticmethod
+    def create_batch(operation_type, operations_data) -> dict:
+        operation_classes = {
+            LedgerTransaction.IncomeSpending: IncomeSpending,
+            LedgerTransaction.Dividend: Dividend,
+            LedgerTransaction.Trade: Trade,
+            LedgerTransaction.Transfer: Transfer,
+            LedgerTransaction.CorporateAction: CorporateAction
+        }
+        try:
+            operation_class = operation_classes[operation_type]
+        except KeyError:
+            raise ValueError(f"An attempt to create unknown operation type: {operation_type}")
+        oids = JalDB().create_operations(operation_class._db_table, operation_class._db_fields, operations_data)
+        invalidation = {}
+        for operation, oid in zip(operations_data, oids):
+            if not oid:
+                continue
+            for account_field, timestamp_field in operation_class._db_ledger_keys:
+                account_id = operation.get(account_field)
+                if account_id is not None:
+                    timestamp = operation[timestamp_field]
+                    invalidation[account_id] = min(timestamp, invalidation.get(account_id, timestamp))
+        return invalidation
+
     # Deletes operation from database
     def delete(self) -> None:
         _ = self._exec(f"DELETE FROM {self._db_table} WHERE id={self._oid}")
@@ -118,25 +148,36 @@ class LedgerTransaction(JalDB):
         return self._view_rows
 
     def _money_total(self, account_id) -> Decimal:
+        precision = jal.db.account.JalAccount(account_id).precision()
+        if self._totals is not None:
+            money = self._from_ledger(self._totals.get((account_id, BookAccount.Money, 0)), precision)
+            debt = self._from_ledger(self._totals.get((account_id, BookAccount.Liabilities, 0)), precision)
+            return money + debt
         money = self._read("SELECT amount_acc FROM ledger_totals WHERE op_type=:op_type AND operation_id=:oid AND "
                            "account_id = :account_id AND book_account=:book",
                            [(":op_type", self._otype), (":oid", self._oid),
                             (":account_id", account_id), (":book", BookAccount.Money)])
-        money = Decimal('0') if money is None else Decimal(money)
+        money = self._from_ledger(money, precision)
         debt = self._read("SELECT amount_acc FROM ledger_totals WHERE op_type=:op_type AND operation_id=:oid AND "
                           "account_id = :account_id AND book_account=:book",
                           [(":op_type", self._otype), (":oid", self._oid),
                            (":account_id", account_id), (":book", BookAccount.Liabilities)])
-        debt = Decimal('0') if debt is None else Decimal(debt)
+        debt = self._from_ledger(debt, precision)
         return money + debt
 
     def _asset_total(self, account_id, asset_id) -> Decimal:
+        precision = jal.db.account.JalAccount(account_id).precision()
+        if self._totals is not None:
+            return self._from_ledger(self._totals.get((account_id, BookAccount.Assets, asset_id)), precision)
         amount = self._read("SELECT amount_acc FROM ledger_totals WHERE op_type=:op_type AND operation_id=:oid AND "
                             "account_id=:account_id AND asset_id=:asset_id AND book_account=:book",
                             [(":op_type", self._otype), (":oid", self._oid), (":account_id", account_id),
                              (":asset_id", asset_id), (":book", BookAccount.Assets)])
-        amount = Decimal('0') if amount is None else Decimal(amount)
-        return amount
+        return self._from_ledger(amount, precision)
+
+    # Sets accumulated ledger values after this operation to be used instead of per-operation queries
+    def set_totals(self, totals: dict) -> None:
+        self._totals = totals
 
     # Performs FIFO deals match in ledger: takes current open positions from 'open_trades' table and converts
     # them into deals in 'deals' table while supplied qty is enough.
@@ -144,14 +185,17 @@ class LedgerTransaction(JalDB):
     # qty - quantity of asset that closes previous open positions
     # price is None if we process corporate action or transfer where we keep initial value and don't have profit or loss
     # Returns total qty, value of deals created.
-    def _close_deals_fifo(self, deal_sign, qty, price):
+    # If ledger keeps open positions in memory (ledger.lots isn't None) then matching is done there.
+    def _close_deals_fifo(self, ledger, deal_sign, qty, price):
+        if ledger.lots is not None:
+            return ledger.lots.close(self, self._account.id(), self._asset.id(), deal_sign, qty, price)
         processed_qty = Decimal('0')
         processed_value = Decimal('0')
         # Get a list of all previous not matched trades or corporate actions
         query = self._exec("SELECT timestamp, op_type, operation_id, account_id, asset_id, price, remaining_qty "
                            "FROM trades_opened "
                            "WHERE account_id=:account_id AND asset_id=:asset_id AND remaining_qty!=:zero "
-                           "ORDER BY timestamp, op_type DESC",
+                           "ORDER BY timestamp, op_type DESC, id",
                            [(":account_id", self._account.id()), (":asset_id", self._asset.id()),
                             (":zero", format_decimal(Decimal('0')))])
         while query.next():
@@ -183,6 +227,18 @@ class LedgerTransaction(JalDB):
                 break
         return processed_qty, processed_value
 
+    # Opens a new position of 'qty' of asset_id at given 'price' that will be matched later by _close_deals_fifo()
+    def _open_position(self, ledger, timestamp, account_id, asset_id, price, qty):
+        if ledger.lots is not None:
+            ledger.lots.open(self, timestamp, account_id, asset_id, price, qty)
+            return
+        _ = self._exec(
+            "INSERT INTO trades_opened(timestamp, op_type, operation_id, account_id, asset_id, price, remaining_qty) "
+            "VALUES(:timestamp, :type, :operation_id, :account_id, :asset_id, :price, :remaining_qty)",
+            [(":timestamp", timestamp), (":type", self._otype), (":operation_id", self._oid),
+             (":account_id", account_id), (":asset_id", asset_id),
+             (":price", format_decimal(price)), (":remaining_qty", format_decimal(qty))])
+
     def id(self):
         return self._oid
 
@@ -280,13 +336,20 @@ class IncomeSpending(LedgerTransaction):
         }
     }
 
-    def __init__(self, operation_id=None):
+    _db_select = "SELECT a.id, a.timestamp, a.account_id, a.peer_id, p.name AS peer, " \
+                 "a.alt_currency_id AS currency FROM actions AS a LEFT JOIN agents AS p ON a.peer_id = p.id"
+    _db_details_select = "SELECT d.pid, d.category_id, c.name AS category, d.tag_id, t.tag, " \
+                         "d.amount, d.amount_alt, d.note FROM action_details AS d " \
+                         "LEFT JOIN categories AS c ON c.id=d.category_id LEFT JOIN tags AS t ON t.id=d.tag_id"
+
+    # prefetched, details - operation data and its lines that were already loaded by OperationsLoader
+    def __init__(self, operation_id=None, prefetched=None, details=None):
         super().__init__(operation_id)
         self._otype = LedgerTransaction.IncomeSpending
-        self._data = self._read("SELECT a.timestamp, a.account_id, a.peer_id, p.name AS peer, "
-                                "a.alt_currency_id AS currency FROM actions AS a "
-                                "LEFT JOIN agents AS p ON a.peer_id = p.id WHERE a.id=:oid",
-                                [(":oid", self._oid)], named=True)
+        if prefetched is None:
+            self._data = self._read(self._db_select + " WHERE a.id=:oid", [(":oid", self._oid)], named=True)
+        else:
+            self._data = prefetched
         self._timestamp = self._data['timestamp']
         self._account = jal.db.account.JalAccount(self._data['account_id'])
         self._account_name = self._account.name()
@@ -295,14 +358,13 @@ class IncomeSpending(LedgerTransaction):
         self._peer_id = self._data['peer_id']
         self._peer = self._data['peer']
         self._currency = self._data['currency']
-        details_query = self._exec("SELECT d.category_id, c.name AS category, d.tag_id, t.tag, "
-                                   "d.amount, d.amount_alt, d.note FROM action_details AS d "
-                                   "LEFT JOIN categories AS c ON c.id=d.category_id "
-                                   "LEFT JOIN tags AS t ON t.id=d.tag_id "
-                                   "WHERE d.pid= :pid", [(":pid", self._oid)])
-        self._details = []
-        while details_query.next():
-            self._details.append(self._read_record(details_query, named=True))
+        if details is None:
+            details_query = self._exec(self._db_details_select + " WHERE d.pid=:pid", [(":pid", self._oid)])
+            self._details = []
+            while details_query.next():
+                self._details.append(self._read_record(details_query, named=True))
+        else:
+            self._details = details
         self._amount = sum(Decimal(line['amount']) for line in self._details)
         self._label, self._label_color = ('—', CustomColor.DarkRed) if self._amount < 0 else ('+', CustomColor.DarkGreen)
         if self._currency:
@@ -393,7 +455,13 @@ class Dividend(LedgerTransaction):
         "note": {"mandatory": False, "validation": True}
     }
 
-    def __init__(self, operation_id=None):
+    _db_select = "SELECT d.id, d.type, d.timestamp, d.ex_date, d.number, d.account_id, d.asset_id, " \
+                 "d.amount, d.tax, l.amount_acc AS t_qty, d.note AS note FROM dividends AS d " \
+                 "LEFT JOIN assets AS a ON d.asset_id = a.id " \
+                 "LEFT JOIN ledger_totals AS l ON l.op_type=d.op_type AND l.operation_id=d.id " \
+                 "AND l.book_account = :book_assets"
+
+    def __init__(self, operation_id=None, prefetched=None):
         labels = {
             Dividend.Dividend: ('Δ', CustomColor.DarkGreen),
             Dividend.BondInterest: ('%', CustomColor.DarkGreen),
@@ -403,13 +471,11 @@ class Dividend(LedgerTransaction):
         super().__init__(operation_id)
         self._otype = LedgerTransaction.Dividend
         self._view_rows = 2
-        self._data = self._read("SELECT d.type, d.timestamp, d.ex_date, d.number, d.account_id, d.asset_id, "
-                                "d.amount, d.tax, l.amount_acc AS t_qty, d.note AS note "
-                                "FROM dividends AS d "
-                                "LEFT JOIN assets AS a ON d.asset_id = a.id "
-                                "LEFT JOIN ledger_totals AS l ON l.op_type=d.op_type AND l.operation_id=d.id "
-                                "AND l.book_account = :book_assets WHERE d.id=:oid",
-                                [(":book_assets", BookAccount.Assets), (":oid", self._oid)], named=True)
+        if prefetched is None:
+            self._data = self._read(self._db_select + " WHERE d.id=:oid",
+                                    [(":book_assets", BookAccount.Assets), (":oid", self._oid)], named=True)
+        else:
+            self._data = prefetched
         self._subtype = self._data['type']
         self._label, self._label_color = labels[self._subtype]
         self._timestamp = self._data['timestamp']
@@ -578,12 +644,7 @@ class Dividend(LedgerTransaction):
         if asset_amount < Decimal('0'):
             raise NotImplemented(self.tr("Not supported action: stock dividend or vesting closes short trade.") +
                                  f" Operation: {self.dump()}")
-        _ = self._exec(
-            "INSERT INTO trades_opened(timestamp, op_type, operation_id, account_id, asset_id, price, remaining_qty) "
-            "VALUES(:timestamp, :type, :operation_id, :account_id, :asset_id, :price, :remaining_qty)",
-            [(":timestamp", self._timestamp), (":type", self._otype), (":operation_id", self._oid),
-             (":account_id", self._account.id()), (":asset_id", self._asset.id()),
-             (":price", format_decimal(self.price())),(":remaining_qty", format_decimal(self._amount))])
+        self._open_position(ledger, self._timestamp, self._account.id(), self._asset.id(), self.price(), self._amount)
         ledger.appendTransaction(self, BookAccount.Assets, self._amount,
                                  asset_id=self._asset.id(), value=self._amount * self.price())
         if self._tax:
@@ -607,15 +668,19 @@ class Trade(LedgerTransaction):
         "note": {"mandatory": False, "validation": False}
     }
 
+    _db_select = "SELECT t.id, t.timestamp, t.settlement, t.number, t.account_id, t.asset_id, t.qty, " \
+                 "t.price, t.fee, t.note FROM trades AS t"
+
     # operation_data is either an integer to select operation from database or a dict with operation data that is used
     # to create a new operation in database and then select it
-    def __init__(self, operation_data=None):
+    def __init__(self, operation_data=None, prefetched=None):
         super().__init__(operation_data)
         self._otype = LedgerTransaction.Trade
         self._view_rows = 2
-        self._data = self._read("SELECT t.timestamp, t.settlement, t.number, t.account_id, t.asset_id, t.qty, "
-                                "t.price, t.fee, t.note FROM trades AS t WHERE t.id=:oid",
-                                [(":oid", self._oid)], named=True)
+        if prefetched is None:
+            self._data = self._read(self._db_select + " WHERE t.id=:oid", [(":oid", self._oid)], named=True)
+        else:
+            self._data = prefetched
         self._timestamp = self._data['timestamp']
         self._settlement = self._data['settlement']
         self._account = jal.db.account.JalAccount(self._data['account_id'])
@@ -704,7 +769,7 @@ class Trade(LedgerTransaction):
         # Get asset amount accumulated before current operation
         asset_amount = ledger.getAmount(BookAccount.Assets, self._account.id(), self._asset.id())
         if ((-deal_sign) * asset_amount) > Decimal('0'):  # Match trade if we have asset that is opposite to operation
-            processed_qty, processed_value = self._close_deals_fifo(deal_sign, qty, self._price)
+            processed_qty, processed_value = self._close_deals_fifo(ledger, deal_sign, qty, self._price)
         if deal_sign > 0:
             credit_value = ledger.takeCredit(self, self._account.id(), trade_value)
         else:
@@ -719,12 +784,8 @@ class Trade(LedgerTransaction):
                                      deal_sign * ((self._price * processed_qty) - processed_value + rounding_error),
                                      category=PredefinedCategory.Profit, peer=self._broker)
         if processed_qty < qty:  # We have a reminder that opens a new position
-            _ = self._exec(
-                "INSERT INTO trades_opened(timestamp, op_type, operation_id, account_id, asset_id, price, remaining_qty) "
-                "VALUES(:timestamp, :type, :operation_id, :account_id, :asset_id, :price, :remaining_qty)",
-                [(":timestamp", self._timestamp), (":type", self._otype), (":operation_id", self._oid),
-                 (":account_id", self._account.id()), (":asset_id", self._asset.id()),
-                 (":price", format_decimal(self._price)), (":remaining_qty", format_decimal(qty - processed_qty))])
+            self._open_position(ledger, self._timestamp, self._account.id(), self._asset.id(), self._price,
+                                qty - processed_qty)
             ledger.appendTransaction(self, BookAccount.Assets, deal_sign * (qty - processed_qty),
                                      asset_id=self._asset.id(), value=deal_sign * (qty - processed_qty) * self._price)
         if self._fee:
@@ -751,8 +812,14 @@ class Transfer(LedgerTransaction):
         "asset": {"mandatory": False, "validation": True, "default": None},
         "note": {"mandatory": False, "validation": False}
     }
+    _db_ledger_keys = [("withdrawal_account", "withdrawal_timestamp"), ("deposit_account", "deposit_timestamp"),
+                       ("fee_account", "withdrawal_timestamp")]
+
+    _db_select = "SELECT t.id, t.withdrawal_timestamp, t.withdrawal_account, t.withdrawal, " \
+                 "t.deposit_timestamp, t.deposit_account, t.deposit, t.fee_account, t.fee, t.asset, " \
+                 "t.number, t.note FROM transfers AS t"
 
-    def __init__(self, operation_id=None, display_type=None):
+    def __init__(self, operation_id=None, display_type=None, prefetched=None):
         labels = {
             Transfer.Outgoing: ('<', CustomColor.DarkBlue),
             Transfer.Incoming: ('>', CustomColor.DarkBlue),
@@ -761,10 +828,10 @@ class Transfer(LedgerTransaction):
         super().__init__(operation_id)
         self._otype = LedgerTransaction.Transfer
         self._display_type = display_type
-        self._data = self._read("SELECT t.withdrawal_timestamp, t.withdrawal_account, t.withdrawal, "
-                                "t.deposit_timestamp, t.deposit_account, t.deposit, t.fee_account, t.fee, t.asset, "
-                                "t.number, t.note FROM transfers AS t WHERE t.id=:oid",
-                                [(":oid", self._oid)], named=True)
+        if prefetched is None:
+            self._data = self._read(self._db_select + " WHERE t.id=:oid", [(":oid", self._oid)], named=True)
+        else:
+            self._data = prefetched
         self._withdrawal_account = jal.db.account.JalAccount(self._data['withdrawal_account'])
         self._withdrawal_account_name = self._withdrawal_account.name()
         self._withdrawal_timestamp = int(self._data['withdrawal_timestamp'])
@@ -925,7 +992,7 @@ class Transfer(LedgerTransaction):
                 raise LedgerError(self.tr("Asset amount is not enough for asset transfer processing. Date: ")
                                   + f"{ts2dt(self._withdrawal_timestamp)}, "
                                   + f"Asset amount: {asset_amount}, Operation: {self.dump()}")
-            processed_qty, processed_value = self._close_deals_fifo(Decimal('-1.0'), self._withdrawal, None)
+            processed_qty, processed_value = self._close_deals_fifo(ledger, Decimal('-1.0'), self._withdrawal, None)
             if processed_qty < self._withdrawal:
                 raise LedgerError(self.tr("Processed asset amount is less than transfer amount. Date: ")
                                   + f"{ts2dt(self._withdrawal_timestamp)}, "
@@ -938,23 +1005,16 @@ class Transfer(LedgerTransaction):
                                      asset_id=self._asset.id(), value=processed_value*currency_rate)
         elif self._display_type == Transfer.Incoming:
             # get value of withdrawn asset
-            value = self._read("SELECT value FROM ledger "
-                               "WHERE book_account=:book_transfers AND op_type=:op_type AND operation_id=:id",
-                               [(":book_transfers", BookAccount.Transfers), (":op_type", self._otype),
-                                (":id", self._oid)], check_unique=True)
-            if not value:
+            value = ledger.getOperationValue(self._otype, self._oid, BookAccount.Transfers)
+            if value is None or value == '':
                 raise LedgerError(self.tr("Asset withdrawal not found for transfer.") + f" Operation:  {self.dump()}")
             else:
-                value = Decimal(value)
+                value = self._from_ledger(value, self._withdrawal_account.precision())
             base = JalAsset.get_base_currency(self._withdrawal_timestamp)
             _, currency_rate = JalAsset(self._deposit_account.currency()).quote(self._deposit_timestamp, base)
             price = value * currency_rate / self._deposit
-            _ = self._exec(
-                "INSERT INTO trades_opened(timestamp, op_type, operation_id, account_id, asset_id, price, remaining_qty) "
-                "VALUES(:timestamp, :type, :operation_id, :account_id, :asset_id, :price, :remaining_qty)",
-                [(":timestamp", self._deposit_timestamp), (":type", self._otype), (":operation_id", self._oid),
-                 (":account_id", self._deposit_account.id()), (":asset_id", self._asset.id()),
-                 (":price", format_decimal(price)), (":remaining_qty", format_decimal(self._deposit))])
+            self._open_position(ledger, self._deposit_timestamp, self._deposit_account.id(), self._asset.id(),
+                                price, self._deposit)
             ledger.appendTransaction(self, BookAccount.Transfers, -self._deposit,
                                      asset_id=self._asset.id(), value=-value)
             ledger.appendTransaction(self, BookAccount.Assets, self._deposit,
@@ -990,7 +1050,12 @@ class CorporateAction(LedgerTransaction):
         }
     }
 
-    def __init__(self, operation_id=None):
+    _db_select = "SELECT a.id, a.type, a.timestamp, a.number, a.account_id, a.qty, a.asset_id, a.note " \
+                 "FROM asset_actions AS a"
+    _db_results_select = "SELECT r.action_id, r.asset_id, r.qty, r.value_share FROM action_results AS r"
+
+    # prefetched, results - operation data and its outcome that were already loaded by OperationsLoader
+    def __init__(self, operation_id=None, prefetched=None, results=None):
         labels = {
             CorporateAction.NA: ("?", CustomColor.LightRed),
             CorporateAction.Merger: ('⭃', CustomColor.Black),
@@ -1009,13 +1074,17 @@ class CorporateAction(LedgerTransaction):
         }
         super().__init__(operation_id)
         self._otype = LedgerTransaction.CorporateAction
-        self._data = self._read("SELECT a.type, a.timestamp, a.number, a.account_id, a.qty, a.asset_id, a.note "
-                                "FROM asset_actions AS a WHERE a.id=:oid", [(":oid", self._oid)], named=True)
-        results_query = self._exec("SELECT asset_id, qty, value_share FROM action_results WHERE action_id=:oid",
-                                   [(":oid", self._oid)])
-        self._results = []
-        while results_query.next():
-            self._results.append(self._read_record(results_query, named=True))
+        if prefetched is None:
+            self._data = self._read(self._db_select + " WHERE a.id=:oid", [(":oid", self._oid)], named=True)
+        else:
+            self._data = prefetched
+        if results is None:
+            results_query = self._exec(self._db_results_select + " WHERE r.action_id=:oid", [(":oid", self._oid)])
+            self._results = []
+            while results_query.next():
+                self._results.append(self._read_record(results_query, named=True))
+        else:
+            self._results = results
         self._view_rows = len(self._results)
         self._subtype = self._data['type']
         self._oname = self.names[self._subtype]
@@ -1148,7 +1217,7 @@ class CorporateAction(LedgerTransaction):
             raise LedgerError(self.tr("Results value of corporate action doesn't match 100% of initial asset value. ")
                                       + f"Date: {ts2dt(self._timestamp)}, Asset amount: {asset_amount}, " 
                                         f"Distributed: {100.0 * float(allocation)}%, Operation: {self.dump()}")
-        processed_qty, processed_value = self._close_deals_fifo(Decimal('-1.0'), self._qty, None)
+        processed_qty, processed_value = self._close_deals_fifo(ledger, Decimal('-1.0'), self._qty, None)
         # Withdraw value with old quantity of old asset
         ledger.appendTransaction(self, BookAccount.Assets, -processed_qty,
                                  asset_id=self._asset.id(), value=-processed_value)
@@ -1168,11 +1237,128 @@ class CorporateAction(LedgerTransaction):
             else:
                 value = share * processed_value
                 price = value / qty
-                _ = self._exec(
-                    "INSERT INTO trades_opened(timestamp, op_type, operation_id, "
-                    "account_id, asset_id, price, remaining_qty) "
-                    "VALUES(:timestamp, :type, :operation_id, :account_id, :asset_id, :price, :remaining_qty)",
-                    [(":timestamp", self._timestamp), (":type", self._otype), (":operation_id", self._oid),
-                     (":account_id", self._account.id()), (":asset_id", asset.id()), (":price", format_decimal(price)),
-                     (":remaining_qty", format_decimal(qty))])
+                self._open_position(ledger, self._timestamp, self._account.id(), asset.id(), price, qty)
                 ledger.appendTransaction(self, BookAccount.Assets, qty, asset_id=asset.id(), value=value)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Loads data of all operations that happened after given frontier with one query per operation table and creates
+# operation objects from these data without extra queries. It is used to avoid per-operation queries during ledger
+# rebuild (transfers are loaded if any of withdrawal or deposit happened after the frontier).
+# If frontier is None then nothing is loaded initially and operations may be loaded by load_closed_trades().
+class OperationsLoader(JalDB):
+    def __init__(self, frontier: int = None):
+        super().__init__()
+        self._operations = {}
+        self._details = {}
+        self._results = {}
+        self._totals = None
+        if frontier is None:
+            return
+        self._load(LedgerTransaction.IncomeSpending, IncomeSpending._db_select + " WHERE a.timestamp>=:frontier",
+                   [(":frontier", frontier)])
+        self._details = self._load_children(IncomeSpending._db_details_select +
+                                      " WHERE d.pid IN (SELECT id FROM actions WHERE timestamp>=:frontier)",
+                                      [(":frontier", frontier)], 'pid')
+        self._load(LedgerTransaction.Dividend, Dividend._db_select + " WHERE d.timestamp>=:frontier",
+                   [(":book_assets", BookAccount.Assets), (":frontier", frontier)])
+        self._load(LedgerTransaction.Trade, Trade._db_select + " WHERE t.timestamp>=:frontier",
+                   [(":frontier", frontier)])
+        self._load(LedgerTransaction.Transfer, Transfer._db_select +
+                   " WHERE t.withdrawal_timestamp>=:frontier OR t.deposit_timestamp>=:frontier",
+                   [(":frontier", frontier)])
+        self._load(LedgerTransaction.CorporateAction, CorporateAction._db_select + " WHERE a.timestamp>=:frontier",
+                   [(":frontier", frontier)])
+        self._results = self._load_children(CorporateAction._db_results_select +
+                                      " WHERE r.action_id IN (SELECT id FROM asset_actions WHERE timestamp>=:frontier)",
+                                      [(":frontier", frontier)], 'action_id')
+
+    # Loads all opening and closing operations of closed trades selected by 'source' - SQL text "FROM ... WHERE ..."
+    # where table 'trades_closed' has alias 'c' and 'params' are parameters of this SQL text
+    def load_closed_trades(self, source: str, params: list):
+        for operation_type, sql_text, alias in [(LedgerTransaction.Dividend, Dividend._db_select, 'd'),
+                                                (LedgerTransaction.Trade, Trade._db_select, 't'),
+                                                (LedgerTransaction.Transfer, Transfer._db_select, 't'),
+                                                (LedgerTransaction.CorporateAction, CorporateAction._db_select, 'a')]:
+            ids = f"SELECT c.open_op_id {source} AND c.open_op_type={operation_type} " \
+                  f"UNION SELECT c.close_op_id {source} AND c.close_op_type={operation_type}"
+            extra = [(":book_assets", BookAccount.Assets)] if operation_type == LedgerTransaction.Dividend else []
+            self._load(operation_type, sql_text + f" WHERE {alias}.id IN ({ids})", params + extra)
+            if operation_type == LedgerTransaction.CorporateAction:
+                self._results = self._load_children(CorporateAction._db_results_select +
+                                                    f" WHERE r.action_id IN ({ids})", params, 'action_id')
+
+    # Loads operations given as a list of (op_type, operation_id) pairs together with their ledger totals.
+    # Totals of all operations are taken with one query and are given to operation objects by get_operation()
+    def load_operations(self, operations: list):
+        ids = {}
+        for operation_type, operation_id in operations:
+            ids.setdefault(operation_type, set()).add(int(operation_id))
+        for operation_type, sql_text, alias in [(LedgerTransaction.IncomeSpending, IncomeSpending._db_select, 'a'),
+                                                (LedgerTransaction.Dividend, Dividend._db_select, 'd'),
+                                                (LedgerTransaction.Trade, Trade._db_select, 't'),
+                                                (LedgerTransaction.Transfer, Transfer._db_select, 't'),
+                                                (LedgerTransaction.CorporateAction, CorporateAction._db_select, 'a')]:
+            if operation_type not in ids:
+                continue
+            id_list = ",".join([str(x) for x in sorted(ids[operation_type])])
+            extra = [(":book_assets", BookAccount.Assets)] if operation_type == LedgerTransaction.Dividend else []
+            self._load(operation_type, sql_text + f" WHERE {alias}.id IN ({id_list})", extra)
+            if operation_type == LedgerTransaction.IncomeSpending:
+                self._details = self._load_children(IncomeSpending._db_details_select +
+                                                    f" WHERE d.pid IN ({id_list})", [], 'pid')
+            if operation_type == LedgerTransaction.CorporateAction:
+                self._results = self._load_children(CorporateAction._db_results_select +
+                                                    f" WHERE r.action_id IN ({id_list})", [], 'action_id')
+        self._totals = {}
+        if not ids:
+            return
+        condition = " OR ".join([f"(op_type={operation_type} AND operation_id IN ({','.join([str(x) for x in oids])}))"
+                                 for operation_type, oids in ids.items()])
+        query = self._exec("SELECT op_type, operation_id, account_id, asset_id, book_account, amount_acc "
+                           f"FROM ledger_totals WHERE {condition}")
+        while query.next():
+            operation_type, operation_id, account_id, asset_id, book, amount = self._read_record(query)
+            if book != BookAccount.Assets:   # Money and liabilities are kept in account currency only
+                asset_id = 0
+            totals = self._totals.setdefault((operation_type, operation_id), {})
+            totals.setdefault((account_id, book, asset_id), amount)
+
+    def _load(self, operation_type, sql_text, params):
+        self._operations[operation_type] = {}
+        query = self._exec(sql_text, params)
+        while query.next():
+            data = self._read_record(query, named=True)
+            self._operations[operation_type][data['id']] = data
+
+    # Returns child records grouped into lists by value of 'parent_field'
+    def _load_children(self, sql_text, params, parent_field) -> dict:
+        children = {}
+        query = self._exec(sql_text, params)
+        while query.next():
+            data = self._read_record(query, named=True)
+            children.setdefault(data[parent_field], []).append(data)
+        return children
+
+    # Returns operation object in the same way as LedgerTransaction.get_operation() does.
+    # Falls back to usual per-operation load if operation wasn't loaded before.
+    def get_operation(self, operation_type, operation_id, display_type=None):
+        try:
+            data = self._operations[operation_type][operation_id]
+        except KeyError:
+            return LedgerTransaction.get_operation(operation_type, operation_id, display_type)
+        if operation_type == LedgerTransaction.IncomeSpending:
+            operation = IncomeSpending(operation_id, prefetched=data, details=self._details.get(operation_id, []))
+        elif operation_type == LedgerTransaction.Dividend:
+            operation = Dividend(operation_id, prefetched=data)
+        elif operation_type == LedgerTransaction.Trade:
+            operation = Trade(operation_id, prefetched=data)
+        elif operation_type == LedgerTransaction.Transfer:
+            operation = Transfer(operation_id, display_type, prefetched=data)
+        elif operation_type == LedgerTransaction.CorporateAction:
+            operation = CorporateAction(operation_id, prefetched=data, results=self._results.get(operation_id, []))
+        else:
+            raise ValueError(f"An attempt to select unknown operation type: {operation_type}")
+        if self._totals is not None:
+            operation.set_totals(self._totals.get((operation_type, operation_id), {}))
+        return operation
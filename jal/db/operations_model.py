@@ -1,14 +1,19 @@
 from decimal import Decimal
+from collections import OrderedDict
 from PySide6.QtCore import Qt, Slot, QDate, QAbstractTableModel, QModelIndex
 from PySide6.QtGui import QBrush, QFontDatabase
 from PySide6.QtWidgets import QStyledItemDelegate, QHeaderView
 from jal.constants import CustomColor
 from jal.db.ledger import Ledger
-from jal.db.operations import LedgerTransaction
+from jal.db.operations import LedgerTransaction, OperationsLoader
 from jal.widgets.helpers import ts2dt
 
 
 class OperationsModel(QAbstractTableModel):
+    FETCH_SIZE = 500      # How many operations are taken from DB at once when view needs more rows
+    WINDOW_SIZE = 100     # How many operations are loaded together with their totals when one of them is displayed
+    CACHE_SIZE = 1000     # Max number of operation objects kept in memory
+
     def __init__(self, parent_view):
         super().__init__(parent_view)
         self._columns = [" ", self.tr("Timestamp"), self.tr("Account"), self.tr("Notes"),
@@ -16,6 +21,9 @@ class OperationsModel(QAbstractTableModel):
         self._view = parent_view
         self._amount_delegate = None
         self._data = []
+        self._more = False              # True if not all rows of operation sequence were fetched into self._data
+        self._fetch_all = False         # True if all rows should be fetched at once (i.e. while search is active)
+        self._operations = OrderedDict()   # LRU cache of operation objects {(op_type, id, subtype): operation}
         self._begin = 0
         self._end = 0
         self._account = 0
@@ -27,6 +35,40 @@ class OperationsModel(QAbstractTableModel):
     def rowCount(self, parent=None):
         return len(self._data)
 
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self._more
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        rows = self._fetch(len(self._data))
+        if rows:
+            self.beginInsertRows(QModelIndex(), len(self._data), len(self._data) + len(rows) - 1)
+            self._data += rows
+            self.endInsertRows()
+
+    # Returns next FETCH_SIZE rows (or all remaining rows if fetch of all rows is on) of operation sequence starting
+    # from 'offset' position
+    def _fetch(self, offset: int) -> list:
+        if self._fetch_all:
+            rows = Ledger.get_operations_sequence(self._begin, self._end, self._account)[offset:]
+            self._more = False
+        else:
+            rows = Ledger.get_operations_sequence(self._begin, self._end, self._account,
+                                                  offset=offset, limit=self.FETCH_SIZE)
+            self._more = len(rows) == self.FETCH_SIZE
+        return rows
+
+    # Proxy model filters only rows that were fetched, so all rows should be fetched while search string is active.
+    # Otherwise a search with few matches makes view to fetch all pages one by one.
+    @Slot()
+    def setSearchActive(self, active: bool):
+        self._fetch_all = active
+        if active and self.canFetchMore():
+            self.fetchMore()
+
     def columnCount(self, parent=None):
         return len(self._columns)
 
@@ -45,9 +87,7 @@ class OperationsModel(QAbstractTableModel):
         row = index.row()
         if not index.isValid():
             return None
-        operation = LedgerTransaction().get_operation(self._data[row]['op_type'],
-                                                      self._data[row]['id'],
-                                                      self._data[row]['subtype'])
+        operation = self._operation(row)
         if role == Qt.DisplayRole:
             return self.data_text(operation, index.column())
         if role == Qt.FontRole and index.column() == 0:
@@ -69,6 +109,26 @@ class OperationsModel(QAbstractTableModel):
         if role == Qt.UserRole:  # return underlying data for given field extra parameter
             return self._data[index.row()][field]
 
+    # Returns operation object for given row. Objects are loaded by windows of WINDOW_SIZE rows together with their
+    # ledger totals and the least recently used are dropped when there are more than CACHE_SIZE of them
+    def _operation(self, row):
+        key = (self._data[row]['op_type'], self._data[row]['id'], self._data[row]['subtype'])
+        try:
+            self._operations.move_to_end(key)
+            return self._operations[key]
+        except KeyError:
+            pass
+        start = row - row % self.WINDOW_SIZE
+        keys = [(x['op_type'], x['id'], x['subtype']) for x in self._data[start:start + self.WINDOW_SIZE]]
+        keys = [x for x in keys if x not in self._operations]
+        loader = OperationsLoader()
+        loader.load_operations([(x[0], x[1]) for x in keys])
+        for operation_key in keys:
+            self._operations[operation_key] = loader.get_operation(*operation_key)
+        while len(self._operations) > self.CACHE_SIZE:
+            self._operations.popitem(last=False)
+        return self._operations[key]
+
     def data_text(self, operation, column):
         if column == 0:
             return operation.label()
@@ -132,13 +192,17 @@ class OperationsModel(QAbstractTableModel):
         if self._view.model() != self:          # View uses some proxy model
             idx = self._view.model().mapToSource(idx)
         self.prepareData()
+        while idx.row() >= self.rowCount() and self.canFetchMore():
+            self.fetchMore()
+        if idx.isValid():
+            idx = self.index(idx.row(), idx.column())
         if self._view.model() != self:
             idx = self._view.model().mapFromSource(idx)
         self._view.setCurrentIndex(idx)
 
     def prepareData(self):
-        self._data = []
-        self._data = Ledger.get_operations_sequence(self._begin, self._end, self._account)
+        self._operations.clear()
+        self._data = self._fetch(0)
         self.modelReset.emit()
 
     def delete_rows(self, rows):
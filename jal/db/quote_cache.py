@@ -0,0 +1,75 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Process-wide cache of quotation series and base currency history.
+# Every (asset_id, currency_id) series is loaded from DB once as two lists (timestamps and quotes) sorted by timestamp,
+# and then as-of lookups are done with binary search. Memory is limited by total number of cached quotes - least
+# recently used series are dropped as a whole when the limit is exceeded.
+# Data are loaded with help of 'loader' callables provided by caller, so the class has no DB dependency itself.
+# A series should be invalidated when its quotes are changed and the whole cache should be cleared when another DB is
+# opened or data are modified outside of JalAsset.set_quotes() (reference data dialogs).
+class QuoteCache:
+    MAX_QUOTES = 500000            # Max total number of quotes kept in cache
+    _series = OrderedDict()        # {(asset_id, currency_id): (timestamps: list, quotes: list)} in LRU order
+    _size = 0                      # Total number of quotes in _series
+    _base_currency = None          # ([since_timestamp], [currency_id]) sorted by timestamp
+
+    # Returns cached (timestamps, quotes) series for given asset and currency. loader() is called to get the series
+    # from DB if it isn't cached yet
+    @classmethod
+    def series(cls, asset_id: int, currency_id: int, loader) -> tuple:
+        key = (asset_id, currency_id)
+        try:
+            cls._series.move_to_end(key)
+            return cls._series[key]
+        except KeyError:
+            pass
+        series = loader()
+        cls._series[key] = series
+        cls._size += len(series[0])
+        while cls._size > cls.MAX_QUOTES and len(cls._series) > 1:
+            _, (timestamps, _) = cls._series.popitem(last=False)
+            cls._size -= len(timestamps)
+        return series
+
+    # Returns a tuple (timestamp, quote) with the last quote with timestamp <= given one or None if there is no quote
+    @classmethod
+    def quote(cls, asset_id: int, currency_id: int, timestamp: int, loader):
+        timestamps, quotes = cls.series(asset_id, currency_id, loader)
+        i = bisect_right(timestamps, timestamp)
+        if i == 0:
+            return None
+        return timestamps[i - 1], quotes[i - 1]
+
+    # Returns a list of (timestamp, quote) tuples for quotes within [begin, end] interval
+    @classmethod
+    def quotes(cls, asset_id: int, currency_id: int, begin: int, end: int, loader) -> list:
+        timestamps, quotes = cls.series(asset_id, currency_id, loader)
+        i = bisect_left(timestamps, begin)
+        j = bisect_right(timestamps, end)
+        return list(zip(timestamps[i:j], quotes[i:j]))
+
+    # Returns id of base currency that was in effect for given timestamp or 0 if there is no such currency.
+    # loader() should return ([since_timestamp], [currency_id]) lists sorted by timestamp
+    @classmethod
+    def base_currency(cls, timestamp: int, loader) -> int:
+        if cls._base_currency is None:
+            cls._base_currency = loader()
+        timestamps, currencies = cls._base_currency
+        i = bisect_right(timestamps, timestamp)
+        return currencies[i - 1] if i else 0
+
+    # Drops cached series of given asset: for given currency only or for all currencies if currency_id is None
+    @classmethod
+    def invalidate(cls, asset_id: int, currency_id: int = None) -> None:
+        for key in [x for x in cls._series if x[0] == asset_id and (currency_id is None or x[1] == currency_id)]:
+            timestamps, _ = cls._series.pop(key)
+            cls._size -= len(timestamps)
+
+    @classmethod
+    def clear(cls) -> None:
+        cls._series.clear()
+        cls._size = 0
+        cls._base_currency = None
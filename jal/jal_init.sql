@@ -167,6 +167,8 @@ CREATE TABLE languages (
 );
 
 -- Table: ledger
+-- Columns amount, value, amount_acc and value_acc have no type affinity in 'ledger', 'ledger_totals' and
+-- 'ledger_snapshots' tables as they keep either TEXT decimals or INTEGER fixed-point values (see 'LedgerFixedPoint')
 DROP TABLE IF EXISTS ledger;
 CREATE TABLE ledger (
     id           INTEGER PRIMARY KEY NOT NULL UNIQUE,
@@ -176,14 +178,24 @@ CREATE TABLE ledger (
     book_account INTEGER NOT NULL,
     asset_id     INTEGER REFERENCES assets (id) ON DELETE SET NULL ON UPDATE SET NULL,
     account_id   INTEGER NOT NULL REFERENCES accounts (id) ON DELETE NO ACTION ON UPDATE NO ACTION,
-    amount       TEXT,
-    value        TEXT,
-    amount_acc   TEXT,
-    value_acc    TEXT,
+    amount,
+    value,
+    amount_acc,
+    value_acc,
     peer_id      INTEGER REFERENCES agents (id) ON DELETE NO ACTION ON UPDATE NO ACTION,
     category_id  INTEGER REFERENCES categories (id) ON DELETE NO ACTION ON UPDATE NO ACTION,
     tag_id       INTEGER REFERENCES tags (id) ON DELETE NO ACTION ON UPDATE NO ACTION
 );
+DROP INDEX IF EXISTS ledger_by_account_book_asset;
+CREATE INDEX ledger_by_account_book_asset ON ledger (account_id, book_account, asset_id, timestamp);
+DROP INDEX IF EXISTS ledger_by_book_asset;
+CREATE INDEX ledger_by_book_asset ON ledger (book_account, asset_id, account_id, timestamp, amount_acc);
+DROP INDEX IF EXISTS ledger_by_category;
+CREATE INDEX ledger_by_category ON ledger (category_id, timestamp, book_account, account_id, amount);
+DROP INDEX IF EXISTS ledger_by_peer;
+CREATE INDEX ledger_by_peer ON ledger (peer_id, timestamp, op_type, operation_id, account_id);
+DROP INDEX IF EXISTS ledger_by_tag;
+CREATE INDEX ledger_by_tag ON ledger (tag_id, timestamp, op_type, operation_id, account_id);
 
 -- Table: ledger_totals to keep last accumulated amount value for each transaction
 DROP TABLE IF EXISTS ledger_totals;
@@ -195,14 +207,36 @@ CREATE TABLE ledger_totals (
     book_account INTEGER NOT NULL,
     asset_id     INTEGER NOT NULL,
     account_id   INTEGER NOT NULL,
-    amount_acc   TEXT    NOT NULL,
-    value_acc    TEXT    NOT NULL
+    amount_acc   NOT NULL,
+    value_acc    NOT NULL
 );
 DROP INDEX IF EXISTS ledger_totals_by_timestamp;
 CREATE INDEX ledger_totals_by_timestamp ON ledger_totals (timestamp);
 DROP INDEX IF EXISTS ledger_totals_by_operation_book;
 CREATE INDEX ledger_totals_by_operation_book ON ledger_totals (op_type, operation_id, book_account);
 
+-- Table: ledger_snapshots to keep accumulated amounts and values of ledger for every account, book and asset
+-- at the end of periods (see 'LedgerSnapshotPeriod' setting)
+DROP TABLE IF EXISTS ledger_snapshots;
+CREATE TABLE ledger_snapshots (
+    id           INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    timestamp    INTEGER NOT NULL,
+    account_id   INTEGER NOT NULL REFERENCES accounts (id) ON DELETE CASCADE ON UPDATE CASCADE,
+    book_account INTEGER NOT NULL,
+    asset_id     INTEGER NOT NULL,
+    amount_acc   NOT NULL,
+    value_acc    NOT NULL
+);
+DROP INDEX IF EXISTS ledger_snapshots_by_account;
+CREATE UNIQUE INDEX ledger_snapshots_by_account ON ledger_snapshots (account_id, timestamp, book_account, asset_id);
+
+-- Table: ledger_dirty to keep the earliest timestamp since which ledger of the account should be rebuilt
+DROP TABLE IF EXISTS ledger_dirty;
+CREATE TABLE ledger_dirty (
+    account_id INTEGER PRIMARY KEY NOT NULL UNIQUE REFERENCES accounts (id) ON DELETE CASCADE ON UPDATE CASCADE,
+    timestamp  INTEGER NOT NULL
+);
+
 -- Table: map_category
 DROP TABLE IF EXISTS map_category;
 CREATE TABLE map_category (
@@ -246,6 +280,31 @@ CREATE TABLE quotes (
 );
 CREATE UNIQUE INDEX unique_quotations ON quotes (asset_id, currency_id, timestamp);
 
+-- Table: quote_coverage
+-- Time intervals [begin_ts, end_ts] that were successfully downloaded from data source 'source_id' for
+-- (asset_id, currency_id) pair. 'fetched' is a timestamp of the last successful download within the interval
+DROP TABLE IF EXISTS quote_coverage;
+CREATE TABLE quote_coverage (
+    id          INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    asset_id    INTEGER REFERENCES assets (id) ON DELETE CASCADE ON UPDATE CASCADE NOT NULL,
+    currency_id INTEGER REFERENCES assets (id) ON DELETE CASCADE ON UPDATE CASCADE NOT NULL,
+    source_id   INTEGER NOT NULL,
+    begin_ts    INTEGER NOT NULL,
+    end_ts      INTEGER NOT NULL,
+    fetched     INTEGER NOT NULL
+);
+CREATE INDEX quote_coverage_by_asset ON quote_coverage (asset_id, currency_id, source_id, begin_ts);
+
+-- Removal of a quote makes coverage interval that contains it incomplete
+DROP TRIGGER IF EXISTS quote_coverage_on_delete;
+CREATE TRIGGER quote_coverage_on_delete
+    AFTER DELETE ON quotes
+    FOR EACH ROW
+BEGIN
+    DELETE FROM quote_coverage
+    WHERE asset_id=OLD.asset_id AND currency_id=OLD.currency_id AND begin_ts<=OLD.timestamp AND end_ts>=OLD.timestamp;
+END;
+
 -- Table: settings
 DROP TABLE IF EXISTS settings;
 CREATE TABLE settings (
@@ -390,6 +449,11 @@ DROP VIEW IF EXISTS frontier;
 CREATE VIEW frontier AS SELECT MAX(ledger.timestamp) AS ledger_frontier FROM ledger;
 
 
+-- View: invalidate_ledger (is used by triggers to invalidate ledger of one account, see invalidate_ledger_insert)
+DROP VIEW IF EXISTS invalidate_ledger;
+CREATE VIEW invalidate_ledger AS SELECT account_id, timestamp FROM ledger_dirty;
+
+
 -- View: assets_ext
 DROP VIEW IF EXISTS assets_ext;
 CREATE VIEW assets_ext AS
@@ -419,6 +483,20 @@ BEGIN
 END;
 
 
+-- Invalidation of ledger: deletes ledger records, snapshots and open positions of given account starting from given
+-- timestamp and keeps the earliest invalidated timestamp for this account in 'ledger_dirty' table
+DROP TRIGGER IF EXISTS invalidate_ledger_insert;
+CREATE TRIGGER invalidate_ledger_insert
+    INSTEAD OF INSERT ON invalidate_ledger FOR EACH ROW WHEN NEW.account_id IS NOT NULL
+BEGIN
+    DELETE FROM ledger WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+    DELETE FROM trades_opened WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+    DELETE FROM ledger_snapshots WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+    INSERT OR REPLACE INTO ledger_dirty(account_id, timestamp)
+    SELECT NEW.account_id, MIN(NEW.timestamp, coalesce(MIN(timestamp), NEW.timestamp))
+    FROM ledger_dirty WHERE account_id = NEW.account_id;
+END;
+
 -- Trigger: action_details_after_delete
 DROP TRIGGER IF EXISTS action_details_after_delete;
 CREATE TRIGGER action_details_after_delete
@@ -426,10 +504,9 @@ CREATE TRIGGER action_details_after_delete
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM actions WHERE id = OLD.pid);
+    INSERT INTO invalidate_ledger(account_id, timestamp) SELECT account_id, timestamp FROM actions WHERE id = OLD.pid;
 END;
 
-
 -- Trigger: action_details_after_insert
 DROP TRIGGER IF EXISTS action_details_after_insert;
 CREATE TRIGGER action_details_after_insert
@@ -437,7 +514,7 @@ CREATE TRIGGER action_details_after_insert
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM actions WHERE id = NEW.pid);
+    INSERT INTO invalidate_ledger(account_id, timestamp) SELECT account_id, timestamp FROM actions WHERE id = NEW.pid;
 END;
 
 -- Trigger: action_details_after_update
@@ -447,7 +524,7 @@ CREATE TRIGGER action_details_after_update
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM actions WHERE id = OLD.pid );
+    INSERT INTO invalidate_ledger(account_id, timestamp) SELECT account_id, timestamp FROM actions WHERE id = OLD.pid;
 END;
 
 -- Trigger: actions_after_delete
@@ -458,7 +535,7 @@ CREATE TRIGGER actions_after_delete
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM action_details WHERE pid = OLD.id;
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
 END;
 
 -- Trigger: actions_after_insert
@@ -468,7 +545,7 @@ CREATE TRIGGER actions_after_insert
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
 END;
 
 -- Trigger: actions_after_update
@@ -478,7 +555,8 @@ CREATE TRIGGER actions_after_update
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
 END;
 
 -- Trigger: dividends_after_delete
@@ -488,7 +566,7 @@ CREATE TRIGGER dividends_after_delete
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
 END;
 
 -- Trigger: dividends_after_insert
@@ -498,7 +576,7 @@ CREATE TRIGGER dividends_after_insert
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
 END;
 
 -- Trigger: dividends_after_update
@@ -508,17 +586,17 @@ CREATE TRIGGER dividends_after_update
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
 END;
 
 DROP TRIGGER IF EXISTS trades_after_delete;
 CREATE TRIGGER trades_after_delete
-         AFTER DELETE ON trades
+      AFTER DELETE ON trades
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
-    DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
 END;
 
 DROP TRIGGER IF EXISTS trades_after_insert;
@@ -527,8 +605,7 @@ CREATE TRIGGER trades_after_insert
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
-    DELETE FROM trades_opened WHERE timestamp >= NEW.timestamp;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
 END;
 
 DROP TRIGGER IF EXISTS trades_after_update;
@@ -537,8 +614,8 @@ CREATE TRIGGER trades_after_update
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
-    DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
 END;
 
 DROP TRIGGER IF EXISTS asset_action_after_delete;
@@ -547,8 +624,7 @@ CREATE TRIGGER asset_action_after_delete
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
-    DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
 END;
 
 DROP TRIGGER IF EXISTS asset_action_after_insert;
@@ -557,8 +633,7 @@ CREATE TRIGGER asset_action_after_insert
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
-    DELETE FROM trades_opened WHERE timestamp >= NEW.timestamp;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
 END;
 
 DROP TRIGGER IF EXISTS asset_action_after_update;
@@ -567,8 +642,8 @@ CREATE TRIGGER asset_action_after_update
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
-    DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp  OR timestamp >= NEW.timestamp;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
 END;
 
 DROP TRIGGER IF EXISTS asset_result_after_delete;
@@ -577,7 +652,7 @@ CREATE TRIGGER asset_result_after_delete
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id);
+    INSERT INTO invalidate_ledger(account_id, timestamp) SELECT account_id, timestamp FROM asset_actions WHERE id = OLD.action_id;
 END;
 
 DROP TRIGGER IF EXISTS asset_result_after_insert;
@@ -586,7 +661,7 @@ CREATE TRIGGER asset_result_after_insert
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM asset_actions WHERE id = NEW.action_id);
+    INSERT INTO invalidate_ledger(account_id, timestamp) SELECT account_id, timestamp FROM asset_actions WHERE id = NEW.action_id;
 END;
 
 DROP TRIGGER IF EXISTS asset_result_after_update;
@@ -595,7 +670,7 @@ CREATE TRIGGER asset_result_after_update
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id);
+    INSERT INTO invalidate_ledger(account_id, timestamp) SELECT account_id, timestamp FROM asset_actions WHERE id = OLD.action_id;
 END;
 
 DROP TRIGGER IF EXISTS transfers_after_delete;
@@ -604,7 +679,9 @@ CREATE TRIGGER transfers_after_delete
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.withdrawal_timestamp OR timestamp >= OLD.deposit_timestamp;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.withdrawal_account, OLD.withdrawal_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.deposit_account, OLD.deposit_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.fee_account, OLD.withdrawal_timestamp);
 END;
 
 DROP TRIGGER IF EXISTS transfers_after_insert;
@@ -613,7 +690,9 @@ CREATE TRIGGER transfers_after_insert
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= NEW.withdrawal_timestamp OR timestamp >= NEW.deposit_timestamp;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.withdrawal_account, NEW.withdrawal_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.deposit_account, NEW.deposit_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.fee_account, NEW.withdrawal_timestamp);
 END;
 
 DROP TRIGGER IF EXISTS transfers_after_update;
@@ -623,8 +702,12 @@ CREATE TRIGGER transfers_after_update
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.withdrawal_timestamp OR timestamp >= OLD.deposit_timestamp OR
-                timestamp >= NEW.withdrawal_timestamp OR timestamp >= NEW.deposit_timestamp;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.withdrawal_account, OLD.withdrawal_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.deposit_account, OLD.deposit_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.fee_account, OLD.withdrawal_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.withdrawal_account, NEW.withdrawal_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.deposit_account, NEW.deposit_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.fee_account, NEW.withdrawal_timestamp);
 END;
 
 DROP TRIGGER IF EXISTS validate_account_insert;
@@ -643,6 +726,17 @@ BEGIN
     SELECT RAISE(ABORT, "JAL_SQL_MSG_0001");
 END;
 
+-- Trigger: accounts_precision_after_update - fixed-point ledger amounts of the account are scaled by its precision
+DROP TRIGGER IF EXISTS accounts_precision_after_update;
+CREATE TRIGGER accounts_precision_after_update
+      AFTER UPDATE OF precision ON accounts
+      FOR EACH ROW
+      WHEN NEW.precision != OLD.precision AND (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger_totals WHERE account_id = NEW.id;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.id, 0);
+END;
+
 -- Trigger to keep predefinded categories from deletion
 DROP TRIGGER IF EXISTS keep_predefined_categories;
 CREATE TRIGGER keep_predefined_categories BEFORE DELETE ON categories FOR EACH ROW WHEN OLD.special = 1
@@ -652,7 +746,7 @@ END;
 
 
 -- Initialize default values for settings
-INSERT INTO settings(id, name, value) VALUES (0, 'SchemaVersion', 49);
+INSERT INTO settings(id, name, value) VALUES (0, 'SchemaVersion', 55);
 INSERT INTO settings(id, name, value) VALUES (1, 'TriggersEnabled', 1);
 -- INSERT INTO settings(id, name, value) VALUES (2, 'BaseCurrency', 1); -- Deprecated and ID shouldn't be re-used
 INSERT INTO settings(id, name, value) VALUES (3, 'Language', 1);
@@ -672,6 +766,8 @@ INSERT INTO settings(id, name, value) VALUES (16, 'EuLidlRefreshToken', '');
 INSERT INTO settings(id, name, value) VALUES (17, 'PtPingoDoceAccessToken', '');
 INSERT INTO settings(id, name, value) VALUES (18, 'PtPingoDoceRefreshToken', '');
 INSERT INTO settings(id, name, value) VALUES (19, 'PtPingoDoceUserProfile', '{}');
+INSERT INTO settings(id, name, value) VALUES (20, 'LedgerSnapshotPeriod', 1);
+INSERT INTO settings(id, name, value) VALUES (21, 'LedgerFixedPoint', 0);
 
 -- Initialize available languages
 INSERT INTO languages (id, language) VALUES (1, 'en');
@@ -1,5 +1,9 @@
 import logging
+import threading
+import time
 import xml.etree.ElementTree as xml_tree
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from io import StringIO, BytesIO
@@ -62,16 +66,60 @@ class QuotesUpdateDialog(QDialog):
         return checked
 
 
+# ===================================================================================================================
+# Limits load on a data source: no more than 'concurrency' simultaneous requests and at least 'interval' seconds
+# between starts of two consecutive requests. Is used as a context manager around every request to the source.
+# ===================================================================================================================
+class SourceLimiter:
+    def __init__(self, concurrency: int, interval: float = 0.0):
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self._interval
+        if delay > 0:
+            time.sleep(delay)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._semaphore.release()
+
+
 # ===================================================================================================================
 # Worker class
 # ===================================================================================================================
 # noinspection SpellCheckingInspection
 class QuoteDownloader(QObject):
     download_completed = Signal()
+    MAX_WORKERS = 8             # Number of threads that download data
+    SOURCE_LIMITS = {           # (max simultaneous requests, min interval between requests in seconds) for sources
+        MarketDataFeed.NA: (1, 0.0),
+        MarketDataFeed.FX: (2, 0.2),
+        MarketDataFeed.RU: (4, 0.1),
+        MarketDataFeed.US: (2, 0.5),
+        MarketDataFeed.EU: (2, 0.5),
+        MarketDataFeed.CA: (2, 0.5),
+        MarketDataFeed.GB: (2, 0.5),
+        MarketDataFeed.FRA: (2, 0.5),
+        MarketDataFeed.SMA_VICTORIA: (1, 0.0)
+    }
+    YAHOO_URL = "https://query1.finance.yahoo.com"
+    GAP_MERGE = 30 * 86400      # Missing intervals closer than this are downloaded by one request
+    FINAL_DELAY = 86400         # Quotes are considered final (and covered) if they are older than this at download
 
     def __init__(self):
         super().__init__()
         self.CBR_codes = None
+        self._limiters = {source: SourceLimiter(*limits) for source, limits in self.SOURCE_LIMITS.items()}
+        self._asset_updates = []    # Asset data updates postponed by download threads for main thread
+        self._updates_lock = threading.Lock()
+        self._currency_symbols = {}  # {currency_id: symbol} - resolved by main thread for download threads
 
     def showQuoteDownloadDialog(self, parent):
         dialog = QuotesUpdateDialog(parent)
@@ -95,12 +143,106 @@ class QuoteDownloader(QObject):
             from_timestamp = quotes_end if quotes_end > start else start
         return from_timestamp
 
+    # Stores quotes from the first column of DataFrame indexed by date
     def _store_quotations(self, asset: JalAsset, currency_id: int, data: pd.DataFrame) -> None:
         if data is not None:
-            quotations = []
-            for date, quote in data.iterrows():  # Date in pandas dataset is in UTC by default
-                quotations.append({'timestamp': int(date.timestamp()), 'quote': quote[0]})
-            asset.set_quotes(quotations, currency_id)
+            timestamps = data.index.asi8 // 1000000000   # Date in pandas dataset is in UTC by default
+            asset.store_quotes(timestamps.tolist(), data.iloc[:, 0].tolist(), currency_id)
+
+    # Returns symbol of currency. Symbols are resolved in advance by the main thread as JalAsset() may query DB
+    def _currency_symbol(self, currency_id: int) -> str:
+        try:
+            return self._currency_symbols[currency_id]
+        except KeyError:
+            return JalAsset(currency_id).symbol()
+
+    # Updates asset data in DB. If called from download thread the update is postponed till the main thread
+    # processes download results, as DB connection may be used only by the thread that created it
+    def _update_asset_data(self, asset: JalAsset, details: dict) -> None:
+        if threading.current_thread() is threading.main_thread():
+            asset.update_data(details)
+        else:
+            with self._updates_lock:
+                self._asset_updates.append((asset, details))
+
+    def _apply_asset_updates(self) -> None:
+        with self._updates_lock:
+            updates = self._asset_updates
+            self._asset_updates = []
+        for asset, details in updates:
+            asset.update_data(details)
+
+    # Returns a list of (begin, end) intervals within [start, end] that weren't downloaded before from 'source_id' for
+    # 'asset' in 'currency_id' according to quote coverage records. Intervals without a day start inside are ignored
+    # and intervals closer than GAP_MERGE are joined to be downloaded with one request. Interval after current
+    # coverage isn't returned if coverage reaches the day before requested end (quotes of the last day aren't final).
+    # If there are no coverage records, only the interval after the last available quote is returned.
+    def _missing_ranges(self, asset: JalAsset, currency_id: int, source_id: int, start: int, end: int) -> list:
+        coverage = asset.quote_coverage(currency_id, source_id)
+        if not coverage:
+            from_timestamp = self._adjust_start(asset, currency_id, start)
+            return [] if end < from_timestamp else [(from_timestamp, end)]
+        gaps = []
+        cursor = start
+        for begin, finish, _fetched in coverage:
+            if begin > end:
+                break
+            if begin > cursor:
+                gaps.append((cursor, begin - 1))
+            cursor = max(cursor, finish + 1)
+        current = min(end, int(time.time()))
+        current = current - current % 86400 - self.FINAL_DELAY
+        if cursor <= end and not (cursor > start and cursor - 1 >= current):
+            gaps.append((cursor, end))
+        ranges = []
+        for gap in [x for x in gaps if x[1] - x[1] % 86400 >= x[0]]:
+            if ranges and gap[0] - ranges[-1][1] <= self.GAP_MERGE:
+                ranges[-1] = (ranges[-1][0], gap[1])
+            else:
+                ranges.append(gap)
+        return ranges
+
+    # Executes download job in a thread of the pool within limits of its data source. Every range of the job is
+    # downloaded by a separate request. Returns a tuple (DataFrame, [(begin, end)]) with all downloaded data and list
+    # of successfully downloaded ranges or (None, []) if nothing was downloaded
+    def _load(self, job: dict) -> tuple:
+        frames = []
+        ranges = []
+        for begin, end in job['ranges']:
+            with self._limiters[job['source']]:
+                data = job['loader'](begin, end)
+            if data is not None:
+                frames.append(data)
+                ranges.append((begin, end))
+        if not frames:
+            return None, []
+        return pd.concat(frames), ranges
+
+    # Executes download jobs concurrently and stores downloaded quotes in DB. Every job is a dict with keys:
+    # 'source' - data source id, 'loader' - callable that returns DataFrame downloaded for (begin, end) parameters,
+    # 'ranges' - list of (begin, end) intervals to download, 'asset' and 'currency' - where to store the result,
+    # 'error' - warning message if download fails.
+    # Loaders are executed by a pool of threads and shouldn't access DB. Results are stored by the calling thread as
+    # soon as they arrive and downloaded ranges are recorded as quote coverage.
+    def _download(self, jobs: list) -> None:
+        if not jobs:
+            return
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS, thread_name_prefix="QuoteDownloader") as pool:
+            futures = {pool.submit(self._load, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                self._apply_asset_updates()
+                try:
+                    data, ranges = future.result()
+                except (xml_tree.ParseError, pd.errors.EmptyDataError, KeyError):
+                    logging.warning(job['error'])
+                    continue
+                self._store_quotations(job['asset'], job['currency'], data)
+                fetched = int(time.time())
+                for begin, end in ranges:
+                    job['asset'].add_quote_coverage(job['currency'], job['source'], begin,
+                                                    min(end, fetched - self.FINAL_DELAY), fetched)
+        self._apply_asset_updates()
 
     def download_currency_rates(self, start_timestamp, end_timestamp):
         data_loaders = {
@@ -108,20 +250,23 @@ class QuoteDownloader(QObject):
             "EUR": self.ECB_DataReader
         }
         self.PrepareRussianCBReader()
+        jobs = []
         for base in set([x[1] for x in JalAsset.get_base_currency_history(start_timestamp, end_timestamp)]):
             for currency in JalAsset.get_currencies():
                 if currency.id() == base or currency.quote_source(None) != MarketDataFeed.FX:
                     continue  # Skip as it is X/X ratio that is always 1
-                from_timestamp = self._adjust_start(currency, base, start_timestamp)
-                if end_timestamp < from_timestamp:
+                ranges = self._missing_ranges(currency, base, MarketDataFeed.FX, start_timestamp, end_timestamp)
+                if not ranges:
                     continue
+                error = self.tr("No rates were downloaded for ") + f"{currency.symbol()}/{JalAsset(base).symbol()}"
                 try:
-                    data = data_loaders[JalAsset(base).symbol()](currency, from_timestamp, end_timestamp)
-                except (xml_tree.ParseError, pd.errors.EmptyDataError, KeyError):
-                    logging.warning(self.tr("No rates were downloaded for ") +
-                                    f"{currency.symbol()}/{JalAsset(base).symbol()}")
+                    loader = data_loaders[JalAsset(base).symbol()]
+                except KeyError:
+                    logging.warning(error)
                     continue
-                self._store_quotations(currency, base, data)
+                jobs.append({'source': MarketDataFeed.FX, 'asset': currency, 'currency': base, 'error': error,
+                             'loader': partial(loader, currency), 'ranges': ranges})
+        self._download(jobs)
 
     def download_asset_prices(self, start_timestamp, end_timestamp, sources_list):
         data_loaders = {
@@ -134,22 +279,25 @@ class QuoteDownloader(QObject):
             MarketDataFeed.FRA: self.YahooFRA_Downloader,
             MarketDataFeed.SMA_VICTORIA: self.Victoria_Downloader
         }
+        jobs = []
         assets = JalAsset.get_active_assets(start_timestamp, end_timestamp)  # append assets list
         for asset_data in assets:
             asset = asset_data['asset']
             currency = asset_data['currency']
-            from_timestamp = self._adjust_start(asset, currency, start_timestamp)
-            if end_timestamp < from_timestamp:
+            data_source = asset.quote_source(currency)
+            if data_source not in sources_list:   # skip sources that are not requested
                 continue
-            try:
-                data_source = asset.quote_source(currency)
-                if data_source not in sources_list:   # skip sources that are not requested
-                    continue
-                data = data_loaders[data_source](asset, currency, from_timestamp, end_timestamp)
-            except (xml_tree.ParseError, pd.errors.EmptyDataError, KeyError):
-                logging.warning(self.tr("No quotes were downloaded for ") + f"{asset.symbol()}")
+            ranges = self._missing_ranges(asset, currency, data_source, start_timestamp, end_timestamp)
+            if not ranges:
                 continue
-            self._store_quotations(asset, currency, data)
+            error = self.tr("No quotes were downloaded for ") + f"{asset.symbol()}"
+            if data_source not in data_loaders:
+                logging.warning(error)
+                continue
+            self._currency_symbols[currency] = JalAsset(currency).symbol()
+            jobs.append({'source': data_source, 'asset': asset, 'currency': currency, 'error': error,
+                         'loader': partial(data_loaders[data_source], asset, currency), 'ranges': ranges})
+        self._download(jobs)
 
     def PrepareRussianCBReader(self):
         rows = []
@@ -350,7 +498,7 @@ class QuoteDownloader(QObject):
 
     # noinspection PyMethodMayBeStatic
     def MOEX_DataReader(self, asset, currency_id, start_timestamp, end_timestamp, update_symbol=True):
-        currency = JalAsset(currency_id).symbol()
+        currency = self._currency_symbol(currency_id)
         moex_info = self.MOEX_info(symbol=asset.symbol(currency_id), isin=asset.isin(), currency=currency, special=True)
         if not ('engine' in moex_info and 'market' in moex_info and 'board' in moex_info) or \
                 (moex_info['engine'] is None) or (moex_info['market'] is None) or (moex_info['board'] is None):
@@ -368,7 +516,7 @@ class QuoteDownloader(QObject):
             expiry = moex_info['expiry'] if 'expiry' in moex_info else 0
             principal = moex_info['principal'] if 'principal' in moex_info else 0
             details = {'isin': isin, 'reg_number': reg_number, 'expiry': expiry, 'principal': principal}
-            asset.update_data(details)
+            self._update_asset_data(asset, details)
 
         # Get price history
         date1 = datetime.utcfromtimestamp(start_timestamp).strftime('%Y-%m-%d')
@@ -394,7 +542,7 @@ class QuoteDownloader(QObject):
 
     # noinspection PyMethodMayBeStatic
     def Yahoo_Downloader(self, asset, currency_id, start_timestamp, end_timestamp, suffix=''):
-        url = f"https://query1.finance.yahoo.com/v7/finance/download/{asset.symbol(currency_id)+suffix}?" \
+        url = f"{self.YAHOO_URL}/v7/finance/download/{asset.symbol(currency_id)+suffix}?" \
               f"period1={start_timestamp}&period2={end_timestamp}&interval=1d&events=history"
         file = StringIO(get_web_data(url))
         try:
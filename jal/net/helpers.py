@@ -1,7 +1,10 @@
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ConnectTimeout, ConnectionError
 import logging
 import platform
+import threading
+from urllib.parse import urlsplit
 from PySide6.QtWidgets import QApplication
 from jal import __version__
 
@@ -26,23 +29,54 @@ def isEnglish(text):
         return True
 
 
+# ===================================================================================================================
+# Sessions are shared by all requests to the same host in order to keep connections alive. requests.Session may be
+# used by several threads at once if its state isn't modified, so headers are given per request
+POOL_SIZE = 8                   # Max number of kept-alive connections to one host
+_sessions = {}                  # {scheme://host: requests.Session}
+_sessions_lock = threading.Lock()
+
+
+# Returns pooled session for the host of given url
+def web_session(url) -> requests.Session:
+    parts = urlsplit(url)
+    host = f"{parts.scheme}://{parts.netloc}"
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[host] = session
+        return session
+
+
+# Closes all pooled sessions and their connections
+def close_web_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
 # ===================================================================================================================
 # Retrieve URL from web with given method and params
 def request_url(method, url, params=None, json_params=None, headers=None, binary=False):
-    session = requests.Session()
-    session.headers['User-Agent'] = make_user_agent(url=url)
+    session = web_session(url)
+    request_headers = {'User-Agent': make_user_agent(url=url)}
     if headers is not None:
-        session.headers.update(headers)
+        request_headers.update(headers)
     try:
         if method == "GET":
-            response = session.get(url)
+            response = session.get(url, headers=request_headers)
         elif method == "POST":
             if params:
-                response = session.post(url, data=params)
+                response = session.post(url, data=params, headers=request_headers)
             elif json_params:
-                response = session.post(url, json=json_params)
+                response = session.post(url, json=json_params, headers=request_headers)
             else:
-                response = session.post(url)
+                response = session.post(url, headers=request_headers)
         else:
             raise ValueError("Unknown download method for URL")
     except ConnectTimeout:
@@ -22,6 +22,7 @@ class CategoryOperationsModel(OperationsModel):
     def prepareData(self):
         self._data = []
         self._data = Ledger.get_operations_by_category(self._begin, self._end, self._category_id)
+        self._operations.clear()
         self.modelReset.emit()
 
 
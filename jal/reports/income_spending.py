@@ -352,22 +352,27 @@ class IncomeSpendingReportModel(QAbstractItemModel):
             assert False, "Wrong period for Income/Spending report"
         self._root = ReportTreeItem(self._begin, self._end, -1, "ROOT", periods=self._periodicity)  # invisible root
         self._root.appendChild(ReportTreeItem(self._begin, self._end, 0, self.tr("TOTAL"), periods=self._periodicity))  # visible root
-        self._load_child_amounts(root_category)
+        turnovers = JalCategory.get_turnovers(self._period_list, self._currency)
+        self._load_child_amounts(root_category, turnovers)
         self._root.removeEmptyChildren()
         self.modelReset.emit()
         self._view.expandAll()
 
-    def _load_child_amounts(self, parent_category: JalCategory):
+    # Builds report tree for children of parent_category and fills it with amounts from turnovers dict
+    # {(category_id, period_index): amount} given by JalCategory.get_turnovers(). Amounts are rolled up into parent
+    # categories by ReportTreeItem.addAmount()
+    def _load_child_amounts(self, parent_category: JalCategory, turnovers: dict):
         for category in parent_category.get_child_categories():
             leaf = self._root.getLeafById(category.id())
             if leaf is None:
                 parent = self._root.getLeafById(category.parent_id())
                 leaf = ReportTreeItem(self._begin, self._end, category.id(), category.name(), parent=parent)
                 parent.appendChild(leaf)
-            for period in self._period_list:
-                leaf.addAmount(period['year'], period['number'],
-                               category.get_turnover(period['begin_ts'], period['end_ts'], self._currency))
-            self._load_child_amounts(category)
+            for i, period in enumerate(self._period_list):
+                amount = turnovers.get((category.id(), i))
+                if amount is not None:
+                    leaf.addAmount(period['year'], period['number'], amount)
+            self._load_child_amounts(category, turnovers)
 
 
 # ----------------------------------------------------------------------------------------------------------------------
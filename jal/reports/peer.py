@@ -22,6 +22,7 @@ class PeerOperationsModel(OperationsModel):
     def prepareData(self):
         self._data = []
         self._data = Ledger.get_operations_by_peer(self._begin, self._end, self._peer_id)
+        self._operations.clear()
         self.modelReset.emit()
 
 
@@ -65,6 +65,7 @@ class TagOperationsModel(OperationsModel):
         self._data = []
         self._total = Decimal('0')
         self._data = Ledger.get_operations_by_tag(self._begin, self._end, self._tag_id)
+        self._operations.clear()
         operations = [LedgerTransaction().get_operation(x['op_type'], x['id'], x['subtype']) for x in self._data]
         # Take only Income/Spending data as we expect Asset operations to be not relevant for this kind of report
         operations = [x for x in operations if x.type() == LedgerTransaction.IncomeSpending]
@@ -0,0 +1,246 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Table: ledger_dirty to keep the earliest timestamp since which ledger of the account should be rebuilt
+DROP TABLE IF EXISTS ledger_dirty;
+CREATE TABLE ledger_dirty (
+    account_id INTEGER PRIMARY KEY NOT NULL UNIQUE REFERENCES accounts (id) ON DELETE CASCADE ON UPDATE CASCADE,
+    timestamp  INTEGER NOT NULL
+);
+--------------------------------------------------------------------------------
+-- View: invalidate_ledger (is used by triggers to invalidate ledger of one account, see invalidate_ledger_insert)
+DROP VIEW IF EXISTS invalidate_ledger;
+CREATE VIEW invalidate_ledger AS SELECT account_id, timestamp FROM ledger_dirty;
+--------------------------------------------------------------------------------
+-- Invalidation of ledger: deletes ledger records and open positions of given account starting from given timestamp
+-- and keeps the earliest invalidated timestamp for this account in 'ledger_dirty' table
+DROP TRIGGER IF EXISTS invalidate_ledger_insert;
+CREATE TRIGGER invalidate_ledger_insert
+    INSTEAD OF INSERT ON invalidate_ledger FOR EACH ROW WHEN NEW.account_id IS NOT NULL
+BEGIN
+    DELETE FROM ledger WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+    DELETE FROM trades_opened WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+    INSERT OR REPLACE INTO ledger_dirty(account_id, timestamp)
+    SELECT NEW.account_id, MIN(NEW.timestamp, coalesce(MIN(timestamp), NEW.timestamp))
+    FROM ledger_dirty WHERE account_id = NEW.account_id;
+END;
+
+-- Trigger: action_details_after_delete
+DROP TRIGGER IF EXISTS action_details_after_delete;
+CREATE TRIGGER action_details_after_delete
+      AFTER DELETE ON action_details
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) SELECT account_id, timestamp FROM actions WHERE id = OLD.pid;
+END;
+
+-- Trigger: action_details_after_insert
+DROP TRIGGER IF EXISTS action_details_after_insert;
+CREATE TRIGGER action_details_after_insert
+      AFTER INSERT ON action_details
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) SELECT account_id, timestamp FROM actions WHERE id = NEW.pid;
+END;
+
+-- Trigger: action_details_after_update
+DROP TRIGGER IF EXISTS action_details_after_update;
+CREATE TRIGGER action_details_after_update
+      AFTER UPDATE ON action_details
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) SELECT account_id, timestamp FROM actions WHERE id = OLD.pid;
+END;
+
+-- Trigger: actions_after_delete
+DROP TRIGGER IF EXISTS actions_after_delete;
+CREATE TRIGGER actions_after_delete
+      AFTER DELETE ON actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM action_details WHERE pid = OLD.id;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
+END;
+
+-- Trigger: actions_after_insert
+DROP TRIGGER IF EXISTS actions_after_insert;
+CREATE TRIGGER actions_after_insert
+      AFTER INSERT ON actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
+END;
+
+-- Trigger: actions_after_update
+DROP TRIGGER IF EXISTS actions_after_update;
+CREATE TRIGGER actions_after_update
+      AFTER UPDATE OF timestamp, account_id, peer_id ON actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
+END;
+
+-- Trigger: dividends_after_delete
+DROP TRIGGER IF EXISTS dividends_after_delete;
+CREATE TRIGGER dividends_after_delete
+      AFTER DELETE ON dividends
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
+END;
+
+-- Trigger: dividends_after_insert
+DROP TRIGGER IF EXISTS dividends_after_insert;
+CREATE TRIGGER dividends_after_insert
+      AFTER INSERT ON dividends
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
+END;
+
+-- Trigger: dividends_after_update
+DROP TRIGGER IF EXISTS dividends_after_update;
+CREATE TRIGGER dividends_after_update
+      AFTER UPDATE OF timestamp, account_id, asset_id, amount, tax ON dividends
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
+END;
+
+DROP TRIGGER IF EXISTS trades_after_delete;
+CREATE TRIGGER trades_after_delete
+      AFTER DELETE ON trades
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
+END;
+
+DROP TRIGGER IF EXISTS trades_after_insert;
+CREATE TRIGGER trades_after_insert
+      AFTER INSERT ON trades
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
+END;
+
+DROP TRIGGER IF EXISTS trades_after_update;
+CREATE TRIGGER trades_after_update
+      AFTER UPDATE OF timestamp, account_id, asset_id, qty, price, fee ON trades
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
+END;
+
+DROP TRIGGER IF EXISTS asset_action_after_delete;
+CREATE TRIGGER asset_action_after_delete
+      AFTER DELETE ON asset_actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
+END;
+
+DROP TRIGGER IF EXISTS asset_action_after_insert;
+CREATE TRIGGER asset_action_after_insert
+      AFTER INSERT ON asset_actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
+END;
+
+DROP TRIGGER IF EXISTS asset_action_after_update;
+CREATE TRIGGER asset_action_after_update
+      AFTER UPDATE OF timestamp, account_id, type, asset_id, qty ON asset_actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.account_id, OLD.timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.account_id, NEW.timestamp);
+END;
+
+DROP TRIGGER IF EXISTS asset_result_after_delete;
+CREATE TRIGGER asset_result_after_delete
+      AFTER DELETE ON action_results
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) SELECT account_id, timestamp FROM asset_actions WHERE id = OLD.action_id;
+END;
+
+DROP TRIGGER IF EXISTS asset_result_after_insert;
+CREATE TRIGGER asset_result_after_insert
+      AFTER INSERT ON action_results
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) SELECT account_id, timestamp FROM asset_actions WHERE id = NEW.action_id;
+END;
+
+DROP TRIGGER IF EXISTS asset_result_after_update;
+CREATE TRIGGER asset_result_after_update
+      AFTER UPDATE OF asset_id, qty, value_share ON action_results
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) SELECT account_id, timestamp FROM asset_actions WHERE id = OLD.action_id;
+END;
+
+DROP TRIGGER IF EXISTS transfers_after_delete;
+CREATE TRIGGER transfers_after_delete
+      AFTER DELETE ON transfers
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.withdrawal_account, OLD.withdrawal_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.deposit_account, OLD.deposit_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.fee_account, OLD.withdrawal_timestamp);
+END;
+
+DROP TRIGGER IF EXISTS transfers_after_insert;
+CREATE TRIGGER transfers_after_insert
+      AFTER INSERT ON transfers
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.withdrawal_account, NEW.withdrawal_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.deposit_account, NEW.deposit_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.fee_account, NEW.withdrawal_timestamp);
+END;
+
+DROP TRIGGER IF EXISTS transfers_after_update;
+CREATE TRIGGER transfers_after_update
+      AFTER UPDATE OF withdrawal_timestamp, deposit_timestamp, withdrawal_account, deposit_account, fee_account,
+                      withdrawal, deposit, fee, asset ON transfers
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.withdrawal_account, OLD.withdrawal_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.deposit_account, OLD.deposit_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (OLD.fee_account, OLD.withdrawal_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.withdrawal_account, NEW.withdrawal_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.deposit_account, NEW.deposit_timestamp);
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.fee_account, NEW.withdrawal_timestamp);
+END;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=50 WHERE name='SchemaVersion';
+COMMIT;
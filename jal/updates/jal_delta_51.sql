@@ -0,0 +1,41 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Table: ledger_snapshots to keep accumulated amounts and values of ledger for every account, book and asset
+-- at the end of periods (see 'LedgerSnapshotPeriod' setting)
+DROP TABLE IF EXISTS ledger_snapshots;
+CREATE TABLE ledger_snapshots (
+    id           INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    timestamp    INTEGER NOT NULL,
+    account_id   INTEGER NOT NULL REFERENCES accounts (id) ON DELETE CASCADE ON UPDATE CASCADE,
+    book_account INTEGER NOT NULL,
+    asset_id     INTEGER NOT NULL,
+    amount_acc   TEXT    NOT NULL,
+    value_acc    TEXT    NOT NULL
+);
+DROP INDEX IF EXISTS ledger_snapshots_by_account;
+CREATE UNIQUE INDEX ledger_snapshots_by_account ON ledger_snapshots (account_id, timestamp, book_account, asset_id);
+--------------------------------------------------------------------------------
+-- Invalidation of ledger: deletes ledger records, snapshots and open positions of given account starting from given
+-- timestamp and keeps the earliest invalidated timestamp for this account in 'ledger_dirty' table
+DROP TRIGGER IF EXISTS invalidate_ledger_insert;
+CREATE TRIGGER invalidate_ledger_insert
+    INSTEAD OF INSERT ON invalidate_ledger FOR EACH ROW WHEN NEW.account_id IS NOT NULL
+BEGIN
+    DELETE FROM ledger WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+    DELETE FROM trades_opened WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+    DELETE FROM ledger_snapshots WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+    INSERT OR REPLACE INTO ledger_dirty(account_id, timestamp)
+    SELECT NEW.account_id, MIN(NEW.timestamp, coalesce(MIN(timestamp), NEW.timestamp))
+    FROM ledger_dirty WHERE account_id = NEW.account_id;
+END;
+--------------------------------------------------------------------------------
+INSERT OR REPLACE INTO settings(id, name, value) VALUES (20, 'LedgerSnapshotPeriod', 1);
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=51 WHERE name='SchemaVersion';
+INSERT OR REPLACE INTO settings(id, name, value) VALUES (7, 'RebuildDB', 1);
+COMMIT;
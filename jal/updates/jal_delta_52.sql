@@ -0,0 +1,21 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Covering indexes for frequent ledger queries
+DROP INDEX IF EXISTS ledger_by_account_book_asset;
+CREATE INDEX ledger_by_account_book_asset ON ledger (account_id, book_account, asset_id, timestamp);
+DROP INDEX IF EXISTS ledger_by_book_asset;
+CREATE INDEX ledger_by_book_asset ON ledger (book_account, asset_id, account_id, timestamp, amount_acc);
+DROP INDEX IF EXISTS ledger_by_category;
+CREATE INDEX ledger_by_category ON ledger (category_id, timestamp, book_account, account_id, amount);
+DROP INDEX IF EXISTS ledger_by_peer;
+CREATE INDEX ledger_by_peer ON ledger (peer_id, timestamp, op_type, operation_id, account_id);
+DROP INDEX IF EXISTS ledger_by_tag;
+CREATE INDEX ledger_by_tag ON ledger (tag_id, timestamp, op_type, operation_id, account_id);
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=52 WHERE name='SchemaVersion';
+COMMIT;
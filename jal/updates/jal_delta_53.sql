@@ -0,0 +1,86 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Columns amount, value, amount_acc and value_acc have no type affinity in 'ledger', 'ledger_totals' and
+-- 'ledger_snapshots' tables as they keep either TEXT decimals or INTEGER fixed-point values (see 'LedgerFixedPoint')
+CREATE TABLE temp_ledger AS SELECT * FROM ledger;
+DROP TABLE ledger;
+CREATE TABLE ledger (
+    id           INTEGER PRIMARY KEY NOT NULL UNIQUE,
+    timestamp    INTEGER NOT NULL,
+    op_type      INTEGER NOT NULL,
+    operation_id INTEGER NOT NULL,
+    book_account INTEGER NOT NULL,
+    asset_id     INTEGER REFERENCES assets (id) ON DELETE SET NULL ON UPDATE SET NULL,
+    account_id   INTEGER NOT NULL REFERENCES accounts (id) ON DELETE NO ACTION ON UPDATE NO ACTION,
+    amount,
+    value,
+    amount_acc,
+    value_acc,
+    peer_id      INTEGER REFERENCES agents (id) ON DELETE NO ACTION ON UPDATE NO ACTION,
+    category_id  INTEGER REFERENCES categories (id) ON DELETE NO ACTION ON UPDATE NO ACTION,
+    tag_id       INTEGER REFERENCES tags (id) ON DELETE NO ACTION ON UPDATE NO ACTION
+);
+DROP INDEX IF EXISTS ledger_by_account_book_asset;
+CREATE INDEX ledger_by_account_book_asset ON ledger (account_id, book_account, asset_id, timestamp);
+DROP INDEX IF EXISTS ledger_by_book_asset;
+CREATE INDEX ledger_by_book_asset ON ledger (book_account, asset_id, account_id, timestamp, amount_acc);
+DROP INDEX IF EXISTS ledger_by_category;
+CREATE INDEX ledger_by_category ON ledger (category_id, timestamp, book_account, account_id, amount);
+DROP INDEX IF EXISTS ledger_by_peer;
+CREATE INDEX ledger_by_peer ON ledger (peer_id, timestamp, op_type, operation_id, account_id);
+DROP INDEX IF EXISTS ledger_by_tag;
+CREATE INDEX ledger_by_tag ON ledger (tag_id, timestamp, op_type, operation_id, account_id);
+INSERT INTO ledger (id, timestamp, op_type, operation_id, book_account, asset_id, account_id,
+                    amount, value, amount_acc, value_acc, peer_id, category_id, tag_id)
+SELECT id, timestamp, op_type, operation_id, book_account, asset_id, account_id,
+       amount, value, amount_acc, value_acc, peer_id, category_id, tag_id FROM temp_ledger;
+DROP TABLE temp_ledger;
+--------------------------------------------------------------------------------
+CREATE TABLE temp_ledger_totals AS SELECT * FROM ledger_totals;
+DROP TABLE ledger_totals;
+CREATE TABLE ledger_totals (
+    id           INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    op_type      INTEGER NOT NULL,
+    operation_id INTEGER NOT NULL,
+    timestamp    INTEGER NOT NULL,
+    book_account INTEGER NOT NULL,
+    asset_id     INTEGER NOT NULL,
+    account_id   INTEGER NOT NULL,
+    amount_acc   NOT NULL,
+    value_acc    NOT NULL
+);
+DROP INDEX IF EXISTS ledger_totals_by_timestamp;
+CREATE INDEX ledger_totals_by_timestamp ON ledger_totals (timestamp);
+DROP INDEX IF EXISTS ledger_totals_by_operation_book;
+CREATE INDEX ledger_totals_by_operation_book ON ledger_totals (op_type, operation_id, book_account);
+INSERT INTO ledger_totals (id, op_type, operation_id, timestamp, book_account, asset_id, account_id, amount_acc, value_acc)
+SELECT id, op_type, operation_id, timestamp, book_account, asset_id, account_id, amount_acc, value_acc
+FROM temp_ledger_totals;
+DROP TABLE temp_ledger_totals;
+--------------------------------------------------------------------------------
+CREATE TABLE temp_ledger_snapshots AS SELECT * FROM ledger_snapshots;
+DROP TABLE ledger_snapshots;
+CREATE TABLE ledger_snapshots (
+    id           INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    timestamp    INTEGER NOT NULL,
+    account_id   INTEGER NOT NULL REFERENCES accounts (id) ON DELETE CASCADE ON UPDATE CASCADE,
+    book_account INTEGER NOT NULL,
+    asset_id     INTEGER NOT NULL,
+    amount_acc   NOT NULL,
+    value_acc    NOT NULL
+);
+DROP INDEX IF EXISTS ledger_snapshots_by_account;
+CREATE UNIQUE INDEX ledger_snapshots_by_account ON ledger_snapshots (account_id, timestamp, book_account, asset_id);
+INSERT INTO ledger_snapshots (id, timestamp, account_id, book_account, asset_id, amount_acc, value_acc)
+SELECT id, timestamp, account_id, book_account, asset_id, amount_acc, value_acc FROM temp_ledger_snapshots;
+DROP TABLE temp_ledger_snapshots;
+--------------------------------------------------------------------------------
+INSERT OR REPLACE INTO settings(id, name, value) VALUES (21, 'LedgerFixedPoint', 0);
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=53 WHERE name='SchemaVersion';
+COMMIT;
@@ -0,0 +1,33 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Time intervals [begin_ts, end_ts] that were successfully downloaded from data source 'source_id' for
+-- (asset_id, currency_id) pair. 'fetched' is a timestamp of the last successful download within the interval
+DROP TABLE IF EXISTS quote_coverage;
+CREATE TABLE quote_coverage (
+    id          INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    asset_id    INTEGER REFERENCES assets (id) ON DELETE CASCADE ON UPDATE CASCADE NOT NULL,
+    currency_id INTEGER REFERENCES assets (id) ON DELETE CASCADE ON UPDATE CASCADE NOT NULL,
+    source_id   INTEGER NOT NULL,
+    begin_ts    INTEGER NOT NULL,
+    end_ts      INTEGER NOT NULL,
+    fetched     INTEGER NOT NULL
+);
+CREATE INDEX quote_coverage_by_asset ON quote_coverage (asset_id, currency_id, source_id, begin_ts);
+--------------------------------------------------------------------------------
+-- Removal of a quote makes coverage interval that contains it incomplete
+DROP TRIGGER IF EXISTS quote_coverage_on_delete;
+CREATE TRIGGER quote_coverage_on_delete
+    AFTER DELETE ON quotes
+    FOR EACH ROW
+BEGIN
+    DELETE FROM quote_coverage
+    WHERE asset_id=OLD.asset_id AND currency_id=OLD.currency_id AND begin_ts<=OLD.timestamp AND end_ts>=OLD.timestamp;
+END;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=54 WHERE name='SchemaVersion';
+COMMIT;
@@ -0,0 +1,20 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Trigger: accounts_precision_after_update - fixed-point ledger amounts of the account are scaled by its precision
+DROP TRIGGER IF EXISTS accounts_precision_after_update;
+CREATE TRIGGER accounts_precision_after_update
+      AFTER UPDATE OF precision ON accounts
+      FOR EACH ROW
+      WHEN NEW.precision != OLD.precision AND (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger_totals WHERE account_id = NEW.id;
+    INSERT INTO invalidate_ledger(account_id, timestamp) VALUES (NEW.id, 0);
+END;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=55 WHERE name='SchemaVersion';
+COMMIT;
@@ -2,13 +2,14 @@ import os
 import logging
 from jal.constants import CustomColor
 from jal.db.helpers import load_icon
-from PySide6.QtCore import Qt, Slot
+from PySide6.QtCore import Qt, Slot, Signal
 from PySide6.QtWidgets import QApplication, QPlainTextEdit, QLabel, QPushButton
 from PySide6.QtGui import QBrush
 
 
 # Adapter class to have custom log handler that may be passed to logger.addHandler/logger.removeHandler methods and
-# then forward all messages parent view to display them
+# then forward all messages parent view to display them.
+# Messages are forwarded via signal so records logged by background threads are displayed by GUI thread
 class LogHandler(logging.Handler):
     def __init__(self, parent_view):
         self._parent_view = parent_view
@@ -16,16 +17,19 @@ class LogHandler(logging.Handler):
 
     def emit(self, record, **kwargs):
         message = self.format(record)
-        self._parent_view.displayMessage(record.levelno, message)
+        self._parent_view.message_logged.emit(record.levelno, message)
 
 
 # A GUI class to display messages from python logging unit in a normal multi-line text area
 class LogViewer(QPlainTextEdit):
+    message_logged = Signal(int, str)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.app = QApplication.instance()
         self._logger = None     # Here an instance of current logger will be stored
         self._log_handler = LogHandler(self)
+        self.message_logged.connect(self.displayMessage)
         self.setReadOnly(True)
         self.status_bar = None    # Status bar where notifications and control are located
         self.expandButton = None  # Button that shows/hides log window
@@ -129,7 +129,7 @@ class MainWindow(QMainWindow):
         if JalSettings().getValue('RebuildDB', 0) == 1:
             if QMessageBox().warning(self, self.tr("Confirmation"), self.tr("Database data may be inconsistent after recent update. Rebuild it now?"),
                                      QMessageBox.Yes, QMessageBox.No) == QMessageBox.Yes:
-                self.ledger.rebuild(from_timestamp=0)
+                self.ledger.rebuild(from_timestamp=0, workers=0)
 
     @Slot()
     def closeEvent(self, event):
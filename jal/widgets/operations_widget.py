@@ -110,6 +110,7 @@ class OperationsWidget(MdiWidget):
 
     @Slot()
     def update_operations_filter(self):
+        self.operations_model.setSearchActive(bool(self.ui.SearchString.text()))
         self.ui.OperationsTableView.model().setFilterFixedString(self.ui.SearchString.text())
         self.ui.OperationsTableView.model().setFilterKeyColumn(-1)
 
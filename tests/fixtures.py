@@ -30,6 +30,7 @@ def prepare_db(project_root, tmp_path, data_path):
     copyfile(src_path, target_path)
 
     # Activate db connection
+    JalDB.set_strict_mode(True)
     error = JalDB().init_db(str(tmp_path) + os.sep)
     assert error.code == JalDBError.NoError
     db = QSqlDatabase.database(Setup.DB_CONNECTION)
@@ -39,6 +40,7 @@ def prepare_db(project_root, tmp_path, data_path):
 
     yield
 
+    JalDB.clear_statement_cache()
     db.close()
     os.remove(target_path)  # Clean db init script
     os.remove(get_dbfilename(str(tmp_path) + os.sep))  # Clean db file
@@ -1,5 +1,6 @@
 from decimal import Decimal
 from datetime import datetime, timezone
+from jal.db.db import JalDB
 from jal.db.asset import JalAsset
 from jal.db.operations import LedgerTransaction, Dividend
 from constants import PredefinedAsset
@@ -147,3 +148,19 @@ def create_transfers(transfers):
                 'deposit_timestamp': transfer[0],'deposit_account': transfer[3], 'deposit': transfer[4],
                 'asset': transfer[5]}
         LedgerTransaction.create_new(LedgerTransaction.Transfer, data)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Returns content of tables that are filled by ledger rebuild as a dict {table_name: [list of records]}
+# If with_id is False then 'id' field is omitted and records are sorted by their content
+def dump_ledger_tables(with_id=True) -> dict:
+    tables = {}
+    for table in ["ledger", "ledger_totals", "trades_opened", "trades_closed"]:
+        tables[table] = []
+        query = JalDB._exec(f"SELECT * FROM {table} ORDER BY id")
+        while query.next():
+            record = JalDB._read_record(query)
+            tables[table].append(record if with_id else record[1:])
+        if not with_id:
+            tables[table].sort(key=lambda x: [str(v) for v in x])
+    return tables
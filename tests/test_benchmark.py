@@ -0,0 +1,39 @@
+import json
+from tests.fixtures import project_root, data_path, prepare_db
+from benchmarks.synthetic_data import SyntheticLedger
+from jal.db.db import JalDB
+from jal.db.ledger import Ledger
+from jal.db.account import JalAccount
+from jal.data_import.statement import Statement
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_synthetic_data(tmp_path, prepare_db):
+    data = SyntheticLedger(seed=1, accounts=2, assets=3, years=1, trades_per_month=2)
+    counts = data.populate()
+    assert counts['accounts'] == 3
+    assert counts['assets'] == 3
+    assert counts['trades'] == 2 * 2 * 12
+    assert counts['quotes'] == 4 * 366   # 2020 is a leap year
+    assert counts['transfers'] > 0
+    assert counts['income_spending'] == 2 + 5 * 12
+    assert JalDB._read("SELECT COUNT(*) FROM trades") == counts['trades']
+    assert JalDB._read("SELECT COUNT(*) FROM dividends") == counts['dividends']
+    assert JalDB._read("SELECT COUNT(*) FROM asset_actions") == counts['corporate_actions']
+
+    # Operations may be replayed into ledger from scratch and give the same positions as generated
+    Ledger().rebuild(from_timestamp=0)
+    for account_id in data.accounts:
+        account = JalAccount(account_id)
+        for asset_id in data.assets:
+            assert account.get_asset_amount(data.end(), asset_id) == data._holdings.get((account_id, asset_id), 0)
+
+    statement_file = str(tmp_path / "statement.json")
+    with open(statement_file, 'w', encoding='utf-8') as f:
+        json.dump(data.statement(10), f)
+    statement = Statement()
+    statement.load(statement_file)
+    statement.validate_format()
+    statement.match_db_ids()
+    statement.import_into_db()
+    assert JalDB._read("SELECT COUNT(*) FROM trades") == counts['trades'] + 10
@@ -1,13 +1,19 @@
+import threading
+import time
+import pytest
 import pandas as pd
 from datetime import datetime
 from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
 from pandas._testing import assert_frame_equal
 
-from tests.fixtures import project_root, data_path, prepare_db, prepare_db_moex
-from tests.helpers import d2t, create_stocks, create_assets
+from tests.fixtures import project_root, data_path, prepare_db, prepare_db_moex, prepare_db_fifo
+from tests.helpers import d2t, create_stocks, create_assets, create_trades
 from jal.db.asset import JalAsset
-from jal.constants import PredefinedAsset
-from jal.net.helpers import isEnglish
+from jal.db.ledger import Ledger
+from jal.constants import PredefinedAsset, MarketDataFeed
+from jal.net.helpers import isEnglish, close_web_sessions
 from jal.net.downloader import QuoteDownloader
 from jal.data_import.receipt_api.ru_fns import ReceiptRuFNS
 
@@ -247,3 +253,113 @@ def test_Frankfurt_downloader(prepare_db):
     downloader = QuoteDownloader()
     quotes_downloaded = downloader.YahooFRA_Downloader(JalAsset(4), 3, d2t(210413), d2t(210415))
     assert_frame_equal(quotes, quotes_downloaded)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Local stand-in for Yahoo quotes server. It replies with 2 daily quotes for every symbol after a short delay and
+# counts requests, simultaneous requests and client connections
+class YahooStandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"    # Keep connections alive
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.paths.append(self.path)
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        time.sleep(0.05)
+        symbol = urlsplit(self.path).path.split('/')[-1]
+        price = Decimal(len(symbol))
+        body = "Date,Open,High,Low,Close,Adj Close,Volume\n" \
+               f"2021-04-13,1,1,1,{price},1,100\n2021-04-14,1,1,1,{price + 1},1,100\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+        with self.server.lock:
+            self.server.active -= 1
+            self.server.requests += 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def yahoo_stand_in(prepare_db_fifo, monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), YahooStandInHandler)
+    server.lock = threading.Lock()
+    server.connections = server.active = server.max_active = server.requests = 0
+    server.paths = []
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    monkeypatch.setattr(QuoteDownloader, "YAHOO_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setitem(QuoteDownloader.SOURCE_LIMITS, MarketDataFeed.US, (3, 0.01))
+    yield server
+    close_web_sessions()
+    server.shutdown()
+    server.server_close()
+
+
+# Creates stocks with given symbols and quote source US and makes them active by a trade. Asset ids start from 4
+def create_quoted_stocks(symbols):
+    for i, symbol in enumerate(symbols):
+        asset = JalAsset(data={'type': PredefinedAsset.Stock, 'name': symbol}, create=True)
+        asset.add_symbol(symbol, 2, '', data_source=MarketDataFeed.US)
+        create_trades(1, [(d2t(210105) + i, d2t(210107), asset.id(), 1.0, 10.0, 0.0)])
+    Ledger().rebuild(from_timestamp=0)
+
+
+def test_concurrent_download(yahoo_stand_in):
+    symbols = ['A', 'BB', 'CCC', 'DDDD', 'EEEEE', 'FFFFFF']
+    create_quoted_stocks(symbols)
+    downloader = QuoteDownloader()
+    downloader.download_asset_prices(d2t(210413), d2t(210415), [MarketDataFeed.US])
+    assert yahoo_stand_in.requests == len(symbols)
+    assert 1 < yahoo_stand_in.max_active <= 3         # requests were concurrent within source limit
+    assert yahoo_stand_in.connections <= 3            # connections were re-used by pooled session
+    for i, symbol in enumerate(symbols):
+        assert JalAsset(4 + i).quotes(d2t(210413), d2t(210414), 2) == [(d2t(210413), Decimal(len(symbol))),
+                                                                      (d2t(210414), Decimal(len(symbol) + 1))]
+
+
+def test_quote_coverage(yahoo_stand_in, monkeypatch):
+    create_quoted_stocks(['A', 'BB'])
+    downloader = QuoteDownloader()
+    downloader.download_asset_prices(d2t(210413), d2t(210415), [MarketDataFeed.US])
+    assert yahoo_stand_in.requests == 2
+    assert [x[:2] for x in JalAsset(4).quote_coverage(2, MarketDataFeed.US)] == [(d2t(210413), d2t(210415))]
+    # Covered interval isn't downloaded again
+    downloader.download_asset_prices(d2t(210413), d2t(210415), [MarketDataFeed.US])
+    assert yahoo_stand_in.requests == 2
+    # Only missing ranges are requested, close gaps are joined into one request
+    downloader.download_asset_prices(d2t(210301), d2t(210430), [MarketDataFeed.US])
+    assert yahoo_stand_in.requests == 4
+    assert f"period1={d2t(210301)}&period2={d2t(210430)}&" in yahoo_stand_in.paths[-1]
+    downloader.download_asset_prices(d2t(210101), d2t(210430), [MarketDataFeed.US])
+    assert yahoo_stand_in.requests == 6
+    assert f"period1={d2t(210101)}&period2={d2t(210301) - 1}&" in yahoo_stand_in.paths[-1]
+    assert [x[:2] for x in JalAsset(4).quote_coverage(2, MarketDataFeed.US)] == [(d2t(210101), d2t(210430))]
+    JalAsset(5).add_quote_coverage(2, MarketDataFeed.US, d2t(210601), d2t(210715), 0)
+    assert downloader._missing_ranges(JalAsset(5), 2, MarketDataFeed.US, d2t(210301), d2t(210801)) == \
+           [(d2t(210430) + 1, d2t(210601) - 1), (d2t(210715) + 1, d2t(210801))]
+    assert downloader._missing_ranges(JalAsset(5), 2, MarketDataFeed.US, d2t(210301), d2t(210701)) == \
+           [(d2t(210430) + 1, d2t(210601) - 1)]
+    downloader.GAP_MERGE = 60 * 86400
+    assert downloader._missing_ranges(JalAsset(5), 2, MarketDataFeed.US, d2t(210301), d2t(210801)) == \
+           [(d2t(210430) + 1, d2t(210801))]
+    # Removal of a quote drops coverage of the interval that contained it
+    _ = JalAsset(4)._exec("DELETE FROM quotes WHERE asset_id=4 AND timestamp=:timestamp", [(":timestamp", d2t(210414))])
+    assert JalAsset(4).quote_coverage(2, MarketDataFeed.US) == []
+    assert len(JalAsset(5).quote_coverage(2, MarketDataFeed.US)) == 2
+    # Coverage is recorded up to FINAL_DELAY before download, so it is current if it reaches the day before the end
+    today = int(time.time()) // 86400 * 86400
+    JalAsset(5).add_quote_coverage(2, MarketDataFeed.US, d2t(210801), today - 86400 + 3600, today + 3600)
+    assert downloader._missing_ranges(JalAsset(5), 2, MarketDataFeed.US, d2t(210801), today + 43200) == []
+    monkeypatch.setattr(time, "time", lambda: today + 86400 + 3600)   # the last day is downloaded again next day
+    assert downloader._missing_ranges(JalAsset(5), 2, MarketDataFeed.US, d2t(210801), today + 86400 + 43200) == \
+           [(today - 86400 + 3601, today + 86400 + 43200)]
@@ -3,6 +3,7 @@ from decimal import Decimal
 
 from tests.fixtures import project_root, data_path, prepare_db, prepare_db_taxes
 from data_import.broker_statements.ibkr import StatementIBKR
+from jal.data_import.statements import Statements
 from tests.helpers import d2t
 from jal.db.ledger import Ledger, LedgerAmounts
 from jal.db.account import JalAccount
@@ -181,6 +182,25 @@ def test_statement_ibkr(tmp_path, project_root, data_path, prepare_db_taxes):
     assert total_value[(BookAccount.Assets, 1, 7)] == Decimal('0')
 
 
+# ----------------------------------------------------------------------------------------------------------------------
+def test_ibkr_parallel_load(tmp_path, project_root, data_path, prepare_db_taxes):
+    completed = []
+    statements = Statements(None)
+    statements.load_completed.connect(lambda timestamp, totals: completed.append(timestamp))
+    statements.import_files(StatementIBKR.__module__, 'StatementIBKR',
+                            [data_path + 'ibkr_year0.xml', data_path + 'ibkr_year1.xml'], workers=2)
+    assert len(completed) == 1
+
+    # Tax correction of the second file should be matched with dividend imported from the first file
+    test_dividends = [
+        [1, 2, 1592770800, 0, '', 1, 1, 6, '16.76', '0.21', 'XOM (US30231G1022) CASH DIVIDEND USD 0.8381 (Ordinary Dividend)'],
+        [2, 2, 1596054000, 0, '', 1, 1, 9, '51.0', '0.01', 'TWO(US90187B4086) PAYMENT IN LIEU OF DIVIDEND (Ordinary Dividend)'],
+        [3, 2, 1588191600, 0, '', 1, 1, 10, '25.0', '1.04', 'NRZ(US64828T2015) CASH DIVIDEND USD 0.25 PER SHARE (Ordinary Dividend)']
+    ]
+    assert JalAccount(1).dump_dividends() == test_dividends
+    assert len(JalAccount(1).dump_trades()) == 10
+
+
 # ----------------------------------------------------------------------------------------------------------------------
 def test_ibkr_warrants(tmp_path, project_root, data_path, prepare_db_taxes):
     with open(data_path + 'ibkr_warrants.json', 'r', encoding='utf-8') as json_file:
@@ -1,10 +1,12 @@
 import json
+import pytest
 from decimal import Decimal
 from tests.fixtures import project_root, data_path, prepare_db, prepare_db_ibkr, prepare_db_moex
 
-from jal.data_import.statement import Statement
+from jal.data_import.statement import Statement, Statement_ImportError, FOF
 from tests.helpers import d2t
 from jal.constants import PredefinedAsset
+from jal.db.db import JalDB
 from jal.db.account import JalAccount
 from jal.db.asset import JalAsset, AssetData
 from jal.db.peer import JalPeer
@@ -327,3 +329,46 @@ def test_ukfu_json_import(tmp_path, project_root, data_path, prepare_db_moex):
     assets = JalAsset.get_assets()
     assert len(assets) == len(test_assets)
     assert [x.dump() for x in assets] == test_assets
+
+
+def test_json_reimport(tmp_path, project_root, data_path, prepare_db_ibkr):
+    tables = ['trades', 'dividends', 'transfers', 'asset_actions']
+    counts = []
+    for i in range(2):
+        statement = Statement()
+        statement.load(data_path + 'ibkr.json')
+        statement.validate_format()
+        statement.match_db_ids()
+        if i:
+            statement._data.pop(FOF.PERIOD)   # Skip confirmation of import before the last operation
+        statement.import_into_db()
+        counts.append([JalDB._read(f"SELECT COUNT(*) FROM {table}") for table in tables])
+    assert counts[0] == counts[1]   # Operations are skipped as they are present in database already
+    assert JalDB._read("SELECT value FROM settings WHERE name='TriggersEnabled'") == 1
+
+    # Ledger should be invalidated since the first operation of every account
+    dirty, expected = [], []
+    query = JalDB._exec("SELECT account_id, timestamp FROM ledger_dirty ORDER BY account_id")
+    while query.next():
+        dirty.append(JalDB._read_record(query))
+    query = JalDB._exec("SELECT account_id, MIN(timestamp) FROM operation_sequence "
+                        "WHERE account_id IS NOT NULL GROUP BY account_id ORDER BY account_id")
+    while query.next():
+        expected.append(JalDB._read_record(query))
+    assert dirty == expected
+
+
+def test_json_import_quotes_failure(tmp_path, project_root, data_path, prepare_db_ibkr):
+    _ = JalDB._exec("CREATE TRIGGER quotes_failure BEFORE INSERT ON quotes BEGIN SELECT RAISE(ABORT, 'failure'); END",
+                    commit=True)
+    statement = Statement()
+    statement.load(data_path + 'ibkr.json')
+    statement.validate_format()
+    statement.match_db_ids()
+    with pytest.raises(Statement_ImportError):
+        statement.import_into_db()   # Quotes of stock dividends can't be stored
+    # Import is rolled back completely
+    assert not JalDB._transaction
+    assert JalDB._read("SELECT COUNT(*) FROM trades") == 0
+    assert JalDB._read("SELECT COUNT(*) FROM dividends") == 2   # Created by fixture
+    assert JalDB._read("SELECT value FROM settings WHERE name='TriggersEnabled'") == 1
@@ -1,14 +1,23 @@
+import pytest
 from decimal import Decimal
+from PySide6.QtCore import QSortFilterProxyModel
+from PySide6.QtWidgets import QApplication, QTableView
 
 from tests.fixtures import project_root, data_path, prepare_db, prepare_db_fifo, prepare_db_ledger
 from tests.helpers import d2t, create_stocks, create_actions, create_trades, create_quotes, \
-    create_corporate_actions, create_stock_dividends, create_transfers
-from constants import BookAccount, PredefinedAccountType
+    create_corporate_actions, create_stock_dividends, create_transfers, dump_ledger_tables
+from constants import BookAccount, PredefinedAccountType, PredefinedAsset, PredefinedCategory
 from jal.db.ledger import Ledger, LedgerAmounts
 from jal.db.account import JalAccount
 from jal.db.asset import JalAsset
 from jal.db.peer import JalPeer
-from jal.db.operations import LedgerTransaction, Dividend
+from jal.db.category import JalCategory
+from jal.db.settings import JalSettings
+from jal.db.db import JalDB
+from jal.db.operations import LedgerTransaction, LedgerError, Dividend, Trade, CorporateAction, OperationsLoader
+from jal.db.closed_trade import JalClosedTrade
+from jal.db.operations_model import OperationsModel
+from jal.widgets.helpers import ts2dt, month_list, week_list
 
 
 #-----------------------------------------------------------------------------------------------------------------------
@@ -464,3 +473,414 @@ def test_asset_transfer(prepare_db):
     trades = JalAccount(2).closed_trades_list()
     assert len(trades) == 1
     assert sum([x.profit() for x in trades]) == Decimal('995')
+
+
+def test_ledger_batch_rebuild(prepare_db_fifo, monkeypatch):
+    account2 = JalAccount(
+        data={'type': PredefinedAccountType.Investment, 'name': 'account.RUB', 'number': 'U7654321', 'currency': 1,
+              'active': 1, 'organization': 1, 'precision': 4},
+        create=True)
+    create_quotes(2, 1, [(d2t(210101), 75), (d2t(210201), 80)])
+    create_stocks([('A', 'A SHARE'), ('B', 'B SHARE'), ('C', 'C SHARE')], currency_id=2)  # id = 4, 5, 6
+    JalAsset(4).add_symbol('A.RUB', 1, '')
+    create_trades(1, [
+        (d2t(210105), d2t(210107), 4, 10.0, 100.0, 1.0),
+        (d2t(210106), d2t(210108), 4, 5.0, 110.0, 1.0),
+        (d2t(210107), d2t(210109), 5, 3.0, 50.0, 0.5),
+        (d2t(210110), d2t(210112), 4, -12.0, 120.0, 1.0),
+        (d2t(210115), d2t(210117), 5, 6.0, 300.0, 2.0),   # buy on credit
+        (d2t(210120), d2t(210122), 6, -4.0, 25.0, 1.0)    # short position
+    ])
+    create_trades(2, [(d2t(210205), d2t(210207), 4, -3.0, 9000.0, 5.0)])
+    create_corporate_actions(1, [(d2t(210112), 4, 5, 3.0, 'Split B 3 -> 9', [(5, 9.0, 1.0)])])
+    create_stock_dividends([(Dividend.StockDividend, d2t(210118), 1, 4, 1.0, 2, 115.0, 0.0, 'Stock dividend +1 A')])
+    create_transfers([(d2t(210201), 1, 3.0, 2, 3.0, 4)])
+    create_actions([(d2t(210125), 1, 1, [(5, -100.0), (7, 33.33)])])
+    account3 = JalAccount(   # Independent account to have 2 groups of operations for parallel rebuild
+        data={'type': PredefinedAccountType.Investment, 'name': 'account.3', 'number': 'U1234567', 'currency': 2,
+              'active': 1, 'organization': 1}, create=True)
+    create_actions([(d2t(210103), account3.id(), 1, [(PredefinedCategory.StartingBalance, 1000.0)])])
+    create_trades(account3.id(), [
+        (d2t(210106), d2t(210108), 5, 4.0, 50.0, 0.5),
+        (d2t(210111), d2t(210113), 5, -2.0, 55.0, 0.5),
+        (d2t(210203), d2t(210205), 5, -2.0, 60.0, 0.5)
+    ])
+
+    ledger = Ledger()
+    ledger.rebuild(from_timestamp=0, buffer_size=0)
+    expected = dump_ledger_tables()
+    assert len(expected['ledger']) > 0
+    assert len(expected['trades_closed']) > 0
+
+    ledger.rebuild(from_timestamp=0, buffer_size=3)
+    assert dump_ledger_tables() == expected
+    ledger.rebuild(from_timestamp=0)
+    assert dump_ledger_tables() == expected
+    ledger.rebuild(from_timestamp=0, workers=3)   # accounts 1 and 2 are linked by transfer, account 3 is separate
+    assert dump_ledger_tables() == expected
+
+    # Process pool is used automatically only if there are enough operations to rebuild
+    parallel_calls = []
+    process_parallel = Ledger._process_parallel
+    monkeypatch.setattr(Ledger, '_process_parallel',
+                        lambda self, *args: parallel_calls.append(args) or process_parallel(self, *args))
+    ledger.rebuild(from_timestamp=0, workers=0)
+    assert parallel_calls == []
+    assert dump_ledger_tables() == expected
+    monkeypatch.setattr(Ledger, 'PARALLEL_REBUILD_THRESHOLD', 1)
+    monkeypatch.setattr('os.cpu_count', lambda: 2)
+    ledger.rebuild(from_timestamp=0, workers=0)
+    assert len(parallel_calls) == 1
+    assert dump_ledger_tables() == expected
+
+    # Partial rebuild takes open positions that were created before the frontier from DB
+    ledger.rebuild(from_timestamp=d2t(210111), buffer_size=0)
+    expected = dump_ledger_tables()
+    ledger.rebuild(from_timestamp=d2t(210111))
+    assert dump_ledger_tables() == expected
+
+    # Failure of one group of operations leaves ledger without results of other groups, so frontier doesn't skip it
+    create_actions([(d2t(210110), account3.id(), 1, [(5, -10.0)])])
+    _ = JalDB._exec("DELETE FROM action_details WHERE pid=(SELECT MAX(id) FROM actions)", commit=True)
+    with pytest.raises(LedgerError):
+        ledger.rebuild(from_timestamp=0, workers=3)
+    assert JalDB._read("SELECT COUNT(*) FROM ledger") == 0
+    assert ledger.getCurrentFrontier() == 0
+
+
+def test_operations_loader(prepare_db_fifo):
+    create_stocks([('A', 'A SHARE'), ('B', 'B SHARE')], currency_id=2)  # id = 4, 5
+    create_trades(1, [(d2t(210105), d2t(210107), 4, 10.0, 100.0, 1.0)])
+    create_corporate_actions(1, [(d2t(210112), 4, 5, 10.0, 'Merger A -> B', [(5, 5.0, 1.0)])])
+    create_stock_dividends([(Dividend.StockDividend, d2t(210118), 1, 5, 1.0, 2, 115.0, 0.0, 'Stock dividend +1 B')])
+    create_transfers([(d2t(210120), 1, 3.0, 1, 3.0, 5)])
+    create_actions([(d2t(210125), 1, 1, [(5, -100.0), (7, 33.33)])])
+
+    sequence = Ledger.get_operations_sequence(d2t(210106), d2t(211231))
+    assert len(sequence) == 5   # Trade is before the window, transfer has withdrawal and deposit
+    loader = OperationsLoader(d2t(210106))
+    for item in sequence:
+        expected = LedgerTransaction.get_operation(item['op_type'], item['id'], item['subtype'])
+        operation = loader.get_operation(item['op_type'], item['id'], item['subtype'])
+        assert type(operation) == type(expected)
+        assert operation.dump() == expected.dump()
+        assert operation.timestamp() == expected.timestamp()
+        assert operation.view_rows() == expected.view_rows()
+        if item['op_type'] == LedgerTransaction.IncomeSpending:
+            assert operation.lines() == expected.lines()
+
+
+def test_operations_window(prepare_db_fifo):
+    create_stocks([('A', 'A SHARE'), ('B', 'B SHARE')], currency_id=2)  # id = 4, 5
+    create_trades(1, [(d2t(210105), d2t(210107), 4, 10.0, 100.0, 1.0), (d2t(210115), d2t(210117), 4, -4.0, 110.0, 1.0)])
+    create_corporate_actions(1, [(d2t(210120), CorporateAction.Split, 4, 6.0, 'Split A 6 -> 12', [(4, 12.0, 1.0)])])
+    create_transfers([(d2t(210122), 1, 3.0, 1, 3.0, 4)])
+    create_actions([(d2t(210125), 1, 1, [(5, -100.0), (7, 33.33)])])
+    Ledger().rebuild(from_timestamp=0)
+
+    sequence = Ledger.get_operations_sequence(0, d2t(211231))
+    assert len(sequence) == 7   # Initial deposit from fixture, transfer has withdrawal and deposit
+    pages = [Ledger.get_operations_sequence(0, d2t(211231), offset=x, limit=4) for x in range(0, 12, 4)]
+    assert [len(x) for x in pages] == [4, 3, 0]
+    assert pages[0] + pages[1] == sequence
+    loader = OperationsLoader()
+    loader.load_operations([(x['op_type'], x['id']) for x in sequence])
+    for item in sequence:
+        expected = LedgerTransaction.get_operation(item['op_type'], item['id'], item['subtype'])
+        operation = loader.get_operation(item['op_type'], item['id'], item['subtype'])
+        assert operation.dump() == expected.dump()
+        assert operation.value_total() == expected.value_total()
+        assert operation.value_change() == expected.value_change()
+
+
+def test_operations_search(prepare_db_fifo, monkeypatch):
+    create_stocks([('A', 'A SHARE')], currency_id=2)  # id = 4
+    create_trades(1, [(d2t(210105), d2t(210107), 4, 10.0, 100.0, 1.0), (d2t(210115), d2t(210117), 4, -4.0, 110.0, 1.0)])
+    create_transfers([(d2t(210122), 1, 3.0, 1, 3.0, 4)])
+    create_actions([(d2t(210125), 1, 1, [(5, -100.0)])])
+    Ledger().rebuild(from_timestamp=0)
+
+    monkeypatch.setattr(OperationsModel, 'FETCH_SIZE', 2)
+    _app = QApplication.instance() or QApplication([])
+    view = QTableView()
+    model = OperationsModel(view)
+    proxy = QSortFilterProxyModel(view)
+    proxy.setSourceModel(model)
+    proxy.setFilterKeyColumn(-1)
+    view.setModel(proxy)
+    model.setDateRange(0, d2t(211231))
+    assert model.rowCount() == 2 and model.canFetchMore()
+    # Proxy model filters fetched rows only, so all rows are fetched while search is active
+    model.setSearchActive(True)
+    proxy.setFilterFixedString(ts2dt(d2t(210125)))
+    assert proxy.rowCount() == 1
+    assert model.rowCount() == 6 and not model.canFetchMore()
+    model.setDateRange(0, d2t(211231))
+    assert model.rowCount() == 6 and proxy.rowCount() == 1
+    model.setSearchActive(False)
+    proxy.setFilterFixedString('')
+    model.setDateRange(0, d2t(211231))
+    assert model.rowCount() == 2 and model.canFetchMore()
+
+
+def test_closed_trades_list(prepare_db_fifo):
+    create_stocks([('A', 'A SHARE'), ('B', 'B SHARE')], currency_id=2)  # id = 4, 5
+    create_trades(1, [
+        (d2t(210105), d2t(210107), 4, 10.0, 100.0, 1.0),
+        (d2t(210210), d2t(210212), 5, 5.0, 50.0, 1.0),
+        (d2t(211110), d2t(211112), 5, -5.0, 60.0, 1.0),
+        (d2t(211230), d2t(220103), 4, -4.0, 110.0, 2.0),
+        (d2t(220201), d2t(220203), 4, -12.0, 70.0, 2.0)
+    ])
+    create_corporate_actions(1, [(d2t(220115), CorporateAction.Split, 4, 6.0, 'Split A 6 -> 12', [(4, 12.0, 1.0)])])
+    ledger = Ledger()
+    ledger.rebuild(from_timestamp=0)
+
+    account = JalAccount(1)
+    trades = account.closed_trades_list()
+    assert [x.dump() for x in trades] == [JalClosedTrade(x.id()).dump() for x in trades]
+    assert len(trades) == 4
+    ids = lambda x: [trade.id() for trade in x]
+    assert ids(account.closed_trades_list(d2t(210101), d2t(211231))) == [trades[0].id(), trades[1].id()]
+    assert ids(account.closed_trades_list(d2t(210101), d2t(211231), settlement=True)) == [trades[0].id()]
+    assert ids(account.closed_trades_list(close_types=[LedgerTransaction.CorporateAction])) == [trades[2].id()]
+    assert ids(account.closed_trades_list(open_types=[LedgerTransaction.CorporateAction])) == [trades[3].id()]
+    assert ids(account.closed_trades_list(asset_types=[PredefinedAsset.Stock])) == ids(trades)
+    assert account.closed_trades_list(asset_types=[PredefinedAsset.Bond]) == []
+    assert trades[3].open_operation().type() == LedgerTransaction.CorporateAction
+    assert trades[3].profit() == Decimal('238')
+
+
+def test_ledger_split_sequence():
+    sequence = [
+        {'op_type': LedgerTransaction.IncomeSpending, 'id': 1, 'account_id': 1, 'subtype': 0},
+        {'op_type': LedgerTransaction.Trade, 'id': 1, 'account_id': 2, 'subtype': 0},
+        {'op_type': LedgerTransaction.IncomeSpending, 'id': 2, 'account_id': 3, 'subtype': 0},
+        {'op_type': LedgerTransaction.Transfer, 'id': 1, 'account_id': 2, 'subtype': -1},
+        {'op_type': LedgerTransaction.Transfer, 'id': 1, 'account_id': 1, 'subtype': 1},
+        {'op_type': LedgerTransaction.Trade, 'id': 2, 'account_id': 4, 'subtype': 0}
+    ]
+    buckets = Ledger._split_sequence(sequence, 8)
+    assert buckets == [[(0, 1, 1, 0), (1, 3, 1, 0), (3, 4, 1, -1), (4, 4, 1, 1)], [(2, 1, 2, 0)], [(5, 3, 2, 0)]]
+    buckets = Ledger._split_sequence(sequence, 2)
+    assert buckets == [[(0, 1, 1, 0), (1, 3, 1, 0), (3, 4, 1, -1), (4, 4, 1, 1)], [(2, 1, 2, 0), (5, 3, 2, 0)]]
+
+
+def test_ledger_incremental(prepare_db_fifo):
+    for i in range(2):
+        JalAccount(data={'type': PredefinedAccountType.Investment, 'name': f'account.{i + 2}', 'number': f'N{i + 2}',
+                         'currency': 2, 'active': 1, 'organization': 1}, create=True)   # id = 2, 3
+    create_stocks([('A', 'A SHARE')], currency_id=2)  # id = 4
+    create_quotes(2, 1, [(d2t(210101), 75)])
+    create_actions([(d2t(210102), 3, 1, [(PredefinedCategory.StartingBalance, 1000.0)])])
+    create_trades(1, [
+        (d2t(210105), d2t(210107), 4, 10.0, 100.0, 1.0),
+        (d2t(210110), d2t(210112), 4, -2.0, 110.0, 1.0)
+    ])
+    create_transfers([(d2t(210115), 1, 5.0, 2, 5.0, 4)])   # Asset transfer links account 1 -> 2
+    create_trades(2, [(d2t(210120), d2t(210122), 4, -3.0, 120.0, 1.0)])
+    create_actions([(d2t(210125), 3, 1, [(5, -10.0)])])
+    ledger = Ledger()
+    ledger.rebuild(from_timestamp=0)
+    assert JalDB._read("SELECT COUNT(*) FROM ledger_dirty") == 0
+    account1_ledger = JalDB._read("SELECT GROUP_CONCAT(id) FROM ledger WHERE account_id=1")
+
+    # Back-dated expense invalidates ledger of its own account only
+    create_actions([(d2t(210103), 3, 1, [(5, -20.0)])])
+    assert JalDB._read("SELECT account_id, timestamp FROM ledger_dirty") == [3, d2t(210103)]
+    ledger.rebuild()
+    assert JalDB._read("SELECT COUNT(*) FROM ledger_dirty") == 0
+    assert JalDB._read("SELECT GROUP_CONCAT(id) FROM ledger WHERE account_id=1") == account1_ledger
+    incremental = dump_ledger_tables(with_id=False)
+    ledger.rebuild(from_timestamp=0)
+    assert dump_ledger_tables(with_id=False) == incremental
+
+    # Trade change is propagated to the account that received the asset by transfer
+    Trade(1).update_price(Decimal('90'))
+    assert JalDB._read("SELECT account_id, timestamp FROM ledger_dirty") == [1, d2t(210105)]
+    ledger.rebuild()
+    incremental = dump_ledger_tables(with_id=False)
+    ledger.rebuild(from_timestamp=0)
+    assert dump_ledger_tables(with_id=False) == incremental
+
+
+def test_ledger_snapshots(prepare_db_fifo):
+    create_stocks([('A', 'A SHARE'), ('B', 'B SHARE')], currency_id=2)  # id = 4, 5
+    create_trades(1, [
+        (d2t(210105), d2t(210107), 4, 10.0, 100.0, 1.0),
+        (d2t(210210), d2t(210212), 5, 5.0, 50.0, 1.0),
+        (d2t(210315), d2t(210317), 4, -10.0, 110.0, 1.0),
+        (d2t(210420), d2t(210422), 5, 3.0, 60.0, 1.0)
+    ])
+    create_actions([(d2t(210301), 1, 1, [(5, -100.0)])])
+    ledger = Ledger()
+    ledger.rebuild(from_timestamp=0)
+    assert JalDB._read("SELECT COUNT(DISTINCT timestamp) FROM ledger_snapshots") == 5   # 2020-11 ... 2021-03
+    assert JalDB._read("SELECT COUNT(*) FROM ledger_snapshots WHERE timestamp=:t AND asset_id=4",
+                       [(":t", d2t(210331) + 86399)]) == 0   # Asset A was sold in March
+
+    dates = [d2t(201231), d2t(210131), d2t(210228), d2t(210310), d2t(210331), d2t(210430), d2t(211231)]
+    account = JalAccount(1)
+    def balances():
+        return [(account.get_asset_amount(x, 2), account.get_asset_amount(x, 4), account.get_asset_amount(x, 5),
+                 [(a['asset'].id(), a['amount'], a['value']) for a in account.assets_list(x)],
+                 LedgerAmounts("value_acc", timestamp=x)[(BookAccount.Assets, 1, 5)]) for x in dates]
+    def positions():   # the same values calculated by one query for all accounts
+        return [(JalAccount.positions(x)[1]['money'], [(a['asset'].id(), a['amount'], a['value'])
+                                                       for a in JalAccount.positions(x)[1]['assets']]) for x in dates]
+    with_snapshots = balances()
+    assert positions() == [(x[0], x[3]) for x in with_snapshots]
+    _ = JalDB._exec("DELETE FROM ledger_snapshots")
+    assert balances() == with_snapshots
+    assert positions() == [(x[0], x[3]) for x in with_snapshots]
+    assert with_snapshots[2][1:4] == (Decimal('10'), Decimal('5'), [(4, Decimal('10'), Decimal('1000')),
+                                                                    (5, Decimal('5'), Decimal('250'))])
+
+    # Snapshots are updated after back-dated change of the ledger
+    ledger.rebuild(from_timestamp=0)
+    create_actions([(d2t(210201), 1, 1, [(5, -200.0)])])
+    assert JalDB._read("SELECT MAX(timestamp) FROM ledger_snapshots") == d2t(210131) + 86399
+    ledger.rebuild()
+    with_snapshots = balances()
+    assert JalDB._read("SELECT COUNT(DISTINCT timestamp) FROM ledger_snapshots") == 5
+    _ = JalDB._exec("DELETE FROM ledger_snapshots")
+    assert balances() == with_snapshots
+
+    # Incremental rebuild takes the latest kept snapshot as a base for the first new one
+    ledger.rebuild(from_timestamp=0)
+    _ = JalDB._exec("UPDATE ledger_snapshots SET amount_acc='7' WHERE timestamp=:t AND asset_id=5",
+                    [(":t", d2t(210228) + 86399)])
+    create_actions([(d2t(210320), 1, 1, [(5, -50.0)])])
+    ledger.rebuild()
+    assert JalDB._read("SELECT amount_acc FROM ledger_snapshots WHERE timestamp=:t AND asset_id=5",
+                       [(":t", d2t(210331) + 86399)]) == '7'   # Taken from modified snapshot instead of ledger
+    ledger.rebuild(from_timestamp=0)
+    assert JalDB._read("SELECT amount_acc FROM ledger_snapshots WHERE timestamp=:t AND asset_id=5",
+                       [(":t", d2t(210331) + 86399)]) == '5'
+
+
+def test_account_balances(prepare_db_fifo):
+    create_stocks([('A', 'A SHARE'), ('B', 'B SHARE')], currency_id=2)  # id = 4, 5
+    create_trades(1, [
+        (d2t(210105), d2t(210107), 4, 10.0, 100.0, 1.0),
+        (d2t(210210), d2t(210212), 5, 5.0, 50.0, 1.0),
+        (d2t(210315), d2t(210317), 4, -10.0, 110.0, 1.0)
+    ])
+    create_quotes(4, 2, [(d2t(210101), 95.0), (d2t(210201), 105.0), (d2t(210301), 120.0)])
+    create_quotes(5, 2, [(d2t(210201), 55.0), (d2t(210401), 45.0)])
+    create_quotes(2, 1, [(d2t(210101), 75.0), (d2t(210301), 80.0)])
+    ledger = Ledger()
+    ledger.rebuild(from_timestamp=0)
+
+    account = JalAccount(1)
+    dates = [d2t(201231), d2t(210131), d2t(210228), d2t(210310), d2t(210331), d2t(210430)]
+    def expected(timestamp, currency_id):
+        assets = sum([x['amount'] * x['asset'].quote(timestamp, 2)[1] for x in account.assets_list(timestamp)],
+                     Decimal('0'))
+        money = account.get_asset_amount(timestamp, 2)
+        return {'timestamp': timestamp, 'assets': assets, 'money': money,
+                'value': (assets + money) * JalAsset(2).quote(timestamp, currency_id)[1]}
+    assert account.balances(dates) == [expected(x, 2) for x in dates]
+    assert account.balances(dates[::-1], 1) == [expected(x, 1) for x in dates[::-1]]
+    assert account.balances([d2t(210228)])[0]['assets'] == Decimal('1050') + Decimal('275')
+
+    # Cached positions are dropped after ledger change
+    create_actions([(d2t(210301), 1, 1, [(5, -100.0)])])
+    ledger.rebuild()
+    assert account.balances([d2t(210331)])[0] == expected(d2t(210331), 2)
+    _ = JalDB._exec("DELETE FROM ledger_snapshots")
+    JalDB.clear_ledger_cache()
+    assert account.balances(dates) == [expected(x, 2) for x in dates]
+
+
+def test_ledger_fixed_point(prepare_db_fifo):
+    JalAccount(data={'type': PredefinedAccountType.Investment, 'name': 'account.2', 'number': 'N2',
+                     'currency': 2, 'active': 1, 'organization': 1}, create=True)   # id = 2
+    create_stocks([('A', 'A SHARE')], currency_id=2)  # id = 4
+    create_quotes(2, 1, [(d2t(210101), 75)])
+    create_trades(1, [
+        (d2t(210105), d2t(210107), 4, 10.0, 100.0, 1.0),
+        (d2t(210110), d2t(210112), 4, -2.0, 110.25, 1.5)
+    ])
+    create_transfers([(d2t(210115), 1, 5.0, 2, 5.0, 4)])
+    create_actions([(d2t(210125), 1, 1, [(5, -10.01)])])
+
+    def balances():   # SUM() over decimal text has float precision only, so turnovers are rounded for comparison
+        result = []
+        for account_id in [1, 2]:
+            account = JalAccount(account_id)
+            result.append((account.get_asset_amount(d2t(210131), 2), account.get_asset_amount(d2t(210131), 4),
+                           [(x['asset'].id(), x['amount'], x['value']) for x in account.assets_list(d2t(210131))],
+                           round(account.get_book_turnover(BookAccount.Costs, d2t(210101), d2t(210131)), 9),
+                           round(account.get_category_turnover(5, d2t(210101), d2t(210131)), 9),
+                           round(account.get_flow(d2t(210101), d2t(210131), JalAccount.MONEY_FLOW, 'out'), 9),
+                           LedgerAmounts("value")[(BookAccount.Assets, account_id, 4)]))
+        result.append(round(JalCategory(5).get_turnover(d2t(210101), d2t(210131), 2), 9))
+        return result
+
+    ledger = Ledger()
+    ledger.rebuild(from_timestamp=0)
+    assert not JalDB.ledger_fixed_point()
+    assert JalDB._read("SELECT DISTINCT typeof(amount_acc) FROM ledger") == 'text'
+    text_balances = balances()
+    text_ledger = dump_ledger_tables(with_id=False)
+
+    # Change of setting triggers full rebuild with integer storage
+    JalSettings().setValue('LedgerFixedPoint', 1)
+    ledger.rebuild()
+    assert JalDB.ledger_fixed_point()
+    assert JalDB._read("SELECT DISTINCT typeof(amount_acc) FROM ledger") == 'integer'
+    assert JalDB._read("SELECT amount_acc FROM ledger_totals "
+                       "WHERE op_type=:type AND operation_id=1 AND book_account=:book",
+                       [(":type", LedgerTransaction.IncomeSpending), (":book", BookAccount.Money)]) == 1000000
+    assert balances() == text_balances
+    assert JalAccount(1).get_book_turnover(BookAccount.Costs, d2t(210101), d2t(210131)) == Decimal('12.51')   # exact
+    ledger.rebuild(from_timestamp=0, workers=2)
+    assert balances() == text_balances
+
+    # Change of account precision changes scale of its amounts, so ledger of the account should be rebuilt
+    money = JalAccount(1).get_asset_amount(d2t(210131), 2)
+    _ = JalDB._exec("UPDATE accounts SET precision=4 WHERE id=1", commit=True)
+    JalDB().invalidate_cache()
+    assert JalDB._read("SELECT account_id, timestamp FROM ledger_dirty") == [1, 0]
+    assert JalDB._read("SELECT COUNT(*) FROM ledger WHERE account_id=1") == 0
+    assert JalDB._read("SELECT COUNT(*) FROM ledger_totals WHERE account_id=1") == 0
+    assert JalDB._read("SELECT COUNT(*) FROM ledger_snapshots WHERE account_id=1") == 0
+    ledger.rebuild()
+    assert JalAccount(1).get_asset_amount(d2t(210131), 2) == money
+    assert JalDB._read("SELECT amount_acc FROM ledger_totals "
+                       "WHERE op_type=:type AND operation_id=1 AND book_account=:book",
+                       [(":type", LedgerTransaction.IncomeSpending), (":book", BookAccount.Money)]) == 100000000
+    _ = JalDB._exec("UPDATE accounts SET precision=2 WHERE id=1", commit=True)
+    JalDB().invalidate_cache()
+    ledger.rebuild()
+
+    JalSettings().setValue('LedgerFixedPoint', 0)
+    ledger.rebuild()
+    assert dump_ledger_tables(with_id=False) == text_ledger
+
+
+def test_category_turnovers(prepare_db_fifo):
+    account = JalAccount(data={'type': PredefinedAccountType.Cash, 'name': 'Wallet', 'number': 'N/A', 'currency': 1,
+                               'active': 1}, create=True)   # RUB account with id = 2
+    assert account.id() == 2
+    create_quotes(2, 1, [(d2t(201101), 75.0), (d2t(210101), 73.5), (d2t(210215), 74.25)])
+    create_quotes(3, 1, [(d2t(201101), 90.0)])
+    create_actions([
+        (d2t(210105), 1, 1, [(5, -10.0), (6, -1.5)]),
+        (d2t(210110), 2, 1, [(1, 1000.0), (5, -25.0)]),
+        (d2t(210201), 1, 1, [(8, 3.25)]),
+        (d2t(210131), 2, 1, [(6, -7.0)]),
+        (d2t(210301), 1, 1, [(5, -2.0), (8, 1.0)]),
+        (d2t(210315), 2, 1, [(8, 15.0)])
+    ])
+    Ledger().rebuild(from_timestamp=0)
+    categories = [JalCategory(x) for x in [1, 4, 5, 6, 8]]
+    for periods in [month_list(d2t(201201), d2t(210331)), week_list(d2t(201201), d2t(210331))]:
+        for currency_id in [1, 2, 3]:   # RUB, USD and EUR (cross-rate via RUB)
+            turnovers = JalCategory.get_turnovers(periods, currency_id)
+            for category in categories:
+                for i, period in enumerate(periods):
+                    expected = category.get_turnover(period['begin_ts'], period['end_ts'], currency_id)
+                    assert turnovers.get((category.id(), i), Decimal('0')) == expected
+    assert JalCategory.get_turnovers([], 1) == {}
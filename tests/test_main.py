@@ -1,15 +1,19 @@
 import os
 from shutil import copyfile
 import sqlite3
+from datetime import datetime
 from decimal import Decimal
 
-from tests.fixtures import project_root
+import pytest
+import pandas as pd
+from tests.fixtures import project_root, data_path, prepare_db
 from constants import Setup
 from jal.db.db import JalDB, JalDBError
 from jal.db.asset import JalAsset
+from jal.db.quote_cache import QuoteCache
 from jal.db.helpers import get_dbfilename, localize_decimal
 from jal.db.backup_restore import JalBackup
-from tests.helpers import pop2minor_digits, d2t, dt2t
+from tests.helpers import pop2minor_digits, d2t, dt2t, create_quotes
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -103,3 +107,78 @@ def test_backup_load(tmp_path, project_root):
     JalDB.connection().close()
     os.remove(target_path)  # Clean db init script
     os.remove(get_dbfilename(str(tmp_path) + os.sep))  # Clean db file
+
+
+def test_statement_cache(prepare_db):
+    sql = "SELECT id FROM assets WHERE id>=:id ORDER BY id"
+    query = JalDB._exec(sql, [(":id", 1)])
+    assert query.next() and query.value(0) == 1
+    # Every execution gets its own query object, so a query that is kept by the caller stays valid
+    nested = JalDB._exec(sql, [(":id", 2)])
+    assert nested is not query
+    assert nested.next() and nested.value(0) == 2
+    assert query.next() and query.value(0) == 2
+    # Parameter names of the query text are parsed once and are taken from cache later
+    assert JalDB._statements[sql] == {'id'}
+    # Query released by its owner is re-used for the next execution of the same text
+    count_sql = "SELECT COUNT(*) FROM assets WHERE id>=:id"
+    assert JalDB._read(count_sql, [(":id", 1)]) == JalDB._read(count_sql, [(":id", 1)])
+    cached = JalDB._prepared[JalDB.connection().connectionName()][(count_sql, True)]
+    assert len(cached) == 1
+    released = cached[0]
+    query = JalDB._exec(count_sql, [(":id", 2)])
+    assert query is released and not cached   # Query is taken out of cache while it is used
+    assert JalDB._read(count_sql, [(":id", 1)]) == JalDB._read(count_sql, [(":id", 3)]) + 2
+    assert query.next() and query.value(0) == JalDB._read(count_sql, [(":id", 2)])
+    assert all(x is not query for x in cached)
+    # Strict mode checks parameters of queries
+    with pytest.raises(AssertionError):
+        JalDB._exec(sql, [(":id", 1), (":extra", 2)])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_quote_cache(prepare_db):
+    create_quotes(2, 1, [(d2t(210101), 70.0), (d2t(210201), 72.0), (d2t(210301), 75.0)])
+    create_quotes(3, 1, [(d2t(210115), 90.0)])
+    usd = JalAsset(2)
+    assert usd.quote(d2t(201231), 1) == (0, Decimal('0'))
+    assert usd.quote(d2t(210101), 1) == (d2t(210101), Decimal('70'))
+    assert usd.quote(d2t(210215), 1) == (d2t(210201), Decimal('72'))
+    assert usd.quote(d2t(211231), 1) == (d2t(210301), Decimal('75'))
+    assert usd.quotes(d2t(210102), d2t(210301), 1) == [(d2t(210201), Decimal('72')), (d2t(210301), Decimal('75'))]
+    assert usd.quotes_range(1) == (d2t(210101), d2t(210301))
+    assert JalAsset(3).quote(d2t(210215), 2) == (d2t(210215), Decimal('90') / Decimal('72'))   # cross-rate EUR/USD
+    # Series are loaded once and then served from cache
+    assert JalDB._read("SELECT COUNT(*) FROM quotes") == 4
+    _ = JalDB._exec("DELETE FROM quotes WHERE asset_id=2")
+    assert usd.quote(d2t(210215), 1) == (d2t(210201), Decimal('72'))
+    # set_quotes() invalidates cached series
+    create_quotes(2, 1, [(d2t(210210), 73.0)])
+    assert usd.quote(d2t(210215), 1) == (d2t(210210), Decimal('73'))
+    assert usd.quote(d2t(211231), 1) == (d2t(210210), Decimal('73'))
+    # Least recently used series are dropped when cache is full
+    max_quotes = QuoteCache.MAX_QUOTES
+    QuoteCache.MAX_QUOTES = 1
+    QuoteCache.clear()
+    try:
+        assert usd.quote(d2t(210215), 1) == (d2t(210210), Decimal('73'))
+        assert JalAsset(3).quote(d2t(210215), 1) == (d2t(210115), Decimal('90'))
+        assert list(QuoteCache._series.keys()) == [(3, 1)]
+    finally:
+        QuoteCache.MAX_QUOTES = max_quotes
+
+
+def test_store_quotes(prepare_db):
+    usd = JalAsset(2)
+    result = usd.store_quotes([d2t(210101), d2t(210102), None, d2t(210104)],
+                              [Decimal('70.5'), '71', Decimal('1'), float('nan')], 1)
+    assert result == {'inserted': 2, 'updated': 0, 'skipped': 0}
+    assert usd.quotes(0, d2t(211231), 1) == [(d2t(210101), Decimal('70.5')), (d2t(210102), Decimal('71'))]
+    data = pd.DataFrame({'Date': [datetime(2021, 1, 1), datetime(2021, 1, 2), datetime(2021, 1, 3)],
+                         'Rate': [Decimal('70.50'), Decimal('72'), Decimal('73')]}).set_index('Date')
+    result = usd.store_quotes(data.index.asi8 // 1000000000, data['Rate'], 1)
+    assert result == {'inserted': 1, 'updated': 1, 'skipped': 1}
+    assert usd.quotes(0, d2t(211231), 1) == [(d2t(210101), Decimal('70.5')), (d2t(210102), Decimal('72')),
+                                             (d2t(210103), Decimal('73'))]
+    assert JalDB._read("SELECT COUNT(*) FROM quotes WHERE asset_id=2 AND currency_id=1") == 3
+    assert usd.store_quotes([], [], 1) == {'inserted': 0, 'updated': 0, 'skipped': 0}
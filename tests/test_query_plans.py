@@ -0,0 +1,94 @@
+import re
+import pytest
+
+from tests.fixtures import project_root, data_path, prepare_db, prepare_db_fifo
+from tests.helpers import d2t, create_stocks, create_actions, create_trades
+from constants import BookAccount
+from jal.db.db import JalDB
+from jal.db.ledger import Ledger, LedgerAmounts
+from jal.db.account import JalAccount
+from jal.db.asset import JalAsset
+from jal.db.category import JalCategory
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Keeps text and parameters of every SQL-query executed via JalDB._exec() while fixture is active
+@pytest.fixture
+def sql_log(monkeypatch):
+    queries = []
+    original_exec = JalDB._exec.__func__
+
+    def logged_exec(cls, sql_text, params=None, forward_only=True, commit=False):
+        queries.append((sql_text, [] if params is None else params))
+        return original_exec(cls, sql_text, params, forward_only=forward_only, commit=commit)
+
+    monkeypatch.setattr(JalDB, "_exec", classmethod(logged_exec))
+    yield queries
+
+
+# Returns a list of plan lines reported by 'EXPLAIN QUERY PLAN' for given query
+def query_plan(sql_text, params) -> list:
+    plan = []
+    query = JalDB._exec("EXPLAIN QUERY PLAN " + sql_text, params)
+    assert query is not None
+    while query.next():
+        plan.append(query.value("detail"))
+    return plan
+
+
+# Returns plan lines of ledger queries from the log that scan 'ledger' table (or its index) instead of index search
+def ledger_full_scans(queries) -> list:
+    scans = []
+    for sql_text, params in list(queries):   # copy as query_plan() calls are logged too
+        if not re.search(r"\bFROM ledger\b", sql_text):
+            continue
+        aliases = {"ledger"} | set(re.findall(r"\bFROM ledger (?:AS )?([a-z])\b", sql_text))
+        for line in query_plan(sql_text, params):
+            if re.match(rf"SCAN ({'|'.join(aliases)})\b", line):
+                scans.append(f"{line} in '{sql_text}'")
+    return scans
+
+
+@pytest.fixture
+def ledger_data(prepare_db_fifo):
+    create_stocks([('A', 'A SHARE')], currency_id=2)  # id = 4
+    create_trades(1, [(d2t(210105), d2t(210107), 4, 10.0, 100.0, 1.0)])
+    create_actions([(d2t(210110), 1, 1, [(5, -100.0)])])
+    Ledger().rebuild(from_timestamp=0)
+    yield
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_plan_ledger_amounts(ledger_data, sql_log):
+    amounts = LedgerAmounts("amount_acc", timestamp=d2t(210131))
+    assert amounts[(BookAccount.Assets, 1, 4)] == 10
+    amounts = LedgerAmounts("amount", timestamp=d2t(210131))
+    assert amounts[(BookAccount.Assets, 1, 4)] == 10
+    assert ledger_full_scans(sql_log) == []
+
+
+def test_plan_account_queries(ledger_data, sql_log):
+    account = JalAccount(1)
+    assert len(account.assets_list(d2t(210131))) == 1
+    assert account.get_asset_amount(d2t(210131), 4) == 10
+    assert len(JalAccount.positions(d2t(210131))[1]['assets']) == 1
+    assert account.balances([d2t(210131)])[0]['timestamp'] == d2t(210131)
+    assert ledger_full_scans(sql_log) == []
+
+
+def test_plan_category_turnover(ledger_data, sql_log):
+    assert JalCategory(5).get_turnover(d2t(210101), d2t(210131), 2) != 0
+    assert len(Ledger.get_operations_by_category(d2t(210101), d2t(210131), 5)) == 2
+    assert JalCategory.get_turnovers([{'begin_ts': d2t(210101), 'end_ts': d2t(210131)}], 2)[(5, 0)] != 0
+    assert ledger_full_scans(sql_log) == []
+
+
+def test_plan_peer_and_tag(ledger_data, sql_log):
+    Ledger.get_operations_by_peer(d2t(210101), d2t(210131), 1)
+    Ledger.get_operations_by_tag(d2t(210101), d2t(210131), 1)
+    assert ledger_full_scans(sql_log) == []
+
+
+def test_plan_active_assets(ledger_data, sql_log):
+    assert len(JalAsset.get_active_assets(d2t(210101), d2t(210131))) == 1
+    assert ledger_full_scans(sql_log) == []
@@ -7,9 +7,14 @@ from data_import.broker_statements.kit import StatementKIT
 from data_import.broker_statements.openbroker import StatementOpenBroker
 from data_import.broker_statements.just2trade import StatementJ2T
 from data_import.broker_statements.open_portfolio import StatementOpenPortfolio
+from jal.data_import.statement import Statement, StatementData, FOF
+from jal.data_import.statements import Statements
+from jal.db.db import JalDB
+from jal.db.account import JalAccount, JalAccountIndex
+from jal.db.asset import JalAsset, JalAssetIndex
 
-from constants import PredefinedAsset
-from tests.helpers import create_assets
+from constants import PredefinedAsset, PredefinedAccountType
+from tests.helpers import d2t, create_assets
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -29,6 +34,29 @@ def test_statement_ibkr(tmp_path, project_root, data_path, prepare_db_ibkr):
     assert IBKR._data == statement
 
 
+# ----------------------------------------------------------------------------------------------------------------------
+def test_statement_ibkr_streaming(tmp_path, project_root, data_path, prepare_db_ibkr):
+    with open(data_path + 'ibkr.json', 'r', encoding='utf-8') as json_file:
+        statement = json.load(json_file)
+    IBKR = StatementIBKR()
+    IBKR.streaming = False
+    IBKR.load(data_path + 'ibkr.xml')
+    assert IBKR._data == statement
+
+    # Sections that come before their turn should be loaded in the same order as usual
+    with open(data_path + 'ibkr.xml', 'r', encoding='utf-8') as xml_file:
+        xml_text = xml_file.read()
+    cash = xml_text[xml_text.index('<CashTransactions>'):xml_text.index('</CashTransactions>') + len('</CashTransactions>')]
+    xml_text = xml_text.replace(cash, '').replace('<CashReport>', cash + '\n<CashReport>')
+    reordered_file = str(tmp_path / 'ibkr_reordered.xml')
+    with open(reordered_file, 'w', encoding='utf-8') as xml_file:
+        xml_file.write(xml_text)
+    IBKR = StatementIBKR()
+    IBKR.load(reordered_file)
+    assert IBKR._data == statement
+    assert IBKR.statement_element().tag == 'FlexStatement'
+
+
 # ----------------------------------------------------------------------------------------------------------------------
 def test_statement_uralsib(tmp_path, project_root, data_path, prepare_db_moex):
     with open(data_path + 'tvoy.json', 'r', encoding='utf-8') as json_file:
@@ -74,3 +102,125 @@ def test_statement_open_portfolio(tmp_path, project_root, data_path, prepare_db_
     OpenPortfolio = StatementOpenPortfolio()
     OpenPortfolio.load(data_path + 'pof.json')
     assert OpenPortfolio._data == statement
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_statement_data(prepare_db):
+    statement = Statement()
+    statement._data = StatementData({FOF.ASSETS: [], FOF.SYMBOLS: [], FOF.ASSETS_DATA: [], FOF.TRADES: [],
+                                     FOF.TRANSFERS: [], FOF.CORP_ACTIONS: []})
+    usd = statement.currency_id('USD')
+    assert statement.currency_id('USD') == usd
+    a = statement.asset_id({'isin': 'US0000000001', 'symbol': 'A', 'type': FOF.ASSET_STOCK, 'currency': usd})
+    b = statement.asset_id({'symbol': 'B', 'type': FOF.ASSET_STOCK, 'currency': usd, 'reg_number': 'R-B'})
+    assert (usd, a, b) == (1, 2, 3)
+    assert statement.asset_id({'symbol': 'A'}) == a
+    assert statement.asset_id({'reg_number': 'R-B'}) == b
+    statement.asset_id({'symbol': 'B', 'isin': 'US0000000002'})   # ISIN is added to known asset
+    assert statement.asset_id({'isin': 'US0000000002'}) == b
+    assert statement._data.next_id(FOF.SYMBOLS) == 4
+
+    statement._data[FOF.TRADES].append({'id': 1, 'account': 1, 'asset': a})
+    statement._data[FOF.TRANSFERS].append({'id': 1, 'account': [1, 0, 1], 'asset': [a, a]})
+    statement._update_id('asset', a, 10)
+    assert statement._data[FOF.TRADES][0]['asset'] == -10
+    assert statement._data[FOF.TRANSFERS][0]['asset'] == [-10, -10]
+    assert statement._find_in_list(statement._data[FOF.SYMBOLS], 'asset', -10)['symbol'] == 'A'
+    assert statement._find_in_list(statement._data[FOF.SYMBOLS], 'asset', a) is None
+    statement._data[FOF.TRADES] = [x for x in statement._data[FOF.TRADES] if x['id'] != 1]
+    assert statement._data.next_id(FOF.TRADES) == 1
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_db_index(prepare_db_moex):
+    test_assets = [
+        ('sber', 'Sber duplicate', '', 1, PredefinedAsset.Stock, 0),   # ID = 9
+        ('SiZ1', 'Si-12.21', '', 1, PredefinedAsset.Derivative, 0),     # ID = 10
+        ('AFLT', '', 'RU0000000001', 1, PredefinedAsset.Bond, 0)        # ID = 11
+    ]
+    create_assets(test_assets, data=[(5, 'expiry', 1639612800), (10, 'expiry', 1647475200),
+                                     (6, 'reg_number', 'SU26238RMFS'), (11, 'reg_number', '4B02-01-55')])
+    searches = [
+        {'isin': 'RU0009029540'}, {'isin': 'RU0009029540', 'symbol': 'SBER'}, {'isin': 'RU0009029540', 'symbol': 'sber'},
+        {'isin': 'RU0009029540', 'symbol': 'SBERP'}, {'isin': 'RU0000000002', 'symbol': 'sber'},
+        {'isin': 'XX0000000000'}, {'reg_number': 'SU26238RMFS'}, {'reg_number': '4B02-01-55', 'symbol': 'AFLT'},
+        {'reg_number': 'unknown', 'symbol': 'aflt'}, {'symbol': 'AFLT', 'type': PredefinedAsset.Bond},
+        {'symbol': 'SBER', 'type': PredefinedAsset.Stock}, {'symbol': 'siz1', 'type': PredefinedAsset.Derivative},
+        {'symbol': 'SiZ1', 'type': PredefinedAsset.Derivative, 'expiry': 1647475200},
+        {'symbol': 'SiZ1', 'type': PredefinedAsset.Derivative, 'expiry': 1},
+        {'symbol': 'мкб 1P2'}, {'symbol': 'МКБ 1p2'}, {'name': 'АО Аэрофлот'}, {'name': 'sber DUPLICATE'},
+        {'symbol': 'USD', 'type': PredefinedAsset.Money}, {'symbol': 'usd', 'type': PredefinedAsset.Stock}, {}
+    ]
+    index = JalAssetIndex()
+    for search in searches:
+        assert index.find(search) == JalAsset(data=search.copy(), search=True, create=False).id(), search
+
+    for number, currency in [('A1', 2), ('A1', 3), ('A2', 2)]:
+        JalAccount(data={'type': PredefinedAccountType.Cash, 'number': number, 'currency': currency, 'active': 1},
+                   create=True)
+    index = JalAccountIndex()
+    for number, currency in [('A1', 2), ('A1', 3), ('A2', 2), ('A1', 1), ('A3', 2)]:
+        search = {'number': number, 'currency': currency}
+        assert index.find(search) == JalAccount(data=search, search=True, create=False).id(), search
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# JSON statement that may refer trade assets by ISIN only, so such assets are taken from database with 'search_offline'
+class StatementIsinRefs(Statement):
+    def load(self, filename: str) -> None:
+        super().load(filename)
+        usd = self.currency_id('USD')
+        for trade in [x for x in self._data[FOF.TRADES] if type(x['asset']) == str]:
+            trade['asset'] = self.asset_id({'isin': trade['asset'], 'currency': usd, 'search_offline': True})
+
+
+def test_statements_parallel_load(tmp_path, prepare_db_ibkr):
+    statements = [{
+        FOF.PERIOD: [d2t(230101), d2t(230131)],
+        FOF.ACCOUNTS: [{'id': 1, 'number': 'U7654321', 'currency': 1}],
+        FOF.ASSETS: [{'id': 1, 'type': FOF.ASSET_MONEY, 'name': ''},
+                     {'id': 2, 'type': FOF.ASSET_STOCK, 'name': 'New Co', 'isin': 'US0000000099'}],
+        FOF.SYMBOLS: [{'id': 1, 'asset': 1, 'symbol': 'USD'}, {'id': 2, 'asset': 2, 'symbol': 'NEWCO', 'currency': 1}],
+        FOF.TRADES: [{'id': 1, 'number': '1', 'timestamp': d2t(230110), 'settlement': d2t(230112), 'account': 1,
+                      'asset': 'US0000000099', 'quantity': 10.0, 'price': 10.0, 'fee': 0.0}]
+    }, {
+        FOF.PERIOD: [d2t(230201), d2t(230228)],
+        FOF.ACCOUNTS: [{'id': 1, 'number': 'U7654321', 'currency': 1}],
+        FOF.ASSETS: [{'id': 1, 'type': FOF.ASSET_MONEY, 'name': ''}],
+        FOF.SYMBOLS: [{'id': 1, 'asset': 1, 'symbol': 'USD'}],
+        FOF.TRADES: [{'id': 1, 'number': '2', 'timestamp': d2t(230210), 'settlement': d2t(230212), 'account': 1,
+                      'asset': 'US0000000099', 'quantity': -4.0, 'price': 12.0, 'fee': 0.0}]
+    }]
+    files = []
+    for i, data in enumerate(statements):
+        for section in [FOF.ASSETS_DATA, FOF.TRANSFERS, FOF.CORP_ACTIONS, FOF.ASSET_PAYMENTS, FOF.INCOME_SPENDING]:
+            data[section] = []
+        # The first statement has ordinary asset definitions, the second one refers the asset created by the first
+        if i == 0:
+            data[FOF.TRADES][0]['asset'] = 2
+        files.append(str(tmp_path / f"statement{i}.json"))
+        with open(files[-1], 'w', encoding='utf-8') as statement_file:
+            json.dump(data, statement_file)
+
+    # Result loaded before import of the first file isn't valid after it
+    statement = StatementIsinRefs()
+    statement.load(files[1])
+    result = statement.load_result()
+    assert not statement.db_changed()
+    completed = []
+    batch = Statements(None)
+    batch.load_completed.connect(lambda timestamp, totals: completed.append(timestamp))
+    batch.import_files(StatementIsinRefs.__module__, 'StatementIsinRefs', files[:1])
+    statement = StatementIsinRefs()
+    statement.set_load_result(result)
+    assert statement.db_changed()
+    _ = JalDB._exec("DELETE FROM trades", commit=True)
+    _ = JalDB._exec("DELETE FROM assets WHERE isin='US0000000099'", commit=True)
+
+    # Batch load: the second file is loaded in parallel with import of the first one and depends on its asset
+    batch.import_files(StatementIsinRefs.__module__, 'StatementIsinRefs', files, workers=2)
+    assert len(completed) == 2
+    asset_id = JalAsset(data={'isin': 'US0000000099'}, search=True, create=False).id()
+    assert asset_id
+    assert JalDB._read("SELECT COUNT(*) FROM assets WHERE isin='US0000000099'") == 1
+    assert JalDB._read("SELECT COUNT(*) FROM trades WHERE asset_id=:asset", [(":asset", asset_id)]) == 2
@@ -12,6 +12,7 @@ from jal.db.account import JalAccount
 from jal.db.asset import JalAsset
 from jal.db.operations import LedgerTransaction, CorporateAction, Dividend
 from jal.data_export.tax_reports.russia import TaxesRussia
+from jal.data_export.taxes import RateTable, IntervalIndex
 from jal.data_export.taxes_flow import TaxesFlowRus
 from jal.data_export.xlsx import XLSX
 
@@ -474,3 +475,23 @@ def test_taxes_cfd_short_dividends(tmp_path, data_path, prepare_db_taxes):
     #         continue
     #     reports_xls.output_data(tax_report[section], templates[section], parameters)
     # reports_xls.save()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_taxes_rate_table(prepare_db_taxes):
+    create_quotes(2, 1, [(d2t(211230), 70.0), (d2t(220103), 71.0), (d2t(220105) + 43200, 72.0), (d2t(220110), 73.0)])
+    table = RateTable(JalAsset(2), 1, d2t(220101), d2t(220120))
+    usd = JalAsset(2)
+    for timestamp in range(d2t(211231), d2t(220125), 3600 * 5):
+        assert table.rate(timestamp) == usd.quote(timestamp, 1)[1]
+    assert table.rate(d2t(220105) + 43199) == Decimal('71')
+    assert table.rate(d2t(220105) + 43200) == Decimal('72')
+
+    dividends = [(1, d2t(220110)), (2, d2t(220101)), (1, d2t(220105)), (1, d2t(220120))]
+    index = IntervalIndex(dividends, key=lambda x: x[0], position=lambda x: x[1])
+    assert index.find(1, d2t(220101), d2t(220115)) == [(1, d2t(220105)), (1, d2t(220110))]
+    assert index.find(1, d2t(220105), d2t(220120), remove=True) == [(1, d2t(220105)), (1, d2t(220110)),
+                                                                    (1, d2t(220120))]
+    assert index.find(1, 0, d2t(220131)) == []
+    assert index.find(2, 0, d2t(220131)) == [(2, d2t(220101))]
+    assert index.find(3, 0, d2t(220131)) == []